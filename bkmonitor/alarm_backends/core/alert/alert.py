@@ -21,6 +21,7 @@ from redis.exceptions import RedisError
 
 from alarm_backends.constants import DEFAULT_DEDUPE_FIELDS, NO_DATA_TAG_DIMENSION
 from alarm_backends.core.alert.event import Event
+from alarm_backends.core.alert.snapshot import mget_snapshots, save_snapshots
 from alarm_backends.core.cache.key import (
     ALERT_BUILD_QOS_COUNTER,
     ALERT_DEDUPE_CONTENT_KEY,
@@ -90,6 +91,9 @@ class Alert:
         # 最新事件
         self.last_event = None
 
+        # 从快照读取时各字段的编码结果，用于保存快照时只写入发生变化的字段
+        self.snapshot_fields = None
+
     def update(self, event: Event):
         """
         根据给出的事件更新告警内容
@@ -360,6 +364,14 @@ class Alert:
         self.refresh_duration()
         return copy.deepcopy(self.data)
 
+    def get_snapshot_data(self) -> dict:
+        """
+        与 to_dict 一致，但不做深拷贝，仅用于序列化
+        """
+        self.init_uid()
+        self.refresh_duration()
+        return self.data
+
     def add_log(self, op_type: str, **params):
         params["op_type"] = op_type
         params["create_time"] = int(time.time())
@@ -743,16 +755,14 @@ class Alert:
         从Redis中获取告警快照
         :param alert_key: 告警标识
         """
-        alert_json = ALERT_SNAPSHOT_KEY.client.get(alert_key.get_snapshot_key())
-
-        if not alert_json:
+        snapshot = mget_snapshots([alert_key])[0]
+        if not snapshot:
             return
 
-        try:
-            alert_data = json.loads(alert_json)
-            return cls(alert_data)
-        except Exception as e:
-            logger.warning("load alert failed: %s, origin data: %s", e, alert_json)
+        alert_data, snapshot_fields = snapshot
+        alert = cls(alert_data)
+        alert.snapshot_fields = snapshot_fields
+        return alert
 
     @classmethod
     def get_from_es(cls, alert_id: int) -> "Alert":
@@ -778,25 +788,21 @@ class Alert:
         :param alert_keys: 告警标识列表
         :return: 告警 Alert 对象 列表
         """
-        pipeline = ALERT_SNAPSHOT_KEY.client.pipeline(transaction=False)
-        for alert_key in alert_keys:
-            pipeline.get(alert_key.get_snapshot_key())
-        alerts_snapshot = pipeline.execute()
+        # 按路由节点分组并发获取快照
+        alerts_snapshot = mget_snapshots(alert_keys)
 
         results = []
 
         alert_ids_not_found = []
 
-        for index, alert_json in enumerate(alerts_snapshot):
-            if not alert_json:
+        for index, snapshot in enumerate(alerts_snapshot):
+            if not snapshot:
                 alert_ids_not_found.append(alert_keys[index].alert_id)
                 continue
-            try:
-                alert_data = json.loads(alert_json)
-                results.append(cls(alert_data))
-            except Exception as e:
-                logger.warning("load alert failed: %s, origin data: %s", e, alert_json)
-                alert_ids_not_found.append(alert_keys[index].alert_id)
+            alert_data, snapshot_fields = snapshot
+            alert = cls(alert_data)
+            alert.snapshot_fields = snapshot_fields
+            results.append(alert)
 
         if alert_ids_not_found:
             for alert_doc in AlertDocument.mget(alert_ids_not_found):
@@ -808,8 +814,7 @@ class Alert:
         """
         保存到redis快照
         """
-        key = ALERT_SNAPSHOT_KEY.get_key(strategy_id=self.strategy_id or 0, alert_id=self.id)
-        ALERT_SNAPSHOT_KEY.client.set(key, json.dumps(self.to_dict()), ALERT_SNAPSHOT_KEY.ttl)
+        save_snapshots([self])
 
     @property
     def key(self) -> AlertKey:
@@ -1022,13 +1027,5 @@ class AlertCache:
         if not alerts:
             return 0
 
-        pipeline = ALERT_SNAPSHOT_KEY.client.pipeline(transaction=False)
-        snapshot_count = 0
-        for alert in alerts:
-            # 已经结束的告警保存快照备用
-            key = ALERT_SNAPSHOT_KEY.get_key(strategy_id=alert.strategy_id or 0, alert_id=alert.id)
-            pipeline.set(key, json.dumps(alert.to_dict()), ALERT_SNAPSHOT_KEY.ttl)
-            snapshot_count += 1
-
-        pipeline.execute()
-        return snapshot_count
+        # 已经结束的告警保存快照备用，按路由节点分组并发写入，无需刷新 DB 的告警只写入变化的字段
+        return save_snapshots(alerts)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+告警快照存储
+
+1. 编码：快照格式为 "{SNAPSHOT_PREFIX}{payload}"，告警的每个字段分别经 msgpack 序列化，组成字典后再整体序列化，
+   经 zlib 压缩及 base64 编码后写入 redis(redis 客户端开启了 decode_responses)。读取时兼容旧版 json 格式。
+2. 增量：无需刷新 DB 的告警，只把相对上一次读取的快照发生变化的字段写入增量 hash，读取时合并到快照中。
+3. 读写：按 redis 路由节点分组，每个节点的 pipeline 并发执行。
+"""
+
+import base64
+import json
+import logging
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import msgpack
+from django.conf import settings
+
+from alarm_backends.core.cache.key import ALERT_SNAPSHOT_DELTA_KEY, ALERT_SNAPSHOT_KEY
+
+logger = logging.getLogger("alert")
+
+# json 内容一定以 "{" 开头，紧凑格式使用不可见字符作为前缀以便区分
+SNAPSHOT_PREFIX = "\x00bks1|"
+
+# 增量 hash 中表示该字段已被删除
+DELETED_FIELD = ""
+
+# 压缩级别，快照写入频繁，优先保证速度
+COMPRESS_LEVEL = 1
+
+
+def encode_field(value) -> bytes:
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def decode_field(packed: bytes):
+    return msgpack.unpackb(packed, raw=False, strict_map_key=False)
+
+
+def encode_fields(data: Dict) -> Dict[str, bytes]:
+    return {key: encode_field(value) for key, value in data.items()}
+
+
+def encode_snapshot(fields: Dict[str, bytes]) -> str:
+    payload = zlib.compress(msgpack.packb(fields, use_bin_type=True), COMPRESS_LEVEL)
+    return SNAPSHOT_PREFIX + base64.b64encode(payload).decode("ascii")
+
+
+def decode_snapshot(content: str, delta: Dict[str, str] = None) -> Tuple[Dict, Optional[Dict[str, bytes]]]:
+    """
+    解码快照内容并合并增量字段
+    :return: (告警数据, 各字段的编码结果)，旧版 json 格式且无增量时编码结果为 None
+    """
+    if content.startswith(SNAPSHOT_PREFIX):
+        payload = zlib.decompress(base64.b64decode(content[len(SNAPSHOT_PREFIX) :]))
+        fields = msgpack.unpackb(payload, raw=False)
+    else:
+        data = json.loads(content)
+        if not delta:
+            return data, None
+        fields = encode_fields(data)
+
+    for key, value in (delta or {}).items():
+        if value == DELETED_FIELD:
+            fields.pop(key, None)
+        else:
+            fields[key] = value.encode("latin1")
+    return {key: decode_field(value) for key, value in fields.items()}, fields
+
+
+def get_snapshot_keys(strategy_id, alert_id) -> Tuple[str, str]:
+    params = {"strategy_id": strategy_id or 0, "alert_id": alert_id}
+    return ALERT_SNAPSHOT_KEY.get_key(**params), ALERT_SNAPSHOT_DELTA_KEY.get_key(**params)
+
+
+def mget_snapshots(alert_keys: List) -> List[Optional[Tuple[Dict, Optional[Dict[str, bytes]]]]]:
+    """
+    批量获取告警快照
+    :param alert_keys: 告警标识(AlertKey)列表
+    :return: 与 alert_keys 顺序一致的 (告警数据, 各字段的编码结果)，快照不存在或解析失败时为 None
+    """
+    commands = []
+    for alert_key in alert_keys:
+        snapshot_key, delta_key = get_snapshot_keys(alert_key.strategy_id, alert_key.alert_id)
+        commands.append(("get", snapshot_key, ()))
+        commands.append(("hgetall", delta_key, ()))
+    results = ALERT_SNAPSHOT_KEY.client.execute_by_node(commands)
+
+    snapshots = []
+    for index, alert_key in enumerate(alert_keys):
+        content, delta = results[index * 2], results[index * 2 + 1]
+        if not content:
+            snapshots.append(None)
+            continue
+        try:
+            snapshots.append(decode_snapshot(content, delta))
+        except Exception as e:
+            logger.warning("load alert(%s) snapshot failed: %s, origin data: %s", alert_key, e, content)
+            snapshots.append(None)
+    return snapshots
+
+
+def save_snapshots(alerts: List) -> int:
+    """
+    批量保存告警快照
+    上一次读取的快照字段编码结果记录在 alert.snapshot_fields 中，告警无需刷新 DB 时只写入发生变化的字段
+    """
+    compact_enabled = settings.ALERT_SNAPSHOT_COMPACT_ENCODING_ENABLED
+    commands = []
+    for alert in alerts:
+        snapshot_key, delta_key = get_snapshot_keys(alert.strategy_id, alert.id)
+        data = alert.get_snapshot_data()
+        if not compact_enabled:
+            commands.append(("set", snapshot_key, (json.dumps(data), ALERT_SNAPSHOT_KEY.ttl)))
+            commands.append(("delete", delta_key, ()))
+            alert.snapshot_fields = None
+            continue
+
+        fields = encode_fields(data)
+        previous_fields = alert.snapshot_fields
+        if previous_fields is None or alert.should_refresh_db():
+            commands.append(("set", snapshot_key, (encode_snapshot(fields), ALERT_SNAPSHOT_KEY.ttl)))
+            commands.append(("delete", delta_key, ()))
+        else:
+            delta = {key: value.decode("latin1") for key, value in fields.items() if previous_fields.get(key) != value}
+            delta.update({key: DELETED_FIELD for key in previous_fields if key not in fields})
+            if delta:
+                commands.append(("hmset", delta_key, (delta,)))
+            commands.append(("expire", delta_key, (ALERT_SNAPSHOT_DELTA_KEY.ttl,)))
+            commands.append(("expire", snapshot_key, (ALERT_SNAPSHOT_KEY.ttl,)))
+        alert.snapshot_fields = fields
+
+    if commands:
+        ALERT_SNAPSHOT_KEY.client.execute_by_node(commands)
+    return len(alerts)
@@ -11,18 +11,109 @@ specific language governing permissions and limitations under the License.
 
 
 import abc
+import hashlib
 import json
+import threading
 import time
+from collections import OrderedDict
 
-import six.moves.cPickle as pickle
-from django.core.cache import caches
+from django.conf import settings
 
 from alarm_backends.constants import CONST_ONE_DAY
 from alarm_backends.core.cache.base import CacheManager
+from alarm_backends.core.cache.cmdb.codec import PickleCodec, decode, get_codec
+from bkmonitor.utils.common_utils import chunks
 from core.drf_resource import api
 from core.prometheus import metrics
 
-mem_cache = caches["locmem"]
+
+class CMDBLocalCache(object):
+    """
+    CMDB 进程内缓存(LRU)
+    缓存的是 redis 中的原始数据，每次读取时重新反序列化，避免调用方修改对象后污染缓存(与原来的 locmem 缓存行为一致)
+    失效策略:
+    1. 条目有效期不超过 CMDB_LOCAL_CACHE_TTL
+    2. 缓存刷新任务有数据变更时会发布新的版本号，每隔 CMDB_LOCAL_CACHE_VERSION_CHECK_INTERVAL 检查一次，版本变化时清空缓存
+    """
+
+    # 缓存不存在的对象时使用的占位值
+    EMPTY = ""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0
+
+    @property
+    def enabled(self):
+        return settings.CMDB_LOCAL_CACHE_TTL > 0 and settings.CMDB_LOCAL_CACHE_MAX_SIZE > 0
+
+    def check_version(self):
+        """
+        检查缓存版本，版本变化时清空缓存
+        """
+        now = time.time()
+        if now - self._version_checked_at < settings.CMDB_LOCAL_CACHE_VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = now
+        try:
+            version = self.manager.cache.get(self.manager.get_version_cache_key())
+        except Exception as e:  # noqa
+            self.manager.logger.warning("get cmdb cache version failed: {}".format(e))
+            return
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def mget(self, keys):
+        """
+        :return: ({key: value}, [missing_key])
+        """
+        if not self.enabled:
+            return {}, list(keys)
+
+        self.check_version()
+        result = {}
+        missing_keys = []
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None or item[0] < now:
+                    missing_keys.append(key)
+                    continue
+                self._data.move_to_end(key)
+                result[key] = item[1]
+
+        if result:
+            metrics.CMDB_LOCAL_CACHE_REQUEST_COUNT.labels(self.manager.type, "hit").inc(len(result))
+        if missing_keys:
+            metrics.CMDB_LOCAL_CACHE_REQUEST_COUNT.labels(self.manager.type, "miss").inc(len(missing_keys))
+        return result, missing_keys
+
+    def mset(self, mapping):
+        if not self.enabled:
+            return
+
+        expire_at = time.time() + settings.CMDB_LOCAL_CACHE_TTL
+        with self._lock:
+            for key, value in mapping.items():
+                self._data.pop(key, None)
+                self._data[key] = (expire_at, value or self.EMPTY)
+            while len(self._data) > settings.CMDB_LOCAL_CACHE_MAX_SIZE:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_caches = {}
 
 
 class CMDBCacheManager(CacheManager):
@@ -33,20 +124,31 @@ class CMDBCacheManager(CacheManager):
     type = "cmdb"
     CACHE_KEY = ""
     CACHE_TIMEOUT = 7 * CONST_ONE_DAY
+    # 缓存编码格式，见 codec.CODECS
+    CODEC = PickleCodec.name
+    # 批量获取时，单次 hmget 的数量
+    MULTI_GET_CHUNK_SIZE = 1000
 
     @classmethod
     def serialize(cls, obj):
         """
         序列化数据
         """
-        return pickle.dumps(obj).decode("latin1")
+        codec = get_codec(cls.CODEC)
+        try:
+            return codec.encode(obj)
+        except TypeError:
+            if codec is PickleCodec:
+                raise
+            # 紧凑编码不支持的对象，使用 pickle 编码兜底
+            return PickleCodec.encode(obj)
 
     @classmethod
     def deserialize(cls, string):
         """
-        反序列化数据
+        反序列化数据，兼容所有编码格式
         """
-        return pickle.loads(string.encode("latin1"))
+        return decode(string)
 
     @classmethod
     @abc.abstractmethod
@@ -63,6 +165,47 @@ class CMDBCacheManager(CacheManager):
         """
         return origin_key
 
+    @classmethod
+    def get_version_cache_key(cls):
+        """
+        缓存版本号，数据有变更时更新，用于使进程内缓存失效
+        """
+        return "{}.version".format(cls.CACHE_KEY)
+
+    @classmethod
+    def get_local_cache(cls):
+        """
+        :rtype: CMDBLocalCache
+        """
+        local_cache = local_caches.get(cls.CACHE_KEY)
+        if local_cache is None:
+            local_cache = local_caches.setdefault(cls.CACHE_KEY, CMDBLocalCache(cls))
+        return local_cache
+
+    @classmethod
+    def publish_version(cls):
+        """
+        发布新的缓存版本号，使所有进程的进程内缓存失效
+        """
+        cls.cache.set(cls.get_version_cache_key(), str(time.time()), cls.CACHE_TIMEOUT)
+        cls.get_local_cache().clear()
+
+    @classmethod
+    def _multi_get_values(cls, keys):
+        """
+        批量获取原始数据，优先从进程内缓存获取，未命中的部分通过 hmget 获取
+        :return: {key: value}
+        """
+        local_cache = cls.get_local_cache()
+        values, missing_keys = local_cache.mget(keys)
+        if missing_keys:
+            fetched_values = {}
+            for chunk_keys in chunks(missing_keys, cls.MULTI_GET_CHUNK_SIZE):
+                fetched_values.update(zip(chunk_keys, cls.cache.hmget(cls.CACHE_KEY, chunk_keys)))
+            local_cache.mset(fetched_values)
+            values.update(fetched_values)
+        return values
+
     @classmethod
     def multi_get(cls, keys):
         """
@@ -74,9 +217,10 @@ class CMDBCacheManager(CacheManager):
             return []
         keys = list(keys)
 
-        objs = cls.cache.hmget(cls.CACHE_KEY, keys)
+        values = cls._multi_get_values(list(set(keys)))
         result = []
-        for obj in objs:
+        for key in keys:
+            obj = values.get(key)
             if obj:
                 result.append(cls.deserialize(obj))
             else:
@@ -89,18 +233,12 @@ class CMDBCacheManager(CacheManager):
         获取单个对象
         """
         key = cls.key_to_internal_value(*args, **kwargs)
-        local_key = f"{cls.CACHE_KEY}_{key}"
-        if local_key in mem_cache:
-            return mem_cache.get(local_key)
-
-        obj = cls.cache.hget(cls.CACHE_KEY, key)
+        obj = cls._multi_get_values([key]).get(key)
 
         if not obj:
             cls.logger.warning("unknown {}: {}".format(cls.__name__.replace("Manager", ""), key))
-        else:
-            obj = cls.deserialize(obj)
-        mem_cache.set(local_key, obj)
-        return obj
+            return None
+        return cls.deserialize(obj)
 
     @classmethod
     def multi_get_with_dict(cls, keys):
@@ -151,14 +289,36 @@ class CMDBCacheManager(CacheManager):
         """
         清理缓存
         """
-        cls.cache.delete(cls.CACHE_KEY)
+        cls.cache.delete(cls.CACHE_KEY, cls.get_version_cache_key())
+        cls.get_local_cache().clear()
 
 
 class RefreshByBizMixin(object):
+    # 增量刷新时，单次批量获取对象摘要的数量
+    DIGEST_FETCH_CHUNK_SIZE = 1000
+
     @classmethod
     def get_biz_cache_key(cls):
         return "{}.biz".format(cls.CACHE_KEY)
 
+    @classmethod
+    def get_digest_cache_key(cls):
+        """
+        对象内容摘要，用于增量刷新时判断对象是否变更
+        """
+        return "{}.digest".format(cls.CACHE_KEY)
+
+    @classmethod
+    def get_biz_digest_cache_key(cls):
+        """
+        业务内容摘要，用于增量刷新时跳过未变更的业务
+        """
+        return "{}.biz_digest".format(cls.CACHE_KEY)
+
+    @staticmethod
+    def digest(value):
+        return hashlib.md5(str(value).encode("utf-8")).hexdigest()
+
     @classmethod
     @abc.abstractmethod
     def refresh_by_biz(cls, bk_biz_id):
@@ -169,10 +329,25 @@ class RefreshByBizMixin(object):
         """
         raise NotImplementedError
 
+    @classmethod
+    def get_changed_keys(cls, digests):
+        """
+        对比对象摘要，获取内容有变更的key
+        :param digests: {"cache_key": digest}
+        """
+        keys = list(digests.keys())
+        old_digests = []
+        for chunk_keys in chunks(keys, cls.DIGEST_FETCH_CHUNK_SIZE):
+            old_digests.extend(cls.cache.hmget(cls.get_digest_cache_key(), chunk_keys))
+        return [key for key, old_digest in zip(keys, old_digests) if old_digest != digests[key]]
+
     @classmethod
     def refresh(cls):
         """
         刷新缓存
+
+        增量模式下，按对象内容摘要比对，只写入有变更的对象；业务摘要未变更时直接跳过该业务的写入，
+        同时只在有变更的业务及已删除的业务范围内清理对象，避免每次全量扫描缓存
         """
         from alarm_backends.core.i18n import i18n
 
@@ -186,9 +361,25 @@ class RefreshByBizMixin(object):
 
         biz_ids = [business.bk_biz_id for business in business_list]
 
-        new_keys = []
-
         biz_cache_key = cls.get_biz_cache_key()
+        digest_cache_key = cls.get_digest_cache_key()
+        biz_digest_cache_key = cls.get_biz_digest_cache_key()
+
+        incremental = settings.CMDB_INCREMENTAL_REFRESH_ENABLED
+        # 对象缓存不存在时(首次刷新或已过期)，已有摘要不可信，需要全量写入并重建摘要
+        full_refresh = not (incremental and cls.cache.exists(cls.CACHE_KEY))
+        if full_refresh:
+            old_biz_cache_keys = {}
+            old_biz_digests = {}
+            cls.cache.delete(digest_cache_key, biz_digest_cache_key)
+        else:
+            old_biz_cache_keys = cls.cache.hgetall(biz_cache_key) or {}
+            old_biz_digests = cls.cache.hgetall(biz_digest_cache_key) or {}
+
+        # 增量模式下可能被删除的对象
+        maybe_deleted_keys = set()
+        updated_count = 0
+        skipped_biz_count = 0
 
         for bk_biz_id in biz_ids:
             biz_start_time = time.time()
@@ -201,11 +392,31 @@ class RefreshByBizMixin(object):
                 cls.logger.exception("get data by biz fail, bk_biz_id: {}, {}".format(bk_biz_id, e))
                 exc = e
             else:
-                # 更新对象缓存
+                serialized_objs = {key: cls.serialize(obj) for key, obj in objs.items()}
+                changed_keys = list(serialized_objs.keys())
                 pipeline = cls.cache.pipeline()
-                for key, obj in list(objs.items()):
-                    pipeline.hset(cls.CACHE_KEY, key, cls.serialize(obj))
-                    new_keys.append(key)
+                if incremental:
+                    digests = {key: cls.digest(value) for key, value in serialized_objs.items()}
+                    biz_digest = cls.digest(json.dumps(sorted(digests.items())))
+                    if old_biz_digests.get(str(bk_biz_id)) == biz_digest:
+                        # 业务数据无变更，跳过
+                        skipped_biz_count += 1
+                        metrics.ALARM_CACHE_TASK_TIME.labels(str(bk_biz_id), cls.type, "None").observe(
+                            time.time() - biz_start_time
+                        )
+                        continue
+
+                    if not full_refresh:
+                        changed_keys = cls.get_changed_keys(digests)
+                        maybe_deleted_keys.update(json.loads(old_biz_cache_keys.get(str(bk_biz_id), "[]")))
+                    for key in changed_keys:
+                        pipeline.hset(digest_cache_key, key, digests[key])
+                    pipeline.hset(biz_digest_cache_key, str(bk_biz_id), biz_digest)
+
+                # 更新对象缓存
+                for key in changed_keys:
+                    pipeline.hset(cls.CACHE_KEY, key, serialized_objs[key])
+                updated_count += len(changed_keys)
 
                 # 按业务设置key列表，用于差量更新
                 pipeline.hset(biz_cache_key, str(bk_biz_id), json.dumps(list(objs.keys())))
@@ -221,7 +432,11 @@ class RefreshByBizMixin(object):
         new_biz_ids = {str(biz_id) for biz_id in biz_ids}
         deleted_biz_ids = old_biz_ids - new_biz_ids
         if deleted_biz_ids:
+            for biz_id in deleted_biz_ids:
+                maybe_deleted_keys.update(json.loads(old_biz_cache_keys.get(biz_id, "[]")))
             cls.cache.hdel(biz_cache_key, *deleted_biz_ids)
+            if incremental:
+                cls.cache.hdel(biz_digest_cache_key, *deleted_biz_ids)
         cls.cache.expire(biz_cache_key, cls.CACHE_TIMEOUT)
 
         biz_cache_keys = cls.cache.hgetall(biz_cache_key) or {}
@@ -237,17 +452,38 @@ class RefreshByBizMixin(object):
             new_keys.extend(json.loads(keys))
 
         # 清理业务下已被删除的对象数据
-        old_keys = cls.cache.hkeys(cls.CACHE_KEY)
-        deleted_keys = set(old_keys) - set(new_keys)
+        if not full_refresh:
+            # 只需要在有变更及已删除的业务范围内清理，对象可能迁移到了其他业务下，需要排除
+            deleted_keys = maybe_deleted_keys - set(new_keys)
+        else:
+            old_keys = cls.cache.hkeys(cls.CACHE_KEY)
+            deleted_keys = set(old_keys) - set(new_keys)
         if deleted_keys:
             cls.cache.hdel(cls.CACHE_KEY, *deleted_keys)
+            if incremental:
+                cls.cache.hdel(digest_cache_key, *deleted_keys)
         cls.cache.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
+        if incremental:
+            cls.cache.expire(digest_cache_key, cls.CACHE_TIMEOUT)
+            cls.cache.expire(biz_digest_cache_key, cls.CACHE_TIMEOUT)
+
+        if updated_count or deleted_keys:
+            cls.publish_version()
+        else:
+            cls.get_local_cache().clear()
 
         metrics.ALARM_CACHE_TASK_TIME.labels("0", cls.type, "None").observe(time.time() - start_time)
 
         cls.logger.info(
-            "cache_key({}) refresh CMDB data finished, amount: updated: {}, removed: {}, "
-            "removed_biz: {}".format(cls.CACHE_KEY, len(new_keys), len(deleted_keys), len(deleted_biz_ids))
+            "cache_key({}) refresh CMDB data finished, amount: total: {}, updated: {}, removed: {}, "
+            "removed_biz: {}, skipped_biz: {}".format(
+                cls.CACHE_KEY,
+                len(new_keys),
+                updated_count,
+                len(deleted_keys),
+                len(deleted_biz_ids),
+                skipped_biz_count,
+            )
         )
 
     @classmethod
@@ -255,4 +491,11 @@ class RefreshByBizMixin(object):
         """
         清理缓存
         """
-        cls.cache.delete(cls.CACHE_KEY, cls.get_biz_cache_key())
+        cls.cache.delete(
+            cls.CACHE_KEY,
+            cls.get_biz_cache_key(),
+            cls.get_digest_cache_key(),
+            cls.get_biz_digest_cache_key(),
+            cls.get_version_cache_key(),
+        )
+        cls.get_local_cache().clear()
@@ -67,6 +67,7 @@ class BusinessManager(CMDBCacheManager):
 
         pipeline.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
         pipeline.execute()
+        cls.publish_version()
 
         cls.logger.info(
             "refresh CMDB Business data finished, amount: updated: {}, removed: {}".format(
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+CMDB 缓存编解码
+
+1. PickleCodec: 旧格式，pickle 序列化后按 latin1 解码为字符串
+2. CompactCodec: 紧凑格式，格式为 "{COMPACT_PREFIX}{payload}"
+   payload 为 msgpack 序列化后的 [对象类型, 对象数据]，主机对象按固定的字段顺序只存储字段值，不重复存储字段名
+
+解码时会根据前缀自动识别格式，因此切换编码格式后，旧格式的缓存仍然可以正常读取。
+"""
+
+import msgpack
+import six.moves.cPickle as pickle
+from django.conf import settings
+
+from api.cmdb.define import Business, Host, Module, Set, TopoNode
+
+# pickle 协议2及以上的数据一定以 "\x80" 开头，紧凑格式使用不可见字符作为前缀以便区分
+COMPACT_PREFIX = "\x00bkc1|"
+
+# 嵌套对象(如主机拓扑链中的拓扑节点)使用的 msgpack 扩展类型
+EXT_TYPE_OBJECT = 1
+
+# 主机对象字段顺序，只能在末尾追加字段，不能调整顺序或删除
+HOST_SCHEMA = (
+    "ip",
+    "bk_host_innerip",
+    "bk_host_innerip_v6",
+    "bk_cloud_id",
+    "bk_host_id",
+    "bk_biz_id",
+    "bk_agent_id",
+    "bk_host_outerip",
+    "bk_host_outerip_v6",
+    "bk_host_name",
+    "bk_os_name",
+    "bk_os_type",
+    "operator",
+    "bk_bak_operator",
+    "bk_state_name",
+    "bk_isp_name",
+    "bk_province_name",
+    "bk_supplier_account",
+    "bk_state",
+    "bk_os_version",
+    "service_template_id",
+    "srv_status",
+    "bk_comment",
+    "idc_unit_name",
+    "net_device_id",
+    "rack_id",
+    "bk_svr_device_cls_name",
+    "svr_device_class",
+    "docker_client_version",
+    "docker_server_version",
+    "bk_mem",
+    "bk_disk",
+    "bk_os_bit",
+    "bk_cpu_module",
+    "bk_cpu",
+    "bk_set_ids",
+    "bk_module_ids",
+    "display_name",
+)
+
+# 拓扑节点字段顺序
+TOPO_NODE_SCHEMA = ("bk_inst_id", "bk_inst_name", "bk_obj_id", "bk_obj_name")
+
+# 对象类型标识，只能追加，不能修改已有的值
+OBJECT_TYPES = {
+    "host": Host,
+    "topo_node": TopoNode,
+    "business": Business,
+    "set": Set,
+    "module": Module,
+}
+OBJECT_TYPE_NAMES = {obj_cls: name for name, obj_cls in OBJECT_TYPES.items()}
+
+
+class PickleCodec(object):
+    """
+    pickle 编解码(旧格式)
+    """
+
+    name = "pickle"
+
+    @classmethod
+    def encode(cls, obj):
+        return pickle.dumps(obj).decode("latin1")
+
+    @classmethod
+    def decode(cls, string):
+        return pickle.loads(string.encode("latin1"))
+
+
+class CompactCodec(object):
+    """
+    紧凑编解码
+    只支持主机及拓扑节点等对象，其余类型的值需要能被 msgpack 直接序列化，否则抛出 TypeError
+    """
+
+    name = "compact"
+
+    @classmethod
+    def is_compact(cls, string):
+        return string.startswith(COMPACT_PREFIX)
+
+    @classmethod
+    def _encode_host(cls, host):
+        attrs = dict(host.get_attrs())
+        values = []
+        missing = []
+        for index, field in enumerate(HOST_SCHEMA):
+            if field in attrs:
+                values.append(attrs.pop(field))
+            else:
+                values.append(None)
+                missing.append(index)
+        # 主机对象的非 CMDB 属性(如 topo_link)存储在实例字典中
+        instance_attrs = {key: value for key, value in host.__dict__.items() if key != "_extra_attr"}
+        topo_link = instance_attrs.pop("topo_link", None)
+        if topo_link is not None:
+            # 拓扑链是主机对象中占比最大的部分，按拓扑节点字段顺序只存储字段值
+            try:
+                topo_link = {
+                    key: [[getattr(node, field) for field in TOPO_NODE_SCHEMA] for node in nodes]
+                    for key, nodes in topo_link.items()
+                    if all(type(node) is TopoNode and len(node.__dict__) == len(TOPO_NODE_SCHEMA) for node in nodes)
+                }
+            except (AttributeError, TypeError):
+                topo_link = None
+            if topo_link is None or len(topo_link) != len(host.topo_link):
+                # 无法按字段压缩时按普通属性存储
+                instance_attrs["topo_link"] = host.topo_link
+                topo_link = None
+        return [values, missing, attrs, instance_attrs, topo_link]
+
+    @classmethod
+    def _decode_host(cls, data):
+        values, missing, extra_attrs, instance_attrs, topo_link = data
+        attrs = dict(zip(HOST_SCHEMA, values))
+        for index in missing:
+            attrs.pop(HOST_SCHEMA[index], None)
+        attrs.update(extra_attrs)
+
+        # 与 pickle 一致，不经过 __init__ 直接恢复对象状态
+        host = Host.__new__(Host)
+        host_dict = object.__getattribute__(host, "__dict__")
+        host_dict["_extra_attr"] = attrs
+        host_dict.update(instance_attrs)
+        if topo_link is not None:
+            host_dict["topo_link"] = {
+                key: [cls._new_topo_node(node_values) for node_values in nodes] for key, nodes in topo_link.items()
+            }
+        return host
+
+    @staticmethod
+    def _new_topo_node(node_values):
+        node = TopoNode.__new__(TopoNode)
+        node.__dict__.update(zip(TOPO_NODE_SCHEMA, node_values))
+        return node
+
+    @classmethod
+    def _to_data(cls, obj):
+        obj_type = OBJECT_TYPE_NAMES.get(type(obj))
+        if obj_type is None:
+            raise TypeError("unsupported cmdb cache object type: {}".format(type(obj)))
+        if obj_type == "host":
+            return [obj_type, cls._encode_host(obj)]
+        return [obj_type, obj.__dict__]
+
+    @classmethod
+    def _from_data(cls, data):
+        obj_type, obj_data = data
+        if obj_type == "host":
+            return cls._decode_host(obj_data)
+        obj_cls = OBJECT_TYPES[obj_type]
+        obj = obj_cls.__new__(obj_cls)
+        obj.__dict__.update(obj_data)
+        return obj
+
+    @classmethod
+    def _default(cls, obj):
+        return msgpack.ExtType(EXT_TYPE_OBJECT, cls._pack(cls._to_data(obj)))
+
+    @classmethod
+    def _ext_hook(cls, code, data):
+        if code == EXT_TYPE_OBJECT:
+            return cls._from_data(cls._unpack(data))
+        return msgpack.ExtType(code, data)
+
+    @classmethod
+    def _pack(cls, data):
+        return msgpack.packb(data, default=cls._default, use_bin_type=True)
+
+    @classmethod
+    def _unpack(cls, payload):
+        # 兼容自定义属性中非字符串类型的 map key
+        return msgpack.unpackb(payload, ext_hook=cls._ext_hook, raw=False, strict_map_key=False)
+
+    @classmethod
+    def encode(cls, obj):
+        return COMPACT_PREFIX + cls._pack(cls._to_data(obj)).decode("latin1")
+
+    @classmethod
+    def decode(cls, string):
+        return cls._from_data(cls._unpack(string[len(COMPACT_PREFIX) :].encode("latin1")))
+
+
+CODECS = {codec.name: codec for codec in [PickleCodec, CompactCodec]}
+
+
+def get_codec(name):
+    """
+    获取编码器，紧凑编码未开启时使用 pickle 编码
+    """
+    if name == CompactCodec.name and not settings.CMDB_CACHE_COMPACT_CODEC_ENABLED:
+        return PickleCodec
+    return CODECS[name]
+
+
+def decode(string):
+    """
+    根据数据格式自动选择解码器
+    """
+    if CompactCodec.is_compact(string):
+        return CompactCodec.decode(string)
+    return PickleCodec.decode(string)
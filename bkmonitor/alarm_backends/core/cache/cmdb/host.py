@@ -14,6 +14,7 @@ from collections import defaultdict
 from typing import Dict, List, Optional, Set
 
 from alarm_backends.core.cache.cmdb.base import CMDBCacheManager, RefreshByBizMixin
+from alarm_backends.core.cache.cmdb.codec import CompactCodec
 from api.cmdb.define import Host, TopoTree
 from bkmonitor.utils.local import local
 from core.drf_resource import api
@@ -169,6 +170,7 @@ class HostIPManager(CMDBCacheManager):
                 cls.cache.hmset(cls.CACHE_KEY, ip_result)
 
         cls.cache.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
+        cls.publish_version()
 
         cls.logger.info(
             "cache_key({}) refresh CMDB data finished, amount: updated: {}, removed: {}".format(
@@ -184,6 +186,7 @@ class HostManager(RefreshByBizMixin, CMDBCacheManager):
 
     type = "host"
     CACHE_KEY = "{prefix}.cmdb.host".format(prefix=CMDBCacheManager.CACHE_KEY_PREFIX)
+    CODEC = CompactCodec.name
 
     @classmethod
     def key_to_internal_value(cls, ip, bk_cloud_id=0):
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 
 
 from alarm_backends.core.cache.cmdb.base import CMDBCacheManager, RefreshByBizMixin
+from alarm_backends.core.cache.cmdb.codec import CompactCodec
 from api.cmdb.define import Module
 from core.drf_resource import api
 
@@ -21,6 +22,7 @@ class ModuleManager(RefreshByBizMixin, CMDBCacheManager):
     """
     type = "module"
     CACHE_KEY = "{prefix}.cmdb.module".format(prefix=CMDBCacheManager.CACHE_KEY_PREFIX)
+    CODEC = CompactCodec.name
 
     @classmethod
     def key_to_internal_value(cls, bk_module_id):
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 
 
 from alarm_backends.core.cache.cmdb.base import CMDBCacheManager, RefreshByBizMixin
+from alarm_backends.core.cache.cmdb.codec import CompactCodec
 from api.cmdb.define import Set
 from core.drf_resource import api
 
@@ -22,6 +23,7 @@ class SetManager(RefreshByBizMixin, CMDBCacheManager):
 
     type = "set"
     CACHE_KEY = "{prefix}.cmdb.set".format(prefix=CMDBCacheManager.CACHE_KEY_PREFIX)
+    CODEC = CompactCodec.name
 
     @classmethod
     def key_to_internal_value(cls, bk_set_id):
@@ -14,49 +14,75 @@ import json
 import logging
 import time
 
-from six.moves import zip
+from django.conf import settings
 
 from alarm_backends.constants import CONST_MINUTES
 from alarm_backends.core.cache.key import KEY_PREFIX
 from alarm_backends.core.storage.redis import CACHE_BACKEND_CONF_MAP, Cache
+from core.prometheus import metrics
 
 logger = logging.getLogger("cache.delay_queue")
 
+# 原子取出到期任务，多个进程同时拉取时每个任务只会被其中一个进程取出
+# KEYS[1]: 延时队列(有序集合)，KEYS[2]: 任务存储(hash)
+# ARGV: 当前时间，单次最大取出数量
+# 返回: [取出后仍到期的任务数, 任务1, 任务2, ...]
+POP_DUE_TASKS_SCRIPT = """
+local task_ids = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, tonumber(ARGV[2]))
+local result = {0}
+if #task_ids == 0 then
+    return result
+end
+redis.call("ZREM", KEYS[1], unpack(task_ids))
+local tasks = redis.call("HMGET", KEYS[2], unpack(task_ids))
+redis.call("HDEL", KEYS[2], unpack(task_ids))
+for _, task in ipairs(tasks) do
+    if task then
+        table.insert(result, task)
+    end
+end
+result[1] = redis.call("ZCOUNT", KEYS[1], "-inf", ARGV[1])
+return result
+"""
+
 
 class DelayQueueManager(object):
     TASK_STORAGE_QUEUE = KEY_PREFIX + "task_storage"
     TASK_DELAY_QUEUE = KEY_PREFIX + "task_delay_queue"
 
+    @classmethod
+    def pop_due_tasks(cls, redis_client, now, limit):
+        """
+        取出到期任务
+        :return: (取出后仍到期的任务数, [task, ...])
+        """
+        result = redis_client.eval(POP_DUE_TASKS_SCRIPT, 2, cls.TASK_DELAY_QUEUE, cls.TASK_STORAGE_QUEUE, now, limit)
+        return int(result[0]), [json.loads(task) for task in result[1:]]
+
     @classmethod
     def refresh_single_db(cls, backend):
+        """
+        重新推送到期任务，返回是否仍有到期任务未处理
+        """
         redis_client = Cache(backend)
 
-        now = int(time.time())
-        task_ids = redis_client.zrangebyscore(cls.TASK_DELAY_QUEUE, 0, now)
-
-        # use the atomicity of zrem to prevent concurrency
-        pipe = redis_client.pipeline()
-        for task_id in task_ids:
-            pipe.zrem(cls.TASK_DELAY_QUEUE, task_id)
-        result = pipe.execute()
-        data_keys = [data_key for data_key, flag in zip(task_ids, result) if flag]
-        if not data_keys:
-            return
-
-        # load data
-        task_list = redis_client.hmget(cls.TASK_STORAGE_QUEUE, data_keys)
-        task_list = [json.loads(task) for task in task_list]
-
-        # delete string key
-        redis_client.hdel(cls.TASK_STORAGE_QUEUE, *data_keys)
+        now = time.time()
+        remaining, task_list = cls.pop_due_tasks(redis_client, now, settings.DELAY_QUEUE_POP_BATCH_SIZE)
+        if not task_list:
+            metrics.DELAY_QUEUE_LAG.labels(backend=backend).set(0)
+            return False
 
         # redo push
-        pipe = redis_client.pipeline()
+        pipe = redis_client.pipeline(transaction=False)
         for task in task_list:
             task_id, cmd, queue, values, scheduled = task
             getattr(pipe, cmd)(queue, *values)
         pipe.execute()
 
+        metrics.DELAY_QUEUE_POP_COUNT.labels(backend=backend).inc(len(task_list))
+        metrics.DELAY_QUEUE_LAG.labels(backend=backend).set(max(now - min(task[4] for task in task_list), 0))
+        return remaining > 0
+
     @classmethod
     def refresh(cls):
         """
@@ -65,6 +91,7 @@ class DelayQueueManager(object):
         now = int(time.time())
         while int(time.time()) - now < CONST_MINUTES:
             duplicate_db = set()
+            has_backlog = False
             for backend, redis_conf in list(CACHE_BACKEND_CONF_MAP.items()):
                 db = redis_conf.get("db", 0)
                 if db in duplicate_db:
@@ -72,10 +99,14 @@ class DelayQueueManager(object):
                 duplicate_db.add(db)
 
                 try:
-                    cls.refresh_single_db(backend)
+                    has_backlog = cls.refresh_single_db(backend) or has_backlog
                 except Exception as e:
                     logger.exception("redo push(backend:{}), error({})" "".format(backend, e))
-            time.sleep(1)
+
+            # 仍有积压的到期任务时立即继续处理
+            if not has_backlog:
+                time.sleep(1)
+        metrics.report_all()
 
 
 def main():
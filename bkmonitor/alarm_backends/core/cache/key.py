@@ -186,6 +186,16 @@ DATA_LIST_KEY = register_key_with_config(
     }
 )
 
+DATA_LIST_RECORD_COUNT_KEY = register_key_with_config(
+    {
+        "label": "[access]待检测数据队列记录数(批量格式)",
+        "key_type": "string",
+        "key_tpl": "access.data.count.{strategy_id}.{item_id}",
+        "ttl": 30 * CONST_MINUTES,
+        "backend": "queue",
+    }
+)
+
 DATA_SIGNAL_KEY = register_key_with_config(
     {
         "label": "[access]待检测数据信号队列",
@@ -206,6 +216,16 @@ NO_DATA_LIST_KEY = register_key_with_config(
     }
 )
 
+NO_DATA_BUCKET_KEY = register_key_with_config(
+    {
+        "label": "[access]无数据告警待检测数据(按数据时间排序)",
+        "key_type": "sorted_set",
+        "key_tpl": "access.nodata.bucket.{strategy_id}.{item_id}",
+        "ttl": 10 * CONST_MINUTES,
+        "backend": "queue",
+    }
+)
+
 HISTORY_DATA_KEY = register_key_with_config(
     {
         "label": "[detect]待检测数据对应历史数据",
@@ -217,6 +237,38 @@ HISTORY_DATA_KEY = register_key_with_config(
     }
 )
 
+DETECT_BACKLOG_KEY = register_key_with_config(
+    {
+        "label": "[detect]策略待检测数据积压量(value: 积压记录数|更新时间)",
+        "key_type": "hash",
+        "key_tpl": "detect.backlog",
+        "field_tpl": "{strategy_id}",
+        "ttl": 30 * CONST_MINUTES,
+        "backend": "service",
+    }
+)
+
+DETECT_WORKER_HEARTBEAT_KEY = register_key_with_config(
+    {
+        "label": "[detect]常驻检测进程心跳(field: 进程标识, value: 最近心跳时间)",
+        "key_type": "hash",
+        "key_tpl": "detect.worker.heartbeat",
+        "field_tpl": "{worker_id}",
+        "ttl": 30 * CONST_MINUTES,
+        "backend": "queue",
+    }
+)
+
+DETECT_WORKER_SIGNAL_KEY = register_key_with_config(
+    {
+        "label": "[detect]常驻检测进程专属的待检测数据信号队列",
+        "key_type": "list",
+        "key_tpl": "detect.worker.signal.{worker_id}",
+        "ttl": 30 * CONST_MINUTES,
+        "backend": "queue",
+    }
+)
+
 ANOMALY_LIST_KEY = register_key_with_config(
     {
         "label": "[detect]检测结果详情队列",
@@ -290,6 +342,16 @@ ACCESS_DUPLICATE_KEY = register_key_with_config(
     }
 )
 
+ACCESS_DUPLICATE_FINGERPRINT_KEY = register_key_with_config(
+    {
+        "label": "[access]数据拉取去重(定长指纹)",
+        "key_type": "string",
+        "key_tpl": "access.data.duplicate_fingerprint.strategy_group_{strategy_group_key}.{dt_event_time}.{width}",
+        "ttl": 10 * CONST_MINUTES,
+        "backend": "service",
+    }
+)
+
 ACCESS_PRIORITY_KEY = register_key_with_config(
     {
         "label": "[access]数据拉取优先级",
@@ -383,6 +445,18 @@ CHECK_RESULT_CACHE_KEY = register_key_with_config(
     }
 )
 
+CHECK_RESULT_RING_KEY = register_key_with_config(
+    {
+        "label": "[detect]检测结果环形位图: (type:Hash)(p: 最新检测周期序号, u: 检测周期, r: 最近N个周期的检测状态)",
+        "key_type": "hash",
+        "key_tpl": "{prefix}.detect.result.ring.{{strategy_id}}.{{item_id}}."
+        "{{dimensions_md5}}.{{level}}".format(prefix=KEY_PREFIX),
+        "ttl": CONST_ONE_HOUR,
+        "backend": "service",
+        "field_tpl": "{field}",
+    }
+)
+
 NOTICE_VOICE_COLLECT_KEY = register_key_with_config(
     {
         "label": "[notice]电话单维度通知汇总",
@@ -557,6 +631,17 @@ ALERT_SNAPSHOT_KEY = register_key_with_config(
     }
 )
 
+ALERT_SNAPSHOT_DELTA_KEY = register_key_with_config(
+    {
+        "label": "[alert]告警内容快照增量字段",
+        "key_type": "hash",
+        "key_tpl": "alert.builder.snapshot.{strategy_id}.{alert_id}.delta",
+        "field_tpl": "{field}",
+        "ttl": 30 * CONST_MINUTES,
+        "backend": "service",
+    }
+)
+
 EVENT_PULL_LOCKS = register_key_with_config(
     {
         "label": "[alert]事件拉取锁",
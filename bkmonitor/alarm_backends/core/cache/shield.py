@@ -73,7 +73,20 @@ class ShieldCacheManager(CacheManager):
             }
         ]
         """
-        data = cls.cache.get(cls.CACHE_KEY_TEMPLATE.format(bk_biz_id))
+        return cls.parse_shields(cls.get_raw_shields_by_biz_id(bk_biz_id))
+
+    @classmethod
+    def get_raw_shields_by_biz_id(cls, bk_biz_id):
+        """
+        按业务ID获取未解析的屏蔽配置缓存内容
+        """
+        return cls.cache.get(cls.CACHE_KEY_TEMPLATE.format(bk_biz_id))
+
+    @classmethod
+    def parse_shields(cls, data):
+        """
+        解析屏蔽配置缓存内容
+        """
         if data:
             data = extended_json.loads(data)
             for shield in data:
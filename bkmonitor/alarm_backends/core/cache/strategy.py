@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 
 import copy
+import hashlib
 import json
 import logging
 import time
@@ -36,6 +37,7 @@ from bkmonitor.models import MetricListCache, StrategyHistoryModel, StrategyMode
 from bkmonitor.strategy.new_strategy import Strategy, parse_metric_id
 from bkmonitor.utils.common_utils import chunks, count_md5
 from bkmonitor.utils.kubernetes import is_k8s_target
+from bkmonitor.utils.thread_backend import ThreadPool
 from constants.cmdb import TargetNodeType
 from constants.data_source import DataSourceLabel, DataTypeLabel, UnifyQueryDataSources
 from constants.strategy import (
@@ -72,6 +74,10 @@ class StrategyCacheManager(CacheManager):
     STRATEGY_GROUP_CACHE_KEY = CacheManager.CACHE_KEY_PREFIX + ".strategy_group"
     # 最近增量更新时间
     LAST_UPDATED_CACHE_KEY = CacheManager.CACHE_KEY_PREFIX + ".last_updated"
+    # 策略内容摘要，用于差量写入策略缓存
+    DIGEST_CACHE_KEY = CacheManager.CACHE_KEY_PREFIX + ".strategy_digest"
+    # 差量写入策略缓存时，单个 pipeline 的命令数量
+    WRITE_CHUNK_SIZE = 1000
     # 事件型时序检测周期(默认60s)
     fake_event_agg_interval = 60
     # 实例维度
@@ -309,19 +315,17 @@ class StrategyCacheManager(CacheManager):
                     del value["bk_cloud_id"]
 
     @classmethod
-    def get_strategies(cls, filter_dict: Union[Dict, None] = None) -> List[Dict]:
+    def init_invalid_strategy_dict(cls, existed_biz_list=None) -> Dict:
         """
-        获取全部策略配置
+        初始化策略失效检测信息
         """
-        filter_dict: Dict = filter_dict or {}
-        # 初始化策略失效检测信息
-        invalid_strategy_dict = {
+        return {
             # 已检测的指标id缓存
             "checked_metric_ids": {"exists": set(), "not_exists": set()},
             # 已检测的单位缓存
             "loaded_unit": defaultdict(),
             # 现存业务id列表缓存
-            "existed_biz_list": list(BusinessManager.keys()),
+            "existed_biz_list": list(BusinessManager.keys()) if existed_biz_list is None else existed_biz_list,
             # 失效策略类型集合
             StrategyModel.InvalidType.INVALID_METRIC: set(),
             StrategyModel.InvalidType.INVALID_BIZ: set(),
@@ -333,10 +337,30 @@ class StrategyCacheManager(CacheManager):
             "related_ids_map": defaultdict(set),
         }
 
+    @classmethod
+    def merge_invalid_strategy_dict(cls, invalid_strategy_dict: Dict, other: Dict):
+        """
+        合并分片检测得到的策略失效信息
+        """
+        for invalid_type, _ in StrategyModel.InvalidType.Choices:
+            if invalid_type:
+                invalid_strategy_dict[invalid_type].update(other[invalid_type])
+        for related_id, strategy_ids in other["related_ids_map"].items():
+            invalid_strategy_dict["related_ids_map"][related_id].update(strategy_ids)
+
+    @classmethod
+    def load_strategies(cls, filter_dict: Dict, invalid_strategy_dict: Dict, timings: Dict = None) -> Dict[int, Dict]:
+        """
+        获取策略配置并进行预处理(不包含关联策略失效检测)
+        :param timings: 各阶段耗时
+        :return: {strategy_id: strategy_config}
+        """
+        start_time = time.time()
         strategy_configs_map = {
             strategy.id: strategy.to_dict()
             for strategy in Strategy.from_models(StrategyModel.objects.filter(is_enabled=True).filter(**filter_dict))
         }
+        fetched_time = time.time()
 
         result_map = {}
         cls.fake_event_agg_interval = getattr(settings, "FAKE_EVENT_AGG_INTERVAL", 60)
@@ -357,6 +381,20 @@ class StrategyCacheManager(CacheManager):
             except Exception as e:
                 logger.exception("refresh strategy error when handle_strategy", e)
 
+        if timings is not None:
+            timings["fetch"] = fetched_time - start_time
+            timings["handle"] = time.time() - fetched_time
+        return result_map
+
+    @classmethod
+    def get_strategies(cls, filter_dict: Union[Dict, None] = None) -> List[Dict]:
+        """
+        获取全部策略配置
+        """
+        filter_dict: Dict = filter_dict or {}
+        invalid_strategy_dict = cls.init_invalid_strategy_dict()
+        result_map = cls.load_strategies(filter_dict, invalid_strategy_dict)
+
         cls.check_related_strategy(result_map, invalid_strategy_dict)
 
         result = []
@@ -780,11 +818,20 @@ class StrategyCacheManager(CacheManager):
         """
         strategy_groups = defaultdict(lambda: defaultdict(list))
 
-        pipeline = cls.cache.pipeline()
+        if settings.STRATEGY_CACHE_SHARDED_REFRESH_ENABLED:
+            # 只写入内容有变更的策略，增量刷新时只包含部分业务的策略，不能清理其他策略的摘要
+            cls.write_changed_strategies(strategies, is_full=old_groups is None)
+            pipeline = cls.cache.pipeline()
+        else:
+            pipeline = cls.cache.pipeline()
+            # 全量写入时不维护摘要，清理掉避免下次差量写入时误判
+            pipeline.delete(cls.DIGEST_CACHE_KEY)
+            for strategy in strategies:
+                pipeline.set(
+                    cls.CACHE_KEY_TEMPLATE.format(strategy_id=strategy["id"]), json.dumps(strategy), cls.CACHE_TIMEOUT
+                )
+
         for strategy in strategies:
-            pipeline.set(
-                cls.CACHE_KEY_TEMPLATE.format(strategy_id=strategy["id"]), json.dumps(strategy), cls.CACHE_TIMEOUT
-            )
             # 默认周期 50s
             for item in strategy["items"]:
                 if item.get("query_md5"):
@@ -863,7 +910,7 @@ class StrategyCacheManager(CacheManager):
                 add_condition(enabled_cluster_map[bk_biz_id], strategy_config)
 
     @classmethod
-    def add_target_shield_condition(cls, strategy_configs: List[Dict]):
+    def add_target_shield_condition(cls, strategy_configs: List[Dict], cmdb_levels: List[str] = None):
         """
         添加监控目标抑制条件
         1. 主机目标抑制拓扑目标
@@ -900,7 +947,8 @@ class StrategyCacheManager(CacheManager):
             strategy_config for strategy_config in strategy_configs if is_valid_strategy_config(strategy_config)
         ]
 
-        cmdb_levels = [cmdb_level["bk_obj_id"] for cmdb_level in api.cmdb.get_mainline_object_topo()]
+        if cmdb_levels is None:
+            cmdb_levels = [cmdb_level["bk_obj_id"] for cmdb_level in api.cmdb.get_mainline_object_topo()]
 
         # 按业务、查询配置md5分组添加抑制条件
         strategy_configs.sort(key=itemgetter("bk_biz_id"))
@@ -922,8 +970,189 @@ class StrategyCacheManager(CacheManager):
             except Exception as e:
                 logger.exception("refresh strategy error when add_target_shield_condition", e)
 
+    @classmethod
+    def write_changed_strategies(cls, strategies: List[Dict], is_full: bool = False):
+        """
+        按策略内容摘要差量写入策略缓存
+        内容未变更的策略只续期，续期失败(缓存已不存在)的策略重新写入
+        :param is_full: 是否为全量刷新，全量刷新时清理已删除或禁用策略的摘要
+        """
+        if not strategies:
+            if is_full:
+                cls.cache.delete(cls.DIGEST_CACHE_KEY)
+            return
+
+        values = {strategy["id"]: json.dumps(strategy) for strategy in strategies}
+        digests = {
+            str(strategy_id): hashlib.md5(value.encode("utf-8")).hexdigest() for strategy_id, value in values.items()
+        }
+        strategy_ids = list(values.keys())
+        old_digests = []
+        for chunk_ids in chunks(strategy_ids, cls.WRITE_CHUNK_SIZE):
+            old_digests.extend(cls.cache.hmget(cls.DIGEST_CACHE_KEY, [str(strategy_id) for strategy_id in chunk_ids]))
+
+        changed_ids = []
+        unchanged_ids = []
+        for strategy_id, old_digest in zip(strategy_ids, old_digests):
+            if old_digest == digests[str(strategy_id)]:
+                unchanged_ids.append(strategy_id)
+            else:
+                changed_ids.append(strategy_id)
+
+        # 续期未变更的策略
+        for chunk_ids in chunks(unchanged_ids, cls.WRITE_CHUNK_SIZE):
+            pipeline = cls.cache.pipeline()
+            for strategy_id in chunk_ids:
+                pipeline.expire(cls.CACHE_KEY_TEMPLATE.format(strategy_id=strategy_id), cls.CACHE_TIMEOUT)
+            for strategy_id, is_existed in zip(chunk_ids, pipeline.execute()):
+                if not is_existed:
+                    changed_ids.append(strategy_id)
+
+        for chunk_ids in chunks(changed_ids, cls.WRITE_CHUNK_SIZE):
+            pipeline = cls.cache.pipeline()
+            for strategy_id in chunk_ids:
+                pipeline.set(
+                    cls.CACHE_KEY_TEMPLATE.format(strategy_id=strategy_id), values[strategy_id], cls.CACHE_TIMEOUT
+                )
+            pipeline.hmset(
+                cls.DIGEST_CACHE_KEY, {str(strategy_id): digests[str(strategy_id)] for strategy_id in chunk_ids}
+            )
+            pipeline.execute()
+
+        # 摘要哈希每次刷新都会续期，需要差量删除多余的字段，避免已删除的策略摘要不断累积
+        stale_fields = []
+        if is_full:
+            stale_fields = list(set(cls.cache.hkeys(cls.DIGEST_CACHE_KEY)) - set(digests))
+            for chunk_fields in chunks(stale_fields, cls.WRITE_CHUNK_SIZE):
+                cls.cache.hdel(cls.DIGEST_CACHE_KEY, *chunk_fields)
+        cls.cache.expire(cls.DIGEST_CACHE_KEY, cls.CACHE_TIMEOUT)
+
+        logger.info(
+            "[strategy_cache]: write strategies, changed: %s, unchanged: %s, pruned: %s",
+            len(changed_ids),
+            len(strategies) - len(changed_ids),
+            len(stale_fields),
+        )
+
+    @classmethod
+    def split_biz_shards(cls, shard_count: int) -> List[List[int]]:
+        """
+        按业务将策略分片，按策略数量均衡各分片
+        """
+        biz_strategy_counts = defaultdict(int)
+        for bk_biz_id in StrategyModel.objects.filter(is_enabled=True).values_list("bk_biz_id", flat=True):
+            biz_strategy_counts[bk_biz_id] += 1
+
+        shards = [[] for _ in range(shard_count)]
+        shard_sizes = [0] * shard_count
+        # 策略数多的业务优先分配到当前策略数最少的分片
+        for bk_biz_id, count in sorted(biz_strategy_counts.items(), key=lambda x: -x[1]):
+            index = shard_sizes.index(min(shard_sizes))
+            shards[index].append(bk_biz_id)
+            shard_sizes[index] += count
+        return [shard for shard in shards if shard]
+
+    @classmethod
+    def refresh_shard(cls, bk_biz_ids: List[int], existed_biz_list: List, cmdb_levels: List[str]):
+        """
+        分片处理策略：获取策略配置、预处理、添加目标抑制条件及集群过滤条件
+        以上处理都只依赖同业务下的策略，因此可以按业务分片并行执行
+        :return: (strategy_map, invalid_strategy_dict, timings)
+        """
+        timings = {}
+        invalid_strategy_dict = cls.init_invalid_strategy_dict(existed_biz_list)
+        result_map = cls.load_strategies({"bk_biz_id__in": bk_biz_ids}, invalid_strategy_dict, timings)
+        strategies = list(result_map.values())
+
+        start_time = time.time()
+        cls.add_target_shield_condition(strategies, cmdb_levels=cmdb_levels)
+        timings["target_shield"] = time.time() - start_time
+
+        start_time = time.time()
+        cls.add_enabled_cluster_condition(strategies)
+        timings["enabled_cluster"] = time.time() - start_time
+        return result_map, invalid_strategy_dict, timings
+
+    @classmethod
+    def sharded_refresh(cls):
+        """
+        分片并行刷新
+        1. 按业务分片，通过线程池并行获取及预处理策略
+        2. 合并分片结果后统一进行关联策略失效检测
+        3. 按策略内容摘要差量写入策略缓存，并刷新各类索引缓存
+        """
+        start_time = time.time()
+        exc = None
+
+        def observe(phase, duration):
+            metrics.STRATEGY_CACHE_REFRESH_PHASE_TIME.labels(phase).observe(duration)
+
+        result_map = {}
+        invalid_strategy_dict = cls.init_invalid_strategy_dict()
+        try:
+            shards = cls.split_biz_shards(settings.STRATEGY_CACHE_REFRESH_WORKERS)
+            cmdb_levels = [cmdb_level["bk_obj_id"] for cmdb_level in api.cmdb.get_mainline_object_topo()]
+            observe("prepare", time.time() - start_time)
+
+            phase_start_time = time.time()
+            pool = ThreadPool(max(len(shards), 1))
+            results = pool.map_ignore_exception(
+                cls.refresh_shard,
+                [(shard, invalid_strategy_dict["existed_biz_list"], cmdb_levels) for shard in shards],
+                return_exception=True,
+            )
+            pool.close()
+            observe("process", time.time() - phase_start_time)
+
+            for result in results:
+                if isinstance(result, Exception):
+                    # 部分分片失败时不能写入，否则会删除该分片下的策略缓存
+                    raise result
+                shard_result_map, shard_invalid_strategy_dict, timings = result
+                result_map.update(shard_result_map)
+                cls.merge_invalid_strategy_dict(invalid_strategy_dict, shard_invalid_strategy_dict)
+                for phase, duration in timings.items():
+                    observe(f"shard_{phase}", duration)
+
+            phase_start_time = time.time()
+            cls.check_related_strategy(result_map, invalid_strategy_dict)
+            observe("check_related", time.time() - phase_start_time)
+        except Exception as e:
+            # 策略不完整时不刷新缓存，保留上一次的结果
+            logger.exception("refresh strategy error when process strategies")
+            metrics.ALARM_CACHE_TASK_TIME.labels("0", "strategy", str(e)).observe(time.time() - start_time)
+            metrics.report_all()
+            return
+
+        strategies = list(result_map.values())
+        processors: List[Callable[[List[Dict]], None]] = [
+            cls.refresh_strategy_ids,
+            cls.refresh_bk_biz_ids,
+            cls.refresh_strategy,
+            cls.refresh_real_time_strategy_ids,
+            cls.refresh_gse_alarm_strategy_ids,
+            cls.refresh_fta_alert_strategy_ids,
+        ]
+
+        for processor in processors:
+            phase_start_time = time.time()
+            try:
+                processor(strategies)
+            except Exception as e:
+                logger.exception(f"refresh strategy error when {processor.__name__}")
+                exc = e
+            observe(processor.__name__, time.time() - phase_start_time)
+
+        duration = time.time() - start_time
+        logger.info(f"[strategy_cache]: sharded refresh {len(strategies)} strategies done, cost: {duration}")
+        metrics.ALARM_CACHE_TASK_TIME.labels("0", "strategy", str(exc)).observe(duration)
+        metrics.report_all()
+
     @classmethod
     def refresh(cls):
+        if settings.STRATEGY_CACHE_SHARDED_REFRESH_ENABLED:
+            return cls.sharded_refresh()
+
         start_time = time.time()
         exc = None
 
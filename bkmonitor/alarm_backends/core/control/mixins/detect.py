@@ -18,6 +18,7 @@ from django.utils.translation import ugettext as _
 from alarm_backends.constants import LATEST_POINT_WITH_ALL_KEY
 from alarm_backends.core.cache.key import LAST_CHECKPOINTS_CACHE_KEY
 from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
+from alarm_backends.core.detect_result.ring import add_check_result_cache_with_ring
 from bkmonitor.utils.common_utils import chunks
 from bkmonitor.utils.text import camel_to_underscore
 from constants.data_source import DataTypeLabel
@@ -81,7 +82,11 @@ class DetectMixin(object):
             else:
                 # 组合策略
                 anomaly_records = []
-                for data_point in data_points:
+                candidate_masks = [d.safe_batch_detect_mask(data_points) for d in detector_list]
+                for idx, data_point in enumerate(data_points):
+                    if self._is_normal_by_batch_detect(candidate_masks, idx, algorithm_connector):
+                        continue
+
                     ap = None
                     prefix = suffix = ""
                     for d in detector_list:
@@ -130,6 +135,18 @@ class DetectMixin(object):
 
         return list(detected_result_dict.values())
 
+    @staticmethod
+    def _is_normal_by_batch_detect(candidate_masks, idx, algorithm_connector):
+        """
+        根据批量预检测结果判断数据点是否必定正常
+        and: 任一算法确认正常即为正常
+        or: 所有算法都确认正常才为正常
+        """
+        is_normal_list = [mask is not None and not mask[idx] for mask in candidate_masks]
+        if algorithm_connector != "or":
+            return any(is_normal_list)
+        return all(is_normal_list)
+
     def _update_anomaly_info_with_point(self, anomaly_point, level, info_collection=None):
         info_collection = info_collection or {
             "data": anomaly_point.data_point.as_dict(),
@@ -153,6 +170,7 @@ class DetectMixin(object):
         last_checkpoints = {}
         anomaly_record_ids = {i.data_point.record_id for i in anomaly_records}
         latest_point_with_all = 0
+        check_window_unit = self.strategy.get_check_window_unit(self.item_config)
         for d in records:
             # data_record 的record_id规则： {dimensions_md5}.{timestamp}
             dimensions_md5, timestamp = d.record_id.split(".")
@@ -170,8 +188,9 @@ class DetectMixin(object):
 
             try:
                 # 1. 缓存数据(检测结果缓存) type:SortedSet
-                kwargs = {name: timestamp}
-                check_result.add_check_result_cache(**kwargs)
+                add_check_result_cache_with_ring(
+                    check_result, name, timestamp, check_window_unit, d.record_id in anomaly_record_ids
+                )
 
                 # 2. 缓存最后checkpoint type:Hash，先放到内存里，最后再一次性写入redis
                 last_point = last_checkpoints.setdefault(dimensions_md5, 0)
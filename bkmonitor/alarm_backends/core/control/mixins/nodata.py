@@ -25,7 +25,8 @@ from alarm_backends.constants import (
 )
 from alarm_backends.core.cache import key
 from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
-from bkmonitor.utils.common_utils import count_md5
+from alarm_backends.core.detect_result.ring import add_check_result_cache_with_ring
+from bkmonitor.utils.fingerprint import dimension_fingerprint
 
 logger = logging.getLogger("core.control")
 
@@ -54,7 +55,7 @@ class CheckMixin(object):
 
         # 4.1 如果检测历史维度范围为空，并且当前无上报数据，则以整体维度告警
         total_no_data_dimensions = [{NO_DATA_TAG_DIMENSION: True}]
-        total_no_data_md5 = [count_md5(total_no_data_dimensions[0])]
+        total_no_data_md5 = [dimension_fingerprint(total_no_data_dimensions[0])]
         if not (target_instance_dimensions or data_dimensions):
             logger.warning(
                 "[nodata] strategy({strategy_id}) item({item_id}) target_instance_dimensions is empty".format(
@@ -90,7 +91,7 @@ class CheckMixin(object):
             target_dimensions_md5 = []
             last_check_cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=self.strategy.id, item_id=self.id)
             for target_inst_dms in target_instance_dimensions:
-                target_dms_md5 = count_md5(target_inst_dms)
+                target_dms_md5 = dimension_fingerprint(target_inst_dms)
                 target_dimensions_md5.append(target_dms_md5)
                 # 之前检测的数据最后上报点
                 last_checkpoint_cache_field = key.LAST_CHECKPOINTS_CACHE_KEY.get_field(
@@ -124,7 +125,7 @@ class CheckMixin(object):
 
             # 6. 如果有不存在的目标实例，生成异常记录
             for missing_target_inst in missing_target_instances:
-                missing_target_md5 = count_md5(missing_target_inst)
+                missing_target_md5 = dimension_fingerprint(missing_target_inst)
                 anomaly_data.append(
                     self._produce_anomaly_info(check_timestamp, missing_target_inst, missing_target_md5)
                 )
@@ -173,7 +174,7 @@ class CheckMixin(object):
                     dimensions.pop(k)
 
             dimensions.update({NO_DATA_TAG_DIMENSION: True})
-            dimensions_md5 = count_md5(dimensions)
+            dimensions_md5 = dimension_fingerprint(dimensions)
             if dimensions_md5 not in dimensions_md5_timestamp:
                 data_dimensions.append(dimensions)
                 data_dimensions_mds.append(dimensions_md5)
@@ -300,6 +301,7 @@ class CheckMixin(object):
         redis_pipeline = None
         processed = set()
         all_dimensions_md5 = target_dimensions_md5 + data_dimensions_md5
+        check_window_unit = self.strategy.get_check_window_unit(self.item_config)
         loop = 0
         for _dms in chain(target_instance_dimensions, data_dimensions):
             dimensions_md5 = all_dimensions_md5[loop]
@@ -324,8 +326,9 @@ class CheckMixin(object):
 
             try:
                 # 1. 缓存数据(检测结果缓存) type:SortedSet
-                kwargs = {name: check_timestamp}
-                check_result.add_check_result_cache(**kwargs)
+                add_check_result_cache_with_ring(
+                    check_result, name, check_timestamp, check_window_unit, dimensions_md5 not in data_dimensions_md5
+                )
 
                 if self.no_data_config.get("is_enabled"):
                     # 2. 缓存数据(维度缓存) type:Hash
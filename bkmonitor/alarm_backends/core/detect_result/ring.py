@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+
+# 检测结果环形位图
+# 每个维度、级别使用一个 Hash 记录最近 N 个检测周期的检测状态:
+#   p: 最新检测周期序号(时间戳 // 检测周期)
+#   u: 检测周期(秒)
+#   r: 长度为 N 的状态串，周期序号 % N 为槽位下标，槽位取值为 RING_EMPTY / RING_NORMAL / RING_ANOMALY
+
+from django.conf import settings
+
+from alarm_backends.core.cache import key
+from alarm_backends.core.detect_result import ANOMALY_LABEL
+
+RING_EMPTY = "-"
+RING_NORMAL = "0"
+RING_ANOMALY = "1"
+
+RING_FIELDS = ("p", "u", "r")
+
+# KEYS[1]: 环形位图key，KEYS[2]: 检测结果有序集合key
+# ARGV: 数据时间戳，检测周期，槽位数量，检测状态，位图过期时间，检测结果，检测结果过期时间
+# 检测结果有序集合仍需保留(恢复检测需要其中的数值)，与位图在同一个脚本中写入，每个数据点只需一条命令
+UPDATE_RING_SCRIPT = """
+redis.call("ZADD", KEYS[2], ARGV[1], ARGV[6])
+redis.call("EXPIRE", KEYS[2], ARGV[7])
+local period = math.floor(tonumber(ARGV[1]) / tonumber(ARGV[2]))
+local size = tonumber(ARGV[3])
+local state = redis.call("HMGET", KEYS[1], "p", "u", "r")
+local latest, ring = tonumber(state[1]), state[3]
+if not latest or state[2] ~= ARGV[2] or not ring or string.len(ring) ~= size then
+    latest, ring = period, string.rep("-", size)
+end
+if period > latest then
+    for p = math.max(latest + 1, period - size + 1), period do
+        local i = p % size + 1
+        ring = string.sub(ring, 1, i - 1) .. "-" .. string.sub(ring, i + 1)
+    end
+    latest = period
+elseif period <= latest - size then
+    return 0
+end
+local i = period % size + 1
+ring = string.sub(ring, 1, i - 1) .. ARGV[4] .. string.sub(ring, i + 1)
+redis.call("HMSET", KEYS[1], "p", latest, "u", ARGV[2], "r", ring)
+redis.call("EXPIRE", KEYS[1], ARGV[5])
+return 1
+"""
+
+
+def get_ring_key(check_result_cache_key):
+    """
+    根据检测结果缓存key获取对应的环形位图key
+    """
+    _, strategy_id, item_id, dimensions_md5, level = check_result_cache_key.rsplit(".", 4)
+    return key.CHECK_RESULT_RING_KEY.get_key(
+        strategy_id=strategy_id, item_id=item_id, dimensions_md5=dimensions_md5, level=level
+    )
+
+
+def add_check_result_cache_with_ring(check_result, name, timestamp, unit, is_anomaly):
+    """
+    在检测结果写入的 pipeline 中写入检测结果缓存，开启环形位图时同步更新位图
+    :param CheckResult check_result: 检测结果对象
+    :param name: 检测结果，正常为 "timestamp|value"，异常为 "timestamp|ANOMALY"
+    """
+    if not settings.CHECK_RESULT_RING_ENABLED:
+        check_result.add_check_result_cache(**{name: timestamp})
+        return
+
+    ring_key = get_ring_key(check_result.check_result_cache_key)
+    timestamp, unit = int(timestamp), int(unit)
+    if timestamp % unit:
+        # 数据时间未按检测周期对齐时无法映射到槽位，删除位图使触发判断回退到检测结果有序集合
+        check_result.add_check_result_cache(**{name: timestamp})
+        check_result.CHECK_RESULT.delete(ring_key)
+        return
+
+    size = settings.CHECK_RESULT_RING_SIZE
+    check_result.CHECK_RESULT.execute_script(
+        UPDATE_RING_SCRIPT,
+        keys=[ring_key, check_result.check_result_cache_key],
+        args=[
+            timestamp,
+            unit,
+            size,
+            RING_ANOMALY if is_anomaly else RING_NORMAL,
+            max(key.CHECK_RESULT_RING_KEY.ttl, unit * size),
+            name,
+            key.CHECK_RESULT_CACHE_KEY.ttl,
+        ],
+    )
+
+
+def get_check_results_from_ring(ring_data, unit, min_score, max_score):
+    """
+    从环形位图中还原检测窗口内的检测结果，格式与 zrangebyscore(withscores=True) 的结果一致
+    位图不存在、检测周期不一致或未完整覆盖检测窗口时返回 None，由调用方回退到检测结果有序集合
+    :param ring_data: hmget 获取的 [p, u, r]
+    """
+    latest_period, ring_unit, ring = ring_data
+    if not (latest_period and ring_unit and ring) or int(ring_unit) != unit:
+        return None
+
+    latest_period = int(latest_period)
+    size = len(ring)
+    start_period = -(-int(min_score) // unit)
+    end_period = min(int(max_score) // unit, latest_period)
+    if start_period <= latest_period - size:
+        return None
+
+    check_results = []
+    for period in range(start_period, end_period + 1):
+        state = ring[period % size]
+        if state == RING_EMPTY:
+            continue
+        timestamp = period * unit
+        label = "{}|{}".format(timestamp, ANOMALY_LABEL if state == RING_ANOMALY else "")
+        check_results.append((label, float(timestamp)))
+    return check_results
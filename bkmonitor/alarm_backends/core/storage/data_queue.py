@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+access -> detect 数据队列编解码
+
+队列元素支持两种格式：
+1. 旧格式(json): 每个元素为一条记录的 json 字符串
+2. 批量格式(msgpack): 每个元素包含多条记录，格式为 "{BATCH_PREFIX}{version}|{count}|{payload}"
+   其中 payload 为 msgpack 序列化后的记录列表，按 latin1 解码为字符串后写入 redis(redis 客户端开启了 decode_responses)
+
+读取端同时兼容两种格式，保证滚动升级期间新旧数据都能被正确处理。
+
+批量格式下队列长度不等于记录数，写入端同时维护一个记录数计数(DATA_LIST_RECORD_COUNT_KEY)，读取端出队后扣减。
+"""
+
+import json
+import math
+from typing import Dict, List, Tuple
+
+import msgpack
+from django.conf import settings
+
+# json 记录一定以 "{" 开头，批量格式使用不可见字符作为前缀以便区分
+BATCH_PREFIX = "\x00bkq"
+BATCH_VERSION = 1
+BATCH_HEADER_SEP = "|"
+
+# 分页拉取时首页大小
+FIRST_PAGE_SIZE = 1000
+
+
+def is_batch_element(element: str) -> bool:
+    return element.startswith(BATCH_PREFIX)
+
+
+def _parse_batch_header(element: str) -> Tuple[int, int, int]:
+    """
+    :return: (version, count, payload_offset)
+    """
+    version_end = element.index(BATCH_HEADER_SEP, len(BATCH_PREFIX))
+    count_end = element.index(BATCH_HEADER_SEP, version_end + 1)
+    version = int(element[len(BATCH_PREFIX) : version_end])
+    count = int(element[version_end + 1 : count_end])
+    return version, count, count_end + 1
+
+
+def encode_records(records: List[Dict], batch_size: int = None) -> List[str]:
+    """
+    将记录编码为队列元素
+    :param records: 记录列表(record.data)
+    :param batch_size: 每个元素包含的最大记录数
+    """
+    if not settings.DATA_QUEUE_BATCH_ENCODING_ENABLED:
+        return [json.dumps(record) for record in records]
+
+    batch_size = batch_size or settings.DATA_QUEUE_BATCH_SIZE
+    elements = []
+    for offset in range(0, len(records), batch_size):
+        chunk = records[offset : offset + batch_size]
+        payload = msgpack.packb(chunk, use_bin_type=True).decode("latin1")
+        elements.append(
+            "{prefix}{version}{sep}{count}{sep}{payload}".format(
+                prefix=BATCH_PREFIX, version=BATCH_VERSION, sep=BATCH_HEADER_SEP, count=len(chunk), payload=payload
+            )
+        )
+    return elements
+
+
+def count_element_records(element: str) -> int:
+    """
+    获取队列元素包含的记录数，无需反序列化
+    """
+    if not is_batch_element(element):
+        return 1
+    try:
+        return _parse_batch_header(element)[1]
+    except ValueError:
+        return 1
+
+
+def decode_element(element: str) -> List[Dict]:
+    """
+    解码队列元素，格式错误时抛出 ValueError
+    """
+    if not is_batch_element(element):
+        return [json.loads(element)]
+
+    version, count, payload_offset = _parse_batch_header(element)
+    if version != BATCH_VERSION:
+        raise ValueError("unsupported data queue batch version: {}".format(version))
+
+    try:
+        records = msgpack.unpackb(element[payload_offset:].encode("latin1"), raw=False)
+    except Exception as e:
+        raise ValueError("invalid data queue batch payload: {}".format(e))
+
+    if not isinstance(records, list) or len(records) != count:
+        raise ValueError("data queue batch records count mismatch, expect {}".format(count))
+    return records
+
+
+def incr_record_count(pipeline, count_key: str, record_count: int, ttl: int):
+    """
+    写入队列时增加记录数计数，需与写入队列使用同一个 pipeline
+    """
+    pipeline.incrby(count_key, record_count)
+    pipeline.expire(count_key, ttl)
+
+
+def get_record_count(client, queue_key: str, count_key: str) -> int:
+    """
+    获取队列中的记录数
+    滚动升级期间旧版写入的元素没有计数，每个元素至少包含一条记录，因此取计数与队列长度的较大值
+    """
+    pipeline = client.pipeline(transaction=False)
+    pipeline.llen(queue_key)
+    pipeline.get(count_key)
+    length, count = pipeline.execute()
+    return max(length, int(count or 0))
+
+
+def pull_elements(client, queue_key: str, max_records: int, count_key: str = None) -> Tuple[List[str], int]:
+    """
+    从队列右侧(先进的一端)按先进先出顺序拉取元素，并从队列中移除
+    拉取的记录总数不超过 max_records(至少拉取一个元素)
+    指定 count_key 时同时扣减队列的记录数计数
+
+    新旧格式元素包含的记录数不同，因此按平均每个元素的记录数分页拉取：
+    旧格式队列与原来一样最多两次 lrange，批量格式队列则避免一次拉取过多元素
+    :return: (elements, record_count)
+    """
+    total = client.llen(queue_key)
+    elements = []
+    record_count = 0
+    page_size = min(total, max_records, FIRST_PAGE_SIZE)
+    is_full = False
+
+    while page_size > 0 and not is_full:
+        start = len(elements)
+        page = client.lrange(queue_key, -(start + page_size), -(start + 1))
+        if not page:
+            break
+
+        # 队列左进右出，lrange 取出时需要做一次倒序才能保证先进先出
+        for element in reversed(page):
+            count = count_element_records(element)
+            if elements and record_count + count > max_records:
+                is_full = True
+                break
+            elements.append(element)
+            record_count += count
+
+        if record_count >= max_records:
+            break
+
+        average = record_count / len(elements)
+        page_size = min(total - len(elements), math.ceil((max_records - record_count) / average))
+
+    if elements:
+        client.ltrim(queue_key, 0, -len(elements) - 1)
+        if count_key:
+            release_record_count(client, queue_key, count_key, record_count)
+    return elements, record_count
+
+
+def release_record_count(client, queue_key: str, count_key: str, record_count: int):
+    """
+    出队后扣减记录数计数，计数不存在时不处理(未开启批量格式)
+    队列已清空或计数不为正数时删除计数，避免写入端与读取端并发导致的偏差累积
+    """
+    if not client.exists(count_key):
+        return
+    remaining = client.decrby(count_key, record_count)
+    if remaining <= 0 or not client.llen(queue_key):
+        client.delete(count_key)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+ES 异步批量写入
+
+进程内汇总多个任务的文档写入请求，由后台线程按文档数或时间间隔批量写入 ES，写入失败的文档按指数退避重试
+
+celery prefork 子进程通过 os._exit 退出，不会执行 atexit 注册的函数，因此在子进程退出时需要同步刷新
+子进程因 max_tasks_per_child 被回收时同样会发送 worker_process_shutdown 信号
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import List, Type
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from elasticsearch.helpers import BulkIndexError, streaming_bulk
+
+from bkmonitor.documents.base import BaseDocument, BulkActionType
+from core.prometheus import metrics
+
+logger = logging.getLogger("core.storage.es_bulk_writer")
+
+
+class ESBulkWriter(object):
+    # 可重试的写入状态码，其他状态码(如文档格式错误)重试也无法成功
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    # 等待后台线程刷新的最长时间(秒)，超时后由调用方直接写入
+    FLUSH_TIMEOUT = 60
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue_size=None, max_retries=None, retry_backoff=None):
+        self.batch_size = batch_size or settings.ES_BULK_WRITER_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.ES_BULK_WRITER_FLUSH_INTERVAL
+        self.max_queue_size = max_queue_size or settings.ES_BULK_WRITER_MAX_QUEUE_SIZE
+        self.max_retries = settings.ES_BULK_WRITER_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.ES_BULK_WRITER_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+
+        # 待写入文档 (文档类, bulk action, 已重试次数)
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+        # 等待重试的文档 (下次重试时间, 文档类, bulk action, 已重试次数)
+        self.retry_items = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def add(self, documents: List[BaseDocument], action=BulkActionType.CREATE):
+        """
+        添加待写入的文档
+        """
+        self.ensure_started()
+
+        overflow_items = []
+        for document in documents:
+            item = (document.__class__, document.prepare_action(action), 0)
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                overflow_items.append(item)
+
+        # 待写入文档过多时直接同步写入，避免内存无限增长
+        if overflow_items:
+            logger.warning("es bulk writer queue is full, write %s documents synchronously", len(overflow_items))
+            self.write(overflow_items)
+
+    def ensure_started(self):
+        """
+        启动后台写入线程，fork 后的子进程需要重新启动
+        """
+        if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+            return
+
+        with self.lock:
+            if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+                return
+
+            if self.pid != os.getpid():
+                # 子进程不继承父进程中尚未写入的文档
+                self.queue = queue.Queue(maxsize=self.max_queue_size)
+                self.retry_items = []
+                self.pid = os.getpid()
+                atexit.register(self.flush)
+
+            self.thread = threading.Thread(target=self.run, name="es_bulk_writer", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            flush_event = None
+            try:
+                items, flush_event = self.collect()
+                if flush_event:
+                    # 刷新请求之前入队的文档均已取出，连同等待重试的文档一起写入
+                    self.write_all(items + self.pop_retry_items(force=True))
+                elif items:
+                    self.write(items)
+            except Exception as e:
+                logger.exception("es bulk writer run error: %s", e)
+            finally:
+                if flush_event:
+                    flush_event.set()
+
+    def collect(self):
+        """
+        收集待写入的文档，达到单批最大文档数、超过刷新间隔或收到刷新请求时返回
+        :return: (待写入文档, 刷新请求)
+        """
+        items = self.pop_retry_items()
+        deadline = time.time() + self.flush_interval
+        while len(items) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                return items, item
+            items.append(item)
+        return items, None
+
+    def pop_retry_items(self, force=False):
+        """
+        取出已到重试时间的文档
+        """
+        now = time.time()
+        with self.lock:
+            ready_items = [item for item in self.retry_items if force or item[0] <= now]
+            self.retry_items = [item for item in self.retry_items if not (force or item[0] <= now)]
+        return [(document_cls, action, retries) for _, document_cls, action, retries in ready_items]
+
+    def flush(self):
+        """
+        同步写入当前所有待写入及等待重试的文档
+        后台线程运行时，通过队列发送刷新请求并等待完成，保证后台线程已取出但尚未写入的文档也被写入
+        """
+        if self.pid not in (None, os.getpid()):
+            # fork 后尚未使用，队列中是父进程的文档，由父进程负责写入
+            return
+
+        thread = self.thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            flush_event = threading.Event()
+            try:
+                self.queue.put(flush_event, timeout=self.FLUSH_TIMEOUT)
+                if flush_event.wait(self.FLUSH_TIMEOUT):
+                    return
+            except queue.Full:
+                pass
+            logger.warning("es bulk writer flush timeout, write pending documents directly")
+
+        items = self.pop_retry_items(force=True)
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                items.append(item)
+        self.write_all(items)
+
+    def write_all(self, items):
+        """
+        按单批最大文档数分批写入，不再重试
+        """
+        for offset in range(0, len(items), self.batch_size):
+            self.write(items[offset : offset + self.batch_size], retry=False)
+
+    @staticmethod
+    def send(document_cls: Type[BaseDocument], actions: List[dict]):
+        """
+        批量写入，返回每个文档的写入结果 [(是否成功, 结果详情)]
+        """
+        return list(
+            streaming_bulk(
+                document_cls._get_connection(),
+                actions,
+                chunk_size=len(actions),
+                max_retries=0,
+                raise_on_error=False,
+                raise_on_exception=False,
+                request_timeout=document_cls.ES_REQUEST_TIMEOUT,
+            )
+        )
+
+    def write(self, items, retry=True):
+        """
+        按文档类分组写入，失败的文档按指数退避等待重试
+        """
+        document_items = defaultdict(list)
+        for item in items:
+            document_items[item[0]].append(item)
+
+        for document_cls, cls_items in document_items.items():
+            document_name = document_cls.__name__
+            start_time = time.time()
+            try:
+                results = self.send(document_cls, [action for _, action, _ in cls_items])
+            except Exception as e:
+                logger.exception("es bulk writer send %s documents error: %s", document_name, e)
+                results = [(False, {action["_op_type"]: {"error": str(e)}}) for _, action, _ in cls_items]
+            metrics.ES_BULK_WRITER_FLUSH_TIME.labels(document=document_name).observe(time.time() - start_time)
+
+            success_count = 0
+            retry_items = []
+            failed_results = []
+            for (_, action, retries), (ok, result) in zip(cls_items, results):
+                status = (list(result.values())[0] or {}).get("status") if result else None
+                # 请求异常(无状态码)或服务端繁忙时可重试
+                retryable = not isinstance(status, int) or status in self.RETRY_STATUS
+                if ok or (status == 409 and action["_op_type"] == BulkActionType.CREATE):
+                    # create 冲突说明文档已存在(如重试前已写入成功)
+                    success_count += 1
+                elif retry and retries < self.max_retries and retryable:
+                    retry_time = time.time() + self.retry_backoff * 2**retries
+                    retry_items.append((retry_time, document_cls, action, retries + 1))
+                else:
+                    failed_results.append(result)
+
+            if retry_items:
+                with self.lock:
+                    self.retry_items.extend(retry_items)
+            if failed_results:
+                logger.error(
+                    "es bulk writer save %s documents failed(%s), one of errors: %s",
+                    document_name,
+                    len(failed_results),
+                    failed_results[0],
+                )
+
+            metrics.ES_BULK_WRITER_DOCUMENT_COUNT.labels(document=document_name, status="success").inc(success_count)
+            metrics.ES_BULK_WRITER_DOCUMENT_COUNT.labels(document=document_name, status="retry").inc(len(retry_items))
+            metrics.ES_BULK_WRITER_DOCUMENT_COUNT.labels(document=document_name, status="failed").inc(
+                len(failed_results)
+            )
+
+        metrics.ES_BULK_WRITER_QUEUE_SIZE.labels(type="pending").set(self.queue.qsize())
+        metrics.ES_BULK_WRITER_QUEUE_SIZE.labels(type="retry").set(len(self.retry_items))
+
+
+bulk_writer = ESBulkWriter()
+
+
+def bulk_save(documents: List[BaseDocument], action=BulkActionType.CREATE):
+    """
+    批量保存文档，开启异步批量写入时由后台线程汇总写入，否则直接同步写入
+    两种方式下写入失败均只记录日志，不抛出异常
+    """
+    if not documents:
+        return
+    if settings.ES_BULK_WRITER_ENABLED:
+        bulk_writer.add(documents, action=action)
+        return
+
+    document_cls = documents[0].__class__
+    try:
+        document_cls.bulk_create(documents, action=action)
+    except BulkIndexError as e:
+        logger.error(
+            "save %s documents failed(%s), one of errors: %s", document_cls.__name__, len(e.errors), e.errors[0]
+        )
+
+
+@worker_process_shutdown.connect
+def flush_on_worker_process_shutdown(**kwargs):
+    """
+    子进程退出(包括 max_tasks_per_child 回收)前写入本进程内待写入的文档
+    任务结束时不刷新，以便跨任务汇总写入
+    """
+    bulk_writer.flush()
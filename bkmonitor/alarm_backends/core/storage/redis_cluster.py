@@ -8,9 +8,14 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import os
+import threading
+from collections import defaultdict
+
 from alarm_backends.core.cluster import get_cluster
 from alarm_backends.core.storage.redis import CACHE_BACKEND_CONF_MAP, Cache
 from bkmonitor.models import CacheNode, CacheRouter
+from bkmonitor.utils.thread_backend import ThreadPool
 
 
 class RedisNode(object):
@@ -91,6 +96,9 @@ def setup_sentinel_client(node, backend):
 
 
 class KeyRouterMixin(object):
+    # 脚本类命令的第一个参数为脚本，需要按 KEYS 中的第一个 key 进行路由
+    SCRIPT_COMMANDS = ("eval", "evalsha")
+
     def strategy_id_from_command(self, *args, **kwargs):
         key = self.key_from_command(*args, **kwargs)
         return self.strategy_id_from_key(key)
@@ -104,12 +112,24 @@ class KeyRouterMixin(object):
             key = args[0]
         return key
 
+    def key_from_script_command(self, *args, **kwargs):
+        # eval(script, numkeys, *keys_and_args)
+        if len(args) > 2 and int(args[1]) > 0:
+            return args[2]
+        return None
+
 
 class RedisProxy(KeyRouterMixin):
+    # 按节点并发执行命令的线程数
+    NODE_POOL_SIZE = 8
+
     def __init__(self, backend):
         self.backend = backend
         self._pipeline = None
         self._client_pool = {}
+        self._node_pool = None
+        self._node_pool_pid = None
+        self._node_pool_lock = threading.Lock()
 
     def pipeline(self, *args, **kwargs):
         if self._pipeline is None:
@@ -122,22 +142,93 @@ class RedisProxy(KeyRouterMixin):
 
         return self._client_pool[node.id]
 
+    def call_command(self, client, name, *args, **kwargs):
+        exception = None
+        command = getattr(client, name)
+        for _ in range(3):
+            try:
+                return command(*args, **kwargs)
+            except ConnectionError as err:
+                exception = err
+                client.refresh_instance()
+        if exception:
+            raise exception
+
+    def mget_by_node(self, keys, chunk_size=1000):
+        """
+        按 key 所属的路由节点分组批量获取，结果顺序与 keys 一致
+        mget 命令只能按第一个 key 路由，不同节点的 key 需要分别获取
+        """
+        nodes = {}
+        node_keys = defaultdict(list)
+        for index, key in enumerate(keys):
+            cache_node = get_node_by_strategy_id(self.strategy_id_from_key(key))
+            nodes[cache_node.id] = cache_node
+            node_keys[cache_node.id].append((index, key))
+
+        result = [None] * len(keys)
+        for node_id, indexed_keys in node_keys.items():
+            client = self.get_client(nodes[node_id])
+            for start in range(0, len(indexed_keys), chunk_size):
+                chunk = indexed_keys[start : start + chunk_size]
+                values = self.call_command(client, "mget", [key for _, key in chunk])
+                for (index, _), value in zip(chunk, values):
+                    result[index] = value
+        return result
+
+    def get_node_pool(self):
+        """
+        获取按节点并发执行的线程池，进程内复用，fork 出的子进程中重新创建
+        """
+        with self._node_pool_lock:
+            if self._node_pool is None or self._node_pool_pid != os.getpid():
+                self._node_pool = ThreadPool(self.NODE_POOL_SIZE)
+                self._node_pool_pid = os.getpid()
+            return self._node_pool
+
+    def execute_by_node(self, commands):
+        """
+        按 key 所属的路由节点分组，每个节点使用独立的 pipeline 并发执行，结果顺序与 commands 一致
+        :param commands: [(命令名, key, 其他参数元组)]
+        """
+        nodes = {}
+        node_commands = defaultdict(list)
+        for index, (name, key, args) in enumerate(commands):
+            cache_node = get_node_by_strategy_id(self.strategy_id_from_key(key))
+            nodes[cache_node.id] = cache_node
+            node_commands[cache_node.id].append((index, name, key, args))
+
+        def execute(node_id):
+            pipeline = self.get_client(nodes[node_id]).pipeline(transaction=False)
+            for _, name, key, args in node_commands[node_id]:
+                getattr(pipeline, name)(key, *args)
+            return node_id, pipeline.execute()
+
+        if len(node_commands) > 1:
+            node_results = self.get_node_pool().map_ignore_exception(
+                execute, list(node_commands), return_exception=True
+            )
+        else:
+            node_results = [execute(node_id) for node_id in node_commands]
+
+        result = [None] * len(commands)
+        for node_result in node_results:
+            if isinstance(node_result, Exception):
+                raise node_result
+            node_id, values = node_result
+            for (index, _, _, _), value in zip(node_commands[node_id], values):
+                result[index] = value
+        return result
+
     def __getattr__(self, name):
         def handle(*args, **kwargs):
-            exception = None
-            strategy_id = self.strategy_id_from_command(*args, **kwargs)
+            if name in self.SCRIPT_COMMANDS:
+                strategy_id = self.strategy_id_from_key(self.key_from_script_command(*args, **kwargs))
+            else:
+                strategy_id = self.strategy_id_from_command(*args, **kwargs)
             cache_node = get_node_by_strategy_id(strategy_id)
             client = self.get_client(cache_node)
-            command = getattr(client, name)
-
-            for _ in range(3):
-                try:
-                    return command(*args, **kwargs)
-                except ConnectionError as err:
-                    exception = err
-                    client.refresh_instance()
-            if exception:
-                raise exception
+            return self.call_command(client, name, *args, **kwargs)
 
         return handle
 
@@ -148,6 +239,7 @@ class PipelineProxy(KeyRouterMixin):
     def __init__(self, node_proxy, *args, **kwargs):
         self.node_proxy = node_proxy
         self._pipeline_pool = {}
+        self._scripts = {}
         self.init_params = (args, kwargs)
         self.command_stack = []
 
@@ -170,9 +262,24 @@ class PipelineProxy(KeyRouterMixin):
         self.command_stack = []
         return result
 
+    def execute_script(self, script, keys, args):
+        """
+        按 KEYS 中的第一个 key 路由执行 lua 脚本
+        脚本以 EVALSHA 发送，节点 pipeline 执行前会检查并加载缺失的脚本，避免每次调用都传输脚本内容
+        """
+        cache_node = get_node_by_strategy_id(self.strategy_id_from_key(keys[0]))
+        pipeline = self.pipeline_instance(cache_node)
+        if script not in self._scripts:
+            self._scripts[script] = pipeline.register_script(script)
+        self.command_stack.append(cache_node.id)
+        return self._scripts[script](keys=keys, args=args, client=pipeline)
+
     def __getattr__(self, name):
         def handle(*args, **kwargs):
-            key = self.key_from_command(*args, **kwargs)
+            if name in self.SCRIPT_COMMANDS:
+                key = self.key_from_script_command(*args, **kwargs)
+            else:
+                key = self.key_from_command(*args, **kwargs)
             if key is None:
                 if name not in self.ALLOWED_METHOD:
                     return self.execute()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+CMDB 缓存编码格式性能对比
+
+python manage.py benchmark_cmdb_codec --count 100000 --redis
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.core.cache.cmdb import HostManager
+from alarm_backends.core.cache.cmdb.codec import CompactCodec, PickleCodec, decode
+from api.cmdb.define import Host, TopoNode
+from bkmonitor.utils.common_utils import chunks
+
+
+def mock_hosts(count):
+    hosts = []
+    for index in range(count):
+        bk_module_id = index % 1000
+        host = Host(
+            bk_host_innerip="10.{}.{}.{}".format(index // 65536 % 256, index // 256 % 256, index % 256),
+            bk_cloud_id=index % 3,
+            bk_host_id=index + 1,
+            bk_biz_id=index % 100 + 2,
+            bk_agent_id="0200000000{:032x}".format(index),
+            bk_host_name="host-{}".format(index),
+            bk_os_name="linux centos",
+            bk_os_type="1",
+            operator=["admin"],
+            bk_bak_operator=["admin"],
+            bk_state="运营中[需告警]",
+            bk_set_ids=[bk_module_id // 10],
+            bk_module_ids=[bk_module_id],
+        )
+        host.topo_link = {
+            "module|{}".format(bk_module_id): [
+                TopoNode("module", bk_module_id, "模块", "module-{}".format(bk_module_id)),
+                TopoNode("set", bk_module_id // 10, "集群", "set-{}".format(bk_module_id // 10)),
+                TopoNode("biz", host.bk_biz_id, "业务", "biz-{}".format(host.bk_biz_id)),
+            ]
+        }
+        host.bk_world_ids = []
+        host.bk_world_id = ""
+        hosts.append(host)
+    return hosts
+
+
+class Command(BaseCommand):
+    help = "compare redis memory usage and decode time of cmdb cache codecs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="host count")
+        parser.add_argument("--redis", action="store_true", help="write to redis and compare memory usage")
+
+    def handle(self, *args, **options):
+        hosts = mock_hosts(options["count"])
+        self.stdout.write("mock {} hosts".format(len(hosts)))
+
+        for codec in [PickleCodec, CompactCodec]:
+            start = time.time()
+            values = [codec.encode(host) for host in hosts]
+            encode_time = time.time() - start
+
+            start = time.time()
+            for value in values:
+                decode(value)
+            decode_time = time.time() - start
+
+            self.stdout.write(
+                "[{}] size: {:.2f}MB, encode: {:.3f}s, decode: {:.3f}s".format(
+                    codec.name,
+                    sum(len(value.encode("utf-8")) for value in values) / 1024 / 1024,
+                    encode_time,
+                    decode_time,
+                )
+            )
+
+            if options["redis"]:
+                self.benchmark_redis(codec, hosts, values)
+
+    def benchmark_redis(self, codec, hosts, values):
+        """
+        写入临时的 redis key，对比内存占用及 multi_get 耗时
+        """
+        key = "{}.benchmark.{}".format(HostManager.CACHE_KEY, codec.name)
+        client = HostManager.cache
+        client.delete(key)
+        try:
+            host_keys = [HostManager.key_to_internal_value(host.ip, host.bk_cloud_id) for host in hosts]
+            for chunked in chunks(list(zip(host_keys, values)), 1000):
+                client.hmset(key, dict(chunked))
+
+            try:
+                memory_usage = "{:.2f}MB".format(client.memory_usage(key, samples=0) / 1024 / 1024)
+            except Exception as e:
+                memory_usage = "unknown({})".format(e)
+
+            start = time.time()
+            for chunked_keys in chunks(host_keys, 1000):
+                for value in client.hmget(key, chunked_keys):
+                    decode(value)
+            self.stdout.write(
+                "[{}] redis memory: {}, multi_get: {:.3f}s".format(codec.name, memory_usage, time.time() - start)
+            )
+        finally:
+            client.delete(key)
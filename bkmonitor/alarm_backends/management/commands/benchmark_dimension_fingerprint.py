@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+维度指纹计算性能对比
+
+python manage.py benchmark_dimension_fingerprint --count 1000000 --distinct 10000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.constants import NO_DATA_TAG_DIMENSION
+from bkmonitor.utils import fingerprint
+from bkmonitor.utils.common_utils import count_md5
+
+
+def mock_access_dimensions(count, distinct):
+    """
+    access 记录维度：distinct 台主机，每台主机有多个时间点的数据
+    """
+    hosts = []
+    for index in range(distinct):
+        ip = "10.{}.{}.{}".format(index // 65536 % 256, index // 256 % 256, index % 256)
+        hosts.append(
+            {
+                "bk_target_ip": ip,
+                "bk_target_cloud_id": "0",
+                "ip": ip,
+                "bk_cloud_id": 0,
+                "bk_biz_id": index % 100 + 2,
+                "device_name": "cpu-total",
+                "hostname": "host-{}".format(index),
+            }
+        )
+    return [dict(hosts[index % distinct]) for index in range(count)]
+
+
+def mock_nodata_dimensions(count, distinct):
+    """
+    无数据检测降维后的维度
+    """
+    return [
+        {"bk_target_ip": "10.0.{}.{}".format(index % distinct // 256, index % 256), NO_DATA_TAG_DIMENSION: True}
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "compare dimension fingerprint with count_md5"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000000, help="record count")
+        parser.add_argument("--distinct", type=int, default=10000, help="distinct dimension count")
+
+    def handle(self, *args, **options):
+        count, distinct = options["count"], options["distinct"]
+        for scenario, mock_func in [("access", mock_access_dimensions), ("nodata", mock_nodata_dimensions)]:
+            dimensions_list = mock_func(count, distinct)
+            self.stdout.write("[{}] mock {} records, {} distinct dimensions".format(scenario, count, distinct))
+
+            start = time.time()
+            expected = [count_md5(dimensions) for dimensions in dimensions_list]
+            base_cost = time.time() - start
+            self.stdout.write("[{}] count_md5: {:.3f}s".format(scenario, base_cost))
+
+            for mode in [fingerprint.FingerprintMode.MD5, fingerprint.FingerprintMode.XXHASH]:
+                self.clear_cache()
+                start = time.time()
+                result = [fingerprint.dimension_fingerprint(dimensions, mode) for dimensions in dimensions_list]
+                cost = time.time() - start
+                self.stdout.write(
+                    "[{}] dimension_fingerprint({}): {:.3f}s, {:.1f}x{}".format(
+                        scenario,
+                        mode,
+                        cost,
+                        base_cost / cost,
+                        ", compatible" if result == expected else "",
+                    )
+                )
+
+    @staticmethod
+    def clear_cache():
+        fingerprint._md5_item_cache.clear()
+        for cache in fingerprint._fingerprint_caches.values():
+            cache.clear()
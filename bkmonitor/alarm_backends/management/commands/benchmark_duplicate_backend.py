@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+access 数据去重方式对比(内存占用及耗时)，会在 service 缓存中写入临时的去重 key，结束后清理
+
+python manage.py benchmark_duplicate_backend --dimensions 100000 --points 5
+"""
+
+import hashlib
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.service.access.data.duplicate import DUPLICATE_BACKENDS
+
+MockRecord = namedtuple("MockRecord", ["record_id", "time"])
+
+
+def mock_records(dimensions, points):
+    """
+    模拟 dimensions 个维度在 points 个时间点的数据
+    """
+    start_time = int(time.time()) // 60 * 60
+    md5_list = [hashlib.md5(str(index).encode("utf8")).hexdigest() for index in range(dimensions)]
+    records = []
+    for point in range(points):
+        timestamp = start_time - point * 60
+        records.extend(MockRecord("{}.{}".format(md5, timestamp), timestamp) for md5 in md5_list)
+    return records
+
+
+class Command(BaseCommand):
+    help = "compare memory usage and latency of access duplicate backends"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dimensions", type=int, default=100000, help="dimension count per point")
+        parser.add_argument("--points", type=int, default=5, help="time point count")
+
+    def handle(self, *args, **options):
+        records = mock_records(options["dimensions"], options["points"])
+        self.stdout.write("mock {} records, {} points".format(len(records), options["points"]))
+
+        for backend, duplicate_cls in DUPLICATE_BACKENDS.items():
+            strategy_group_key = "benchmark_{}".format(uuid.uuid4().hex)
+
+            # 首次写入：全部记录判断后写入 redis
+            start = time.time()
+            duplicate = duplicate_cls(strategy_group_key)
+            for record in records:
+                if not duplicate.is_duplicate(record):
+                    duplicate.add_record(record)
+            duplicate.refresh_cache()
+            write_cost = time.time() - start
+
+            # 下一轮拉取：从 redis 读取后判断重复
+            start = time.time()
+            duplicate = duplicate_cls(strategy_group_key)
+            duplicate_count = sum(1 for record in records if duplicate.is_duplicate(record))
+            check_cost = time.time() - start
+
+            memory, transfer = self.get_usage(duplicate)
+            self.stdout.write(
+                "[{}] write: {:.3f}s, check: {:.3f}s, duplicate: {}, memory: {}, transfer: {}".format(
+                    backend, write_cost, check_cost, duplicate_count, memory, transfer
+                )
+            )
+
+    @staticmethod
+    def get_usage(duplicate):
+        """
+        统计去重 key 的内存占用(redis MEMORY USAGE)及读取的数据量，统计完成后删除
+        """
+        memory = transfer = 0
+        for dup_key, record_ids in duplicate.record_ids_cache.items():
+            transfer += sum(len(record_id) for record_id in record_ids)
+            try:
+                memory += duplicate.client.memory_usage(dup_key) or 0
+            except Exception:  # noqa
+                memory = "unknown"
+            duplicate.client.delete(dup_key)
+        return memory, transfer
@@ -8,6 +8,11 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import math
+
+import xxhash
+from django.conf import settings
+
 from alarm_backends.core.cache import key
 
 
@@ -62,3 +67,82 @@ class Duplicate:
             pipeline.sadd(dup_key, *record_ids)
             pipeline.expire(dup_key, key.ACCESS_DUPLICATE_KEY.ttl)
         pipeline.execute()
+
+
+class FingerprintDuplicate(Duplicate):
+    """
+    基于定长指纹的数据去重
+    record_id 由维度 md5 和时间戳组成，以集合保存时每条记录约 43 字节，还有集合本身的额外开销。
+    这里将 record_id 计算为定长的 xxh64 指纹，按时间点追加写入同一个 string 中，每个时间点只需一次 GET 即可取回
+    指纹长度根据单个时间点的预估记录数及可接受的误判率计算，误判率约为 记录数 / 2^指纹位数
+    """
+
+    # 指纹长度(十六进制字符数)，xxh64 最多 16 个字符
+    MIN_WIDTH = 8
+    MAX_WIDTH = 16
+
+    def __init__(self, strategy_group_key, strategy_id=None):
+        super(FingerprintDuplicate, self).__init__(strategy_group_key, strategy_id)
+        self.width = self.get_width()
+        self.client = key.ACCESS_DUPLICATE_FINGERPRINT_KEY.client
+
+    @classmethod
+    def get_width(cls, capacity=None, error_rate=None):
+        """
+        计算满足误判率要求的指纹长度
+        """
+        capacity = capacity or settings.ACCESS_DUPLICATE_FINGERPRINT_CAPACITY
+        error_rate = error_rate or settings.ACCESS_DUPLICATE_FINGERPRINT_ERROR_RATE
+        bits = math.log2(max(capacity, 1) / error_rate)
+        return min(max(math.ceil(bits / 4), cls.MIN_WIDTH), cls.MAX_WIDTH)
+
+    def get_dup_key(self, time):
+        dup_key = key.ACCESS_DUPLICATE_FINGERPRINT_KEY.get_key(
+            strategy_group_key=self.strategy_group_key, dt_event_time=time, width=self.width
+        )
+        if self.strategy_id is not None:
+            dup_key.strategy_id = self.strategy_id
+        return dup_key
+
+    def fingerprint(self, record_id):
+        return xxhash.xxh64_hexdigest(str(record_id))[: self.width]
+
+    def get_record_ids(self, time):
+        dup_key = self.get_dup_key(time)
+        if dup_key not in self.record_ids_cache:
+            content = self.client.get(dup_key) or ""
+            self.record_ids_cache[dup_key] = {
+                content[index : index + self.width] for index in range(0, len(content), self.width)
+            }
+        return self.record_ids_cache[dup_key]
+
+    def is_duplicate(self, record):
+        return self.fingerprint(record.record_id) in self.get_record_ids(record.time)
+
+    def add_record(self, record):
+        dup_key = self.get_dup_key(record.time)
+        fingerprint = self.fingerprint(record.record_id)
+        self.record_ids_cache.setdefault(dup_key, set()).add(fingerprint)
+        self.pending_to_add.setdefault(dup_key, set()).add(fingerprint)
+
+    def refresh_cache(self):
+        # 并发写入同一时间点时，append 是原子的，重复的指纹不影响判断
+        pipeline = self.client.pipeline(transaction=False)
+        for dup_key, fingerprints in self.pending_to_add.items():
+            pipeline.append(dup_key, "".join(fingerprints))
+            pipeline.expire(dup_key, key.ACCESS_DUPLICATE_FINGERPRINT_KEY.ttl)
+        pipeline.execute()
+
+
+DUPLICATE_BACKENDS = {
+    "set": Duplicate,
+    "fingerprint": FingerprintDuplicate,
+}
+
+
+def get_duplicate(strategy_group_key, strategy_id=None, backend=None):
+    """
+    按配置的去重方式创建去重对象
+    """
+    duplicate_cls = DUPLICATE_BACKENDS.get(backend or settings.ACCESS_DUPLICATE_BACKEND, Duplicate)
+    return duplicate_cls(strategy_group_key, strategy_id=strategy_id)
@@ -26,6 +26,7 @@ from django.utils.functional import cached_property
 from kafka import KafkaConsumer
 from kafka.consumer.fetcher import ConsumerRecord
 from kafka.errors import NoBrokersAvailable
+from kafka.structs import TopicPartition
 
 from alarm_backends import constants
 from alarm_backends.cluster import TargetType
@@ -37,10 +38,15 @@ from alarm_backends.core.cluster import get_cluster
 from alarm_backends.core.control.checkpoint import Checkpoint
 from alarm_backends.core.control.item import Item
 from alarm_backends.core.control.strategy import Strategy
+from alarm_backends.core.storage.data_queue import (
+    encode_records,
+    get_record_count,
+    incr_record_count,
+)
 from alarm_backends.core.storage.redis import Cache
 from alarm_backends.management.hashring import HashRing
 from alarm_backends.service.access import base
-from alarm_backends.service.access.data.duplicate import Duplicate
+from alarm_backends.service.access.data.duplicate import get_duplicate
 from alarm_backends.service.access.data.filters import (
     ExpireFilter,
     HostStatusFilter,
@@ -51,6 +57,7 @@ from alarm_backends.service.access.data.records import DataRecord
 from alarm_backends.service.access.priority import PriorityChecker
 from bkmonitor.utils.common_utils import count_md5, get_local_ip
 from bkmonitor.utils.consul import BKConsul
+from bkmonitor.utils.fingerprint import dimension_fingerprint
 from bkmonitor.utils.thread_backend import InheritParentThread
 from constants.data_source import DataSourceLabel, DataTypeLabel
 from constants.strategy import MULTI_METRIC_DATA_SOURCES
@@ -98,7 +105,7 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
                 dimension_key: dimensions.get(dimension_key) for dimension_key in noise_reduce_config["dimensions"]
             }
             logger.debug("strategy(%s) noise reduce dimension_value(%s)", item.strategy.strategy_id, dimension_value)
-            dimension_value_hash = count_md5(dimension_value)
+            dimension_value_hash = dimension_fingerprint(dimension_value)
             noise_data[dimension_value_hash] = record.data["time"]
         client.zadd(record_key, noise_data)
         client.expire(record_key, key.NOISE_REDUCE_TOTAL_KEY.ttl)
@@ -126,7 +133,15 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
         data_list_key = data_list_key or key.DATA_LIST_KEY
         client = output_client or data_list_key.client
         output_key = data_list_key.get_key(strategy_id=item.strategy.strategy_id, item_id=item.id)
-        queue_length = client.llen(output_key)
+        # 批量格式下每个元素包含多条记录，按写入端维护的计数获取队列中的记录数
+        is_batch_encoding = data_list_key is key.DATA_LIST_KEY and settings.DATA_QUEUE_BATCH_ENCODING_ENABLED
+        count_key = key.DATA_LIST_RECORD_COUNT_KEY.get_key(strategy_id=item.strategy.strategy_id, item_id=item.id)
+        if data_list_key is key.NO_DATA_BUCKET_KEY:
+            queue_length = client.zcard(output_key)
+        elif is_batch_encoding:
+            queue_length = get_record_count(client, output_key, count_key)
+        else:
+            queue_length = client.llen(output_key)
         # 超过最大检测长度10倍(50w)说明detect模块处理能力不足,数据将被丢弃。
         if queue_length > settings.SQL_MAX_LIMIT * 10:
             msg = (
@@ -138,14 +153,26 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
             raise Exception(msg)
 
         pipeline = client.pipeline(transaction=False)
-        _offset = 0
-        while _offset < len(record_list):
-            chunk_records = record_list[_offset : _offset + 10000]
-            pipeline.lpush(output_key, *[json.dumps(record.data) for record in chunk_records])
-            _offset += 10000
+        if data_list_key is key.NO_DATA_BUCKET_KEY:
+            # 以数据时间作为分值，nodata 可以直接按检测时间点获取数据
+            elements = [(json.dumps(record.data), record.data["time"]) for record in record_list]
+            for _offset in range(0, len(elements), 10000):
+                pipeline.zadd(output_key, dict(elements[_offset : _offset + 10000]))
+        else:
+            if data_list_key is key.DATA_LIST_KEY:
+                elements = encode_records([record.data for record in record_list])
+            else:
+                elements = [json.dumps(record.data) for record in record_list]
+            _offset = 0
+            while _offset < len(elements):
+                pipeline.lpush(output_key, *elements[_offset : _offset + 10000])
+                _offset += 10000
         # 避免监控周期大于默认key过期时间，引起数据丢失
         agg_interval = min(query_config["agg_interval"] for query_config in item.query_configs)
-        pipeline.expire(output_key, max([data_list_key.ttl, agg_interval * 5]))
+        ttl = max([data_list_key.ttl, agg_interval * 5])
+        pipeline.expire(output_key, ttl)
+        if is_batch_encoding:
+            incr_record_count(pipeline, count_key, len(record_list), ttl)
         pipeline.execute()
         metrics.ACCESS_PROCESS_PUSH_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG, type="data").inc(len(record_list))
 
@@ -202,7 +229,8 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
 
             # 推送无数据处理
             if item.no_data_config["is_enabled"]:
-                self._push(item, records, output_client, key.NO_DATA_LIST_KEY)
+                no_data_key = key.NO_DATA_BUCKET_KEY if settings.NO_DATA_BUCKET_QUEUE_ENABLED else key.NO_DATA_LIST_KEY
+                self._push(item, records, output_client, no_data_key)
 
         # 推送数据处理信号
         if records:
@@ -343,7 +371,7 @@ class AccessDataProcess(BaseAccessDataProcess):
                 return
 
         records = []
-        dup_obj = Duplicate(self.strategy_group_key, strategy_id=first_item.strategy.id)
+        dup_obj = get_duplicate(self.strategy_group_key, strategy_id=first_item.strategy.id)
         duplicate_counts = none_point_counts = 0
 
         # 是否有优先级
@@ -462,6 +490,9 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
         self.consumers: Dict[str, KafkaConsumer] = {}
         self.consumers_lock = threading.Lock()
         self.queue = queue.Queue(maxsize=100)
+        # 已拉取但未处理完的记录数，用于拉取背压控制
+        self.in_flight_records = 0
+        self.in_flight_lock = threading.Lock()
         self._stop_signal = False
         self.strategy_cache = {}
 
@@ -614,11 +645,49 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
             if end_time - start_time < 60:
                 time.sleep(60 - (end_time - start_time))
 
-    def flat(self, bootstrap_servers: str, record: ConsumerRecord):
+    @staticmethod
+    def decode_values(topic: str, values: List) -> List[Dict]:
+        """
+        批量解码消息
+        整批拼接为 json 数组一次性解析，存在异常数据时再逐条解析并丢弃异常数据
+        """
+        values = [(value.encode("utf-8") if isinstance(value, str) else value).rstrip(b"\x00\n") for value in values]
+        try:
+            result = json.loads(b"[" + b",".join(values) + b"]")
+            # 单条消息中包含多个 json 对象时，拼接解析的结果会与消息数不一致
+            if len(result) == len(values):
+                return result
+        except ValueError:
+            pass
+
+        result = []
+        for value in values:
+            try:
+                result.append(json.loads(value))
+            except ValueError as e:
+                logger.warning("%s loads alarm(%s) failed: %s", topic, value, e)
+        return result
+
+    def get_topic_items(self, topic_info: Dict) -> Dict[int, List[Item]]:
+        """
+        获取 topic 关联的监控项，按业务分组
         """
-        扁平化
-        1. 数据结构转换
-        2. 分策略拆分成多条DataRecord
+        dimensions = topic_info["dimensions"]
+        biz_items = defaultdict(list)
+        for strategy_id in topic_info["strategy_ids"]:
+            strategy = self.get_strategy(strategy_id)
+            item = strategy.items[0]
+            item.data_sources[0].group_by = dimensions
+            item.query_configs[0]["agg_dimension"] = dimensions
+            biz_items[int(strategy.bk_biz_id)].append(item)
+        return biz_items
+
+    def flat_records(self, bootstrap_servers: str, records: List[ConsumerRecord]) -> List[DataRecord]:
+        """
+        批量扁平化
+        1. 按 topic 分组批量解码，策略配置每批只获取一次
+        2. 数据结构转换
+        3. 分策略拆分成多条DataRecord
         record:
         {
             "metrics":{
@@ -646,28 +715,32 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
             "time":1573701305
         }
         """
-        raw_data = record.value
-        raw_data = json.loads(raw_data[:-1] if raw_data[-1] == "\x00" or raw_data[-1] == "\n" else raw_data)
-
-        data_bk_biz_id = int(raw_data["dimensions"].get("bk_biz_id", 0))
-        strategy_ids = self.topics[f"{bootstrap_servers}|{record.topic}"]["strategy_ids"]
-        dimensions = self.topics[f"{bootstrap_servers}|{record.topic}"]["dimensions"]
-        strategies = [self.get_strategy(strategy_id) for strategy_id in strategy_ids]
-        strategies = [s for s in strategies if int(s.bk_biz_id) == data_bk_biz_id]
-        if not strategies:
-            logger.debug("abandon data(%s), not belong targets", raw_data)
-            return []
+        topic_values = defaultdict(list)
+        for record in records:
+            topic_values[record.topic].append(record.value)
 
         new_record_list = []
-        for strategy in strategies:
-            standard_raw_data = {"time": raw_data["time"]}
-            standard_raw_data.update(raw_data["metrics"])
-            standard_raw_data.update(raw_data["dimensions"])
+        for topic, values in topic_values.items():
+            try:
+                biz_items = self.get_topic_items(self.topics[f"{bootstrap_servers}|{topic}"])
+            except Exception as e:
+                logger.warning("abandon %s records of topic(%s), get strategy failed: %s", len(values), topic, e)
+                continue
 
-            item = strategy.items[0]
-            item.data_sources[0].group_by = dimensions
-            item.query_configs[0]["agg_dimension"] = dimensions
-            new_record_list.append(DataRecord(item, standard_raw_data))
+            for raw_data in self.decode_values(topic, values):
+                try:
+                    items = biz_items.get(int(raw_data["dimensions"].get("bk_biz_id", 0)))
+                    if not items:
+                        logger.debug("abandon data(%s), not belong targets", raw_data)
+                        continue
+
+                    for item in items:
+                        standard_raw_data = {"time": raw_data["time"]}
+                        standard_raw_data.update(raw_data["metrics"])
+                        standard_raw_data.update(raw_data["dimensions"])
+                        new_record_list.append(DataRecord(item, standard_raw_data))
+                except Exception as e:
+                    logger.warning("%s flat alarm(%s) failed: %s", topic, raw_data, e)
         return new_record_list
 
     def get_strategy(self, strategy_id: int) -> Strategy:
@@ -679,28 +752,73 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
 
         return self.strategy_cache[strategy_id]["strategy"]
 
+    def change_in_flight_records(self, count: int):
+        with self.in_flight_lock:
+            self.in_flight_records += count
+
+    @staticmethod
+    def report_partition_metrics(consumer: KafkaConsumer, partition: TopicPartition, records: List[ConsumerRecord]):
+        """
+        上报分区的拉取数量及消费延迟
+        """
+        topic = getattr(partition, "topic", str(partition))
+        partition_id = getattr(partition, "partition", "")
+        metrics.ACCESS_REAL_TIME_PULL_DATA_COUNT.labels(topic=topic, partition=partition_id).inc(len(records))
+
+        if not isinstance(partition, TopicPartition):
+            return
+        highwater = consumer.highwater(partition)
+        if highwater is not None:
+            lag = max(highwater - records[-1].offset - 1, 0)
+            metrics.ACCESS_REAL_TIME_CONSUMER_LAG.labels(topic=topic, partition=partition_id).set(lag)
+
+    @staticmethod
+    def pause_consumer(consumer: KafkaConsumer, is_paused: bool):
+        """
+        暂停/恢复消费者已分配分区的拉取
+        """
+        if is_paused:
+            # rebalance 后新分配的分区默认不暂停，每次拉取前都需要重新检查
+            partitions = consumer.assignment() - consumer.paused()
+            if partitions:
+                consumer.pause(*partitions)
+        else:
+            partitions = consumer.paused()
+            if partitions:
+                consumer.resume(*partitions)
+
     def run_poller(self, once=False):
         while True:
+            # 背压：未处理的记录数超过上限时暂停已分配分区的拉取，避免处理能力不足时内存无限增长
+            # 暂停期间仍然调用 poll，保持消费组成员身份，避免超过 max_poll_interval_ms 触发 rebalance
+            is_paused = self.in_flight_records >= settings.REAL_TIME_ACCESS_MAX_IN_FLIGHT_RECORDS
+
             self.consumers_lock.acquire()
             has_record = False
             for consumer in self.consumers.values():
+                self.pause_consumer(consumer, is_paused)
                 data = consumer.poll(500, max_records=5000)
                 if not data:
                     continue
 
                 has_record = True
-                for records in data.values():
+                for partition, records in data.items():
                     logger.info(f"real_time poller poll {consumer.config['bootstrap_servers']}: {len(records)}")
+                    self.change_in_flight_records(len(records))
                     self.queue.put((consumer.config["bootstrap_servers"], records))
+                    try:
+                        self.report_partition_metrics(consumer, partition, records)
+                    except Exception as e:
+                        logger.warning(f"real_time poller report metrics error: {e}")
             self.consumers_lock.release()
 
             if once or self._stop_signal:
                 logger.info("real_time poller get stop signal")
                 break
 
-            # 如果没有数据就等待一秒
+            # 如果没有数据就等待一秒，暂停期间缩短等待时间以便及时恢复拉取
             if not has_record:
-                time.sleep(1)
+                time.sleep(0.1 if is_paused else 1)
 
     def run_consumer_manager(self, once=False):
         """
@@ -773,52 +891,77 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
 
             time.sleep(15)
 
-    def run_handler(self, once=False):
-        while True:
-            if self._stop_signal and self.queue.empty():
-                logger.info("real_time handler get stop signal")
-                break
+    def get_batch(self):
+        """
+        从队列中获取一批数据，记录数不超过 REAL_TIME_ACCESS_BATCH_SIZE(至少获取一次拉取的数据)
+        :return: ({bootstrap_servers: records}, record_count)
+        """
+        batch = defaultdict(list)
+        try:
+            bootstrap_servers, records = self.queue.get(block=True, timeout=5)
+        except queue.Empty:
+            return batch, 0
 
+        batch[bootstrap_servers].extend(records)
+        record_count = len(records)
+        while record_count < settings.REAL_TIME_ACCESS_BATCH_SIZE:
             try:
-                bootstrap_servers, data = self.queue.get(block=True, timeout=5)
+                bootstrap_servers, records = self.queue.get_nowait()
             except queue.Empty:
-                data = []
-                bootstrap_servers = ""
+                break
+            batch[bootstrap_servers].extend(records)
+            record_count += len(records)
+        return batch, record_count
 
-            try:
-                records = []
-                for record in data:
-                    try:
-                        records.extend(self.flat(bootstrap_servers, record))
-                    except Exception as e:
-                        logger.warning("%s loads alarm(%s) failed", record.topic, record.value, e)
+    def handle_batch(self, batch: Dict[str, List[ConsumerRecord]]):
+        records = []
+        for bootstrap_servers, data in batch.items():
+            records.extend(self.flat_records(bootstrap_servers, data))
 
-                record_list = []
-                for r in records:
-                    # 补充维度：比如：业务、集群、模块等信息
-                    self.full(r)
+        record_list = []
+        for r in records:
+            # 补充维度：比如：业务、集群、模块等信息
+            self.full(r)
 
-                    new_r_list = r.full()
-                    if not new_r_list:
-                        continue
+            new_r_list = r.full()
+            if not new_r_list:
+                continue
 
-                    record_list.extend(new_r_list)
+            record_list.extend(new_r_list)
 
-                output = []
-                for r in record_list:
-                    # 过滤数据
-                    if self.filter(r) or r.filter(r):
-                        continue
+        output = []
+        for r in record_list:
+            # 过滤数据
+            if self.filter(r) or r.filter(r):
+                continue
 
-                    # 格式化数据
-                    r.clean()
+            # 格式化数据
+            r.clean()
 
-                    output.append(r)
+            output.append(r)
 
-                self.push(output)
+        self.push(output)
+
+    def run_handler(self, once=False):
+        while True:
+            if self._stop_signal and self.queue.empty():
+                logger.info("real_time handler get stop signal")
+                break
+
+            batch, record_count = self.get_batch()
+            start_time = time.time()
+            try:
+                self.handle_batch(batch)
             except Exception as e:
                 logger.exception(e)
                 logger.error(f"real_time handler exception: {e}")
+            finally:
+                self.change_in_flight_records(-record_count)
+
+            if record_count:
+                metrics.ACCESS_REAL_TIME_PROCESS_TIME.observe(time.time() - start_time)
+                metrics.ACCESS_REAL_TIME_PROCESS_DATA_COUNT.inc(record_count)
+                metrics.report_all()
 
             if once:
                 break
@@ -19,7 +19,8 @@ from django.utils.functional import cached_property
 
 from alarm_backends import constants
 from alarm_backends.service.access import base
-from bkmonitor.utils.common_utils import count_md5, number_format
+from bkmonitor.utils.common_utils import number_format
+from bkmonitor.utils.fingerprint import dimension_fingerprint
 from constants.strategy import (
     SYSTEM_PROC_PORT_DYNAMIC_DIMENSIONS,
     SYSTEM_PROC_PORT_METRIC_ID,
@@ -142,7 +143,7 @@ class DataRecord(base.BaseRecord):
                 if field not in SYSTEM_PROC_PORT_DYNAMIC_DIMENSIONS
             }
 
-        md5_dimension = count_md5(origin_dimensions)
+        md5_dimension = dimension_fingerprint(origin_dimensions)
         return "{md5_dimension}.{timestamp}".format(md5_dimension=md5_dimension, timestamp=self.time)
 
     def clean(self):
@@ -15,7 +15,7 @@ import logging
 from django.conf import settings
 
 from alarm_backends.core.cache import key
-from bkmonitor.utils.common_utils import count_md5
+from bkmonitor.utils.fingerprint import dimension_fingerprint
 
 logger = logging.getLogger("access.qos")
 
@@ -23,14 +23,14 @@ logger = logging.getLogger("access.qos")
 class QoSMixin(object):
     @classmethod
     def hash_alarm_by_match_info(cls, event_record, strategy_id, item_id):
-        return count_md5(
-            [
-                event_record.bk_biz_id,
-                strategy_id,
-                item_id,
-                event_record.data["data"]["dimensions"]["bk_target_ip"],
-                event_record.level,
-            ]
+        return dimension_fingerprint(
+            {
+                "bk_biz_id": event_record.bk_biz_id,
+                "strategy_id": strategy_id,
+                "item_id": item_id,
+                "bk_target_ip": event_record.data["data"]["dimensions"]["bk_target_ip"],
+                "level": event_record.level,
+            }
         )
 
     def check_qos(self, check_client=None):
@@ -20,7 +20,7 @@ from django.utils.functional import cached_property
 
 from alarm_backends import constants
 from alarm_backends.service.access.base import Filterer
-from bkmonitor.utils.common_utils import count_md5
+from bkmonitor.utils.fingerprint import dimension_fingerprint
 
 logger = logging.getLogger("access.event")
 
@@ -71,7 +71,7 @@ class EventRecord(Filterer):
 
     @cached_property
     def md5_dimension(self):
-        return count_md5(self.dimensions)
+        return dimension_fingerprint(self.dimensions)
 
     @cached_property
     def _strategy_id(self):
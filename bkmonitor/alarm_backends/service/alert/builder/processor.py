@@ -83,6 +83,7 @@ class AlertBuilder(BaseAlertProcessor):
         lock_keys = [ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5) for event in events]
 
         with multi_service_lock(ALERT_UPDATE_LOCK, lock_keys) as lock:
+            lock_start_time = time.time()
             success_locked_events = []
             fail_locked_events = []
             # 区分出哪些告警加锁成功，哪些失败
@@ -131,6 +132,7 @@ class AlertBuilder(BaseAlertProcessor):
                 )
 
             alerts = self.save_alerts(alerts, action=BulkActionType.UPSERT, force_save=True)
+            metrics.ALERT_UPDATE_LOCK_HOLD_TIME.labels(module="builder").observe(time.time() - lock_start_time)
 
         # TODO: 这里需要清理保存失败的告警的 Redis 缓存，否则会导致DB和 Redis 不一致
         self.save_alert_logs(alerts)
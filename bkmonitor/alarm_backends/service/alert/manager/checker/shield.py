@@ -13,10 +13,10 @@ import time
 from typing import List
 
 from alarm_backends.core.alert import Alert
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from alarm_backends.service.alert.manager.checker.base import BaseChecker
 from alarm_backends.service.converge.shield.shielder import AlertShieldConfigShielder
 from alarm_backends.service.fta_action.tasks import create_actions
-from bkmonitor.documents import AlertLog
 from constants.alert import EventStatus
 
 logger = logging.getLogger("alert.manager")
@@ -190,7 +190,7 @@ class ShieldStatusChecker(BaseChecker):
         if qos_alerts:
             # 如果有被qos的事件， 进行日志记录
             qos_log = Alert.create_qos_log(qos_alerts, current_count, qos_actions)
-            AlertLog.bulk_create([qos_log])
+            bulk_save([qos_log])
 
         need_notify_alerts = set(need_notify_alerts)
 
@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
+import time
 from typing import List
 
 from alarm_backends.core.alert import Alert, Event
@@ -94,6 +95,7 @@ class AlertManager(BaseAlertProcessor):
         lock_keys = [ALERT_UPDATE_LOCK.get_key(dedupe_md5=dedupe_md5) for dedupe_md5 in dedupe_md5_list]
 
         with multi_service_lock(ALERT_UPDATE_LOCK, lock_keys) as lock:
+            lock_start_time = time.time()
             success_locked_dimensions = []
             fail_locked_dimensions = []
             for dedupe_md5 in dedupe_md5_list:
@@ -123,6 +125,7 @@ class AlertManager(BaseAlertProcessor):
 
             # 4. 保存告警到ES
             saved_alerts = self.save_alerts(alerts_to_check, action=BulkActionType.UPSERT, force_save=True)
+            metrics.ALERT_UPDATE_LOCK_HOLD_TIME.labels(module="manager").observe(time.time() - lock_start_time)
 
         # 5. 保存流水日志
         self.save_alert_logs(saved_alerts)
@@ -20,8 +20,9 @@ from alarm_backends.constants import CONST_ONE_DAY, CONST_ONE_HOUR
 from alarm_backends.core.alert.alert import Alert, AlertCache, AlertKey
 from alarm_backends.core.cache.strategy import StrategyCacheManager
 from alarm_backends.core.cluster import get_cluster_bk_biz_ids
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from alarm_backends.service.alert.manager.processor import AlertManager
-from bkmonitor.documents import AlertDocument, AlertLog
+from bkmonitor.documents import AlertDocument
 from bkmonitor.documents.base import BulkActionType
 from constants.alert import EventStatus
 from core.prometheus import metrics
@@ -126,14 +127,7 @@ def check_blocked_alert_finished(alert_keys):
         AlertCache.save_alert_snapshot(updated_alert_snaps)
 
     if alert_logs:
-        try:
-            AlertLog.bulk_create(alert_logs)
-        except BulkIndexError as e:
-            logger.error(
-                "[check_blocked_alert_finished] save alert log document total count(%s) error: %s",
-                len(alert_logs),
-                e.errors,
-            )
+        bulk_save(alert_logs)
     logger.info(
         "[check_blocked_alert_finished] update blocked alert next status succeed, "
         "total count(%s), updated(%s), closed(%s)",
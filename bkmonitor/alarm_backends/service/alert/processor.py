@@ -19,8 +19,9 @@ from elasticsearch.helpers import BulkIndexError
 from alarm_backends.core.alert import Alert, Event
 from alarm_backends.core.alert.alert import AlertCache
 from alarm_backends.core.cache.key import ALERT_CONTENT_KEY, ALERT_DEDUPE_CONTENT_KEY
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from alarm_backends.service.composite.tasks import check_action_and_composite
-from bkmonitor.documents import AlertDocument, AlertLog
+from bkmonitor.documents import AlertDocument
 from bkmonitor.documents.base import BulkActionType
 
 
@@ -81,7 +82,8 @@ class BaseAlertProcessor:
             )
             dedupe_md5_list.extend(md5_list)
 
-        alert_data = [ALERT_DEDUPE_CONTENT_KEY.client.get(cache_key) for cache_key in cache_keys]
+        # 按路由节点分组批量获取，避免逐个 key 请求 Redis
+        alert_data = ALERT_DEDUPE_CONTENT_KEY.client.mget_by_node(cache_keys)
 
         alerts = []
 
@@ -171,17 +173,12 @@ class BaseAlertProcessor:
             return []
 
         start_time = time.time()
-        errors = []
-        try:
-            AlertLog.bulk_create(log_documents)
-        except BulkIndexError as e:
-            self.logger.error("save alert log document error: %s", e.errors)
-            errors = e.errors
+        # 写入失败由 bulk_save 记录日志，不影响告警处理
+        bulk_save(log_documents)
 
         self.logger.info(
-            "save alert log document: saved(%d), failed(%d), elapsed(%.3f)",
-            len(log_documents) - len(errors),
-            len(errors),
+            "save alert log document: count(%d), elapsed(%.3f)",
+            len(log_documents),
             time.time() - start_time,
         )
 
@@ -30,8 +30,8 @@ from alarm_backends.core.cache.strategy import StrategyCacheManager
 from alarm_backends.core.control.item import gen_condition_matcher
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.lock.service_lock import service_lock
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from alarm_backends.service.fta_action.tasks import create_actions
-from bkmonitor.documents import AlertLog
 from bkmonitor.strategy.expression import AlertExpressionValue, parse_expression
 from bkmonitor.utils.common_utils import count_md5
 from constants.action import ActionSignal
@@ -231,7 +231,7 @@ class CompositeProcessor:
         if qos_actions:
             # 如果有被qos的事件， 进行日志记录
             qos_log = Alert.create_qos_log([self.alert.id], current_count, qos_actions)
-            AlertLog.bulk_create([qos_log])
+            bulk_save([qos_log])
 
         # 清空队列
         self.actions = []
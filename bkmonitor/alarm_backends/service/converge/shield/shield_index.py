@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+业务屏蔽配置索引
+
+屏蔽配置的维度条件是多个条件的与，其中顶层的等值条件(如 strategy_id、bk_target_ip、bk_topo_node)是匹配的必要条件。
+每条屏蔽配置选取一个等值条件作为索引，告警只需要与索引命中的屏蔽配置及无法建立索引的屏蔽配置进行完整匹配。
+索引在屏蔽缓存内容变化时才重新构建，避免每条告警都重复解析全部屏蔽配置。
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+import arrow
+
+from alarm_backends.core.cache.shield import ShieldCacheManager
+from alarm_backends.service.converge.shield.shield_obj import AlertShieldObj
+from bkmonitor.documents.alert import AlertDocument
+from bkmonitor.utils.range.conditions import EqualCondition
+
+logger = logging.getLogger("fta_action.shield")
+
+
+class AlertShieldIndex(object):
+    """
+    单个业务的屏蔽配置索引
+    """
+
+    # 优先作为索引的维度，区分度越高越靠前
+    INDEX_KEYS = (
+        "strategy_id",
+        "bk_target_ip",
+        "ip",
+        "bk_topo_node",
+        "bk_target_service_instance_id",
+        "service_instance_id",
+    )
+    # 区分度低的维度，仅在没有其他等值条件时作为索引
+    LOW_SELECTIVITY_KEYS = ("level", "metric_id")
+
+    # 进程内缓存的业务索引 {bk_biz_id: AlertShieldIndex}
+    _biz_indexes: Dict[int, "AlertShieldIndex"] = {}
+
+    def __init__(self, configs: List[Dict], version: str = None):
+        self.configs = configs
+        self.version = version
+        self.shield_objs = [AlertShieldObj(config) for config in configs]
+
+        # 无法建立索引的屏蔽配置，需要与每条告警进行匹配
+        self.unindexed_positions = []
+        # {(维度名, 取值方式): {维度值: [屏蔽配置位置]}}
+        self.index = defaultdict(lambda: defaultdict(list))
+        # 每组索引用于从告警维度中取值的条件
+        self.index_conditions = {}
+
+        for position, shield_obj in enumerate(self.shield_objs):
+            condition = self.get_index_condition(shield_obj)
+            if condition is None:
+                self.unindexed_positions.append(position)
+                continue
+
+            index_key = (condition.cond_field.name, self.get_value_variant(condition.cond_field.value))
+            self.index_conditions.setdefault(index_key, condition)
+            for value in set(condition.cond_field.to_str_list()):
+                self.index[index_key][value].append(position)
+
+    @classmethod
+    def get_by_biz_id(cls, bk_biz_id) -> "AlertShieldIndex":
+        """
+        获取业务的屏蔽配置索引，缓存内容不变时复用已构建的索引
+        """
+        version = ShieldCacheManager.get_raw_shields_by_biz_id(bk_biz_id) or ""
+        shield_index = cls._biz_indexes.get(bk_biz_id)
+        if shield_index is None or shield_index.version != version:
+            shield_index = cls(ShieldCacheManager.parse_shields(version), version=version)
+            cls._biz_indexes[bk_biz_id] = shield_index
+        return shield_index
+
+    @classmethod
+    def get_index_condition(cls, shield_obj: AlertShieldObj):
+        """
+        选取屏蔽配置中作为索引的等值条件
+        """
+        equal_conditions = {}
+        for condition in shield_obj.dimension_check.conditions:
+            # 子类(如 NotEqualCondition)的匹配逻辑不同，不能作为索引
+            if type(condition) is EqualCondition:
+                equal_conditions.setdefault(condition.cond_field.name, condition)
+
+        for name in cls.INDEX_KEYS:
+            if name in equal_conditions:
+                return equal_conditions[name]
+        for name, condition in equal_conditions.items():
+            if name not in cls.LOW_SELECTIVITY_KEYS:
+                return condition
+        for name in cls.LOW_SELECTIVITY_KEYS:
+            if name in equal_conditions:
+                return equal_conditions[name]
+        return None
+
+    @staticmethod
+    def get_value_variant(value):
+        """
+        ip 类维度从告警中的取值方式取决于配置值的格式(是否带云区域)，不同格式的配置需要分开建立索引
+        """
+        if value and isinstance(value, (list, tuple)):
+            value = value[0]
+        if isinstance(value, dict):
+            return tuple(key for key in ("bk_cloud_id", "bk_target_cloud_id") if key in value)
+        return None
+
+    def get_candidate_positions(self, dimension) -> List[int]:
+        positions = set(self.unindexed_positions)
+        for index_key, condition in self.index_conditions.items():
+            is_existed, data_field = condition.get_field(dimension)
+            if not is_existed:
+                continue
+            values = self.index[index_key]
+            for value in data_field.to_str_list():
+                positions.update(values.get(value, []))
+        # 保持与屏蔽配置原有顺序一致
+        return sorted(positions)
+
+    def match(self, alert: AlertDocument) -> List[AlertShieldObj]:
+        """
+        获取与告警匹配的屏蔽配置，结果与逐个调用 AlertShieldObj.is_match 一致
+        """
+        if not self.shield_objs:
+            return []
+
+        # 告警维度与屏蔽配置无关，只需要计算一次
+        dimension = self.shield_objs[0].get_dimension(alert)
+        source_time = arrow.now()
+        shield_objs = []
+        for position in self.get_candidate_positions(dimension):
+            shield_obj = self.shield_objs[position]
+            if shield_obj.time_check.is_match(source_time) and shield_obj.dimension_check.is_match(dimension):
+                shield_objs.append(shield_obj)
+        return shield_objs
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+策略待检测数据积压量
+
+detect 处理完策略后记录其待检测队列的积压量，调度时据此区分热策略(有积压)和冷策略(无积压)
+"""
+
+import logging
+import math
+import time
+from typing import Dict
+
+from django.conf import settings
+
+from alarm_backends.constants import CONST_MINUTES
+from alarm_backends.core.cache import key
+from core.prometheus import metrics
+
+logger = logging.getLogger("detect")
+
+# 超过该时间未更新的积压记录视为失效(如策略已被删除或停用)
+BACKLOG_EXPIRE = 5 * CONST_MINUTES
+
+
+def record_backlog(strategy_id, backlog: int):
+    """
+    记录策略的待检测数据积压量，无积压时删除记录
+    """
+    client = key.DETECT_BACKLOG_KEY.client
+    backlog_key = key.DETECT_BACKLOG_KEY.get_key()
+    field = key.DETECT_BACKLOG_KEY.get_field(strategy_id=strategy_id)
+    if backlog <= 0:
+        client.hdel(backlog_key, field)
+        return
+
+    pipeline = client.pipeline(transaction=False)
+    pipeline.hset(backlog_key, field, "{}|{}".format(backlog, int(time.time())))
+    pipeline.expire(backlog_key, key.DETECT_BACKLOG_KEY.ttl)
+    pipeline.execute()
+
+
+def get_backlogs() -> Dict[str, int]:
+    """
+    获取各策略的待检测数据积压量，同时清理失效的记录
+    :return: {strategy_id: backlog}
+    """
+    client = key.DETECT_BACKLOG_KEY.client
+    backlog_key = key.DETECT_BACKLOG_KEY.get_key()
+    now = time.time()
+
+    backlogs = {}
+    expired_fields = []
+    for field, value in client.hgetall(backlog_key).items():
+        try:
+            backlog, update_time = value.split("|")
+            backlog, update_time = int(backlog), int(update_time)
+        except ValueError:
+            expired_fields.append(field)
+            continue
+
+        if now - update_time > BACKLOG_EXPIRE:
+            expired_fields.append(field)
+        else:
+            backlogs[field] = backlog
+
+    if expired_fields:
+        client.hdel(backlog_key, *expired_fields)
+    return backlogs
+
+
+def report_backlogs(backlogs: Dict[str, int]):
+    """
+    上报积压量指标，按策略只上报积压最多的部分策略，避免指标维度过多
+    """
+    # 先清空上次上报的数据，避免已不在排名中的策略(如积压已处理完)一直保留上次的积压量
+    metrics.DETECT_QUEUE_BACKLOG.clear()
+    metrics.DETECT_QUEUE_BACKLOG.labels(strategy_id=metrics.TOTAL_TAG).set(sum(backlogs.values()))
+    top_backlogs = sorted(backlogs.items(), key=lambda x: x[1], reverse=True)
+    for strategy_id, backlog in top_backlogs[: settings.DETECT_BACKLOG_METRIC_TOP_N]:
+        metrics.DETECT_QUEUE_BACKLOG.labels(strategy_id=strategy_id).set(backlog)
+
+
+def get_drain_passes(backlog: int) -> int:
+    """
+    根据积压量计算单个任务内的最大处理轮数，每轮最多处理 SQL_MAX_LIMIT 条记录
+    """
+    if backlog <= 0:
+        return 1
+    return min(1 + math.ceil(backlog / settings.SQL_MAX_LIMIT), settings.DETECT_MAX_DRAIN_PASSES)
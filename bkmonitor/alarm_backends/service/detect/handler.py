@@ -12,9 +12,19 @@ specific language governing permissions and limitations under the License.
 
 import logging
 
+from django.conf import settings
+
 from alarm_backends.core.cache import key
 from alarm_backends.core.handlers import base
-from alarm_backends.service.detect.tasks import run_detect
+from alarm_backends.service.detect.backlog import (
+    get_backlogs,
+    get_drain_passes,
+    report_backlogs,
+)
+from alarm_backends.service.detect.tasks import run_detect, run_detect_batch
+from alarm_backends.service.detect.worker import get_detect_worker
+from bkmonitor.utils.common_utils import chunks
+from core.prometheus import metrics
 
 logger = logging.getLogger("detect")
 
@@ -26,6 +36,10 @@ class DetectHandler(base.BaseHandler):
         self.data_signal_key = key.DATA_SIGNAL_KEY.get_key()
 
     def handle(self):
+        if settings.DETECT_WORKER_MODE_ENABLED:
+            # 常驻进程模式，按一致性哈希分片处理策略并复用进程内的策略缓存
+            get_detect_worker().run(settings.DETECT_WORKER_RUN_SECONDS)
+            return
 
         ret = self.client.brpop(self.data_signal_key, 5)
         if ret is None:
@@ -60,7 +74,52 @@ class DetectCeleryHandler(DetectHandler):
 
             break
 
-        for strategy_id in strategy_ids:
-            run_detect.apply_async(args=(strategy_id,))
+        if settings.DETECT_ADAPTIVE_SCHEDULE_ENABLED:
+            self.dispatch(strategy_ids)
+        else:
+            for strategy_id in strategy_ids:
+                run_detect.apply_async(args=(strategy_id,))
 
         logger.info("[detect] published {} strategy_ids: {}".format(len(strategy_ids), strategy_ids))
+
+    @staticmethod
+    def dispatch(strategy_ids):
+        """
+        按待检测数据积压量自适应调度
+        1. 有积压的策略(热策略)按积压量从大到小优先投递，并在同一任务内多轮处理
+        2. 无积压的策略(冷策略)合并为批量任务，减少任务调度开销
+        同一策略的检测有锁保护，无法多个任务并行处理，因此热策略通过增加处理轮数提高吞吐
+        """
+        try:
+            backlogs = get_backlogs()
+            report_backlogs(backlogs)
+            metrics.report_all()
+        except Exception as e:
+            logger.exception(f"[detect] get strategy backlogs error: {e}")
+            backlogs = {}
+
+        hot_strategy_ids = sorted(
+            [strategy_id for strategy_id in strategy_ids if backlogs.get(str(strategy_id))],
+            key=lambda strategy_id: backlogs[str(strategy_id)],
+            reverse=True,
+        )
+        cold_strategy_ids = [strategy_id for strategy_id in strategy_ids if not backlogs.get(str(strategy_id))]
+
+        for strategy_id in hot_strategy_ids:
+            run_detect.apply_async(
+                args=(strategy_id,), kwargs={"max_passes": get_drain_passes(backlogs[str(strategy_id)])}
+            )
+
+        for chunk_strategy_ids in chunks(cold_strategy_ids, settings.DETECT_COLD_STRATEGY_BATCH_SIZE):
+            if len(chunk_strategy_ids) == 1:
+                run_detect.apply_async(args=(chunk_strategy_ids[0],))
+            else:
+                run_detect_batch.apply_async(args=(chunk_strategy_ids,))
+
+        if hot_strategy_ids:
+            logger.info(
+                "[detect] published {} hot strategy_ids: {}".format(
+                    len(hot_strategy_ids),
+                    {strategy_id: backlogs[str(strategy_id)] for strategy_id in hot_strategy_ids},
+                )
+            )
@@ -9,7 +9,6 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
-import json
 import logging
 import time
 
@@ -20,6 +19,11 @@ from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.i18n import i18n
 from alarm_backends.core.lock.service_lock import service_lock
 from alarm_backends.core.processor.base import BaseAbnormalPushProcessor
+from alarm_backends.core.storage.data_queue import (
+    count_element_records,
+    decode_element,
+    pull_elements,
+)
 from alarm_backends.service.detect import DataPoint
 from core.prometheus import metrics
 
@@ -27,14 +31,17 @@ logger = logging.getLogger("detect")
 
 
 class DetectProcess(BaseAbnormalPushProcessor):
-    def __init__(self, strategy_id: str):
+    def __init__(self, strategy_id: str, strategy: Strategy = None):
         # note: 这里有个坑，进来的策略id是字符串
         self.strategy_id = strategy_id
         self.inputs = {}
         self.outputs = {}
-        self.strategy = Strategy(strategy_id)
+        # 常驻进程模式下复用进程内缓存的策略对象
+        self.strategy = strategy or Strategy(strategy_id)
         i18n.set_biz(self.strategy.bk_biz_id)
         self.is_busy = False
+        # 本次处理后仍积压的待检测记录数(估算值)
+        self.backlog = 0
 
     def pull_data(self, item, inputs=None):
         """
@@ -60,47 +67,53 @@ class DetectProcess(BaseAbnormalPushProcessor):
         data_channel = key.DATA_LIST_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
         client = key.DATA_LIST_KEY.client
 
-        total_points = client.llen(data_channel)
         assert settings.SQL_MAX_LIMIT > 0, "SQL_MAX_LIMIT should bigger than zero"
-        offset = min([total_points, settings.SQL_MAX_LIMIT])
-        if offset == 0:
+        count_channel = key.DATA_LIST_RECORD_COUNT_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
+        elements, total_records = pull_elements(client, data_channel, settings.SQL_MAX_LIMIT, count_key=count_channel)
+        if total_records == 0:
             logger.info("[detect] strategy({}) item({}) 暂无待检测数据".format(self.strategy_id, item.id))
             return
-        if offset == settings.SQL_MAX_LIMIT:
+        if total_records >= settings.SQL_MAX_LIMIT:
             self.is_busy = True
+            # 按本次拉取的平均每个元素的记录数，估算队列中剩余的记录数
+            self.backlog += client.llen(data_channel) * total_records // len(elements)
             logger.error(
                 "[detect] strategy({}) item({}) 待检测数据量达到配置值"
                 "(SQL_MAX_LIMIT){}，部分数据可能存在处理延时".format(self.strategy_id, item.id, settings.SQL_MAX_LIMIT)
             )
 
-        records = client.lrange(data_channel, -offset, -1)
-
         # 上报detect拉取数据量
-        metrics.DETECT_PROCESS_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG, type="pull").inc(len(records))
+        metrics.DETECT_PROCESS_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG, type="pull").inc(total_records)
 
         unexpected_record_count = 0
         last_unexpected_record = None
-        if records:
-            client.ltrim(data_channel, 0, -offset - 1)
-            # 队列左进右出，lrange 取出时需要做一次倒序才能保证先进先出
-            for record in reversed(records):
+        # 元素已按先进先出排序，兼容旧版json及批量格式
+        for element in elements:
+            try:
+                records = decode_element(element)
+            except ValueError:
+                unexpected_record_count += count_element_records(element)
+                last_unexpected_record = element
+                continue
+
+            for record in records:
                 try:
-                    data_point = DataPoint(json.loads(record), item)
+                    data_point = DataPoint(record, item)
                     # fill data point into inputs list
                     self.inputs[item.id].append(data_point)
-                except ValueError:
+                except (ValueError, AttributeError, TypeError):
                     unexpected_record_count += 1
                     last_unexpected_record = record
-            if unexpected_record_count > 0:
-                logger.error(
-                    "[detect] strategy({}) item({}) 发现非期望格式的待检测数据{}条,"
-                    " 其中之一: {}".format(self.strategy_id, item.id, unexpected_record_count, last_unexpected_record)
-                )
-
-            logger.info(
-                "[detect] strategy({}) item({}) 拉取数据({})条".format(self.strategy_id, item.id, len(self.inputs[item.id]))
+        if unexpected_record_count > 0:
+            logger.error(
+                "[detect] strategy({}) item({}) 发现非期望格式的待检测数据{}条,"
+                " 其中之一: {}".format(self.strategy_id, item.id, unexpected_record_count, last_unexpected_record)
             )
 
+        logger.info(
+            "[detect] strategy({}) item({}) 拉取数据({})条".format(self.strategy_id, item.id, len(self.inputs[item.id]))
+        )
+
     def handle_data(self, item):
         # detect data
         data_points = self.inputs[item.id]
@@ -140,7 +153,10 @@ class DetectProcess(BaseAbnormalPushProcessor):
         with service_lock(key.SERVICE_LOCK_DETECT, strategy_id=self.strategy_id):
             start_at = time.time()
             logger.info(f"[detect][latency] strategy({self.strategy_id}) processing start")
-            self.strategy.gen_strategy_snapshot()
+            # 复用的策略对象已生成过快照时不再重复生成，由策略缓存负责定期刷新
+            # NOTE: Strategy 访问 snapshot_key 时会自动生成快照，因此只能通过实例属性判断是否已生成
+            if "snapshot_key" not in self.strategy.__dict__:
+                self.strategy.gen_strategy_snapshot()
             for item in self.strategy.items:
                 self.pull_data(item)
                 self.handle_data(item)
@@ -14,7 +14,11 @@ import functools
 import inspect
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
 
+import numpy as np
 from django.conf import settings
 from django.template import Context, Template
 from django.utils.translation import ugettext as _
@@ -23,6 +27,10 @@ from six.moves import range
 from alarm_backends.core.cache import key
 from alarm_backends.service.access.data.records import DataRecord
 from alarm_backends.service.detect import AnomalyDataPoint, DataPoint
+from alarm_backends.service.detect.strategy.batch import (
+    BatchDataPoints,
+    compile_batch_expr,
+)
 from alarm_backends.templatetags.unit import unit_auto_convert, unit_convert_min
 from core.errors.alarm_backends.detect import (
     HistoryDataNotExists,
@@ -124,6 +132,25 @@ class Algorithms(object):
         context = Context(self.get_context(data_point))
         return Template(self.desc_tpl).render(context)
 
+    def batch_detect_mask(self, data_points):
+        """
+        批量(向量化)预检测
+        :return: 与data_points等长的候选异常掩码，为False的数据点必定不是异常点；不支持批量检测时返回None
+        """
+        return None
+
+    def safe_batch_detect_mask(self, data_points):
+        """
+        批量预检测入口，未开启或批量检测出错时返回None，退化为逐点检测
+        """
+        if not settings.DETECT_BATCH_MODE_ENABLED or not data_points:
+            return None
+        try:
+            return self.batch_detect_mask(data_points)
+        except Exception as e:
+            logger.warning("[detect] batch detect error, fallback to point by point detect: {}".format(e))
+            return None
+
     def detect_records(self, data_points, level):
         """
         detect service entry
@@ -131,7 +158,11 @@ class Algorithms(object):
         if isinstance(data_points, DataPoint):
             data_points = [data_points]
         anomaly_points = []
-        for data_point in data_points:
+        candidate_mask = self.safe_batch_detect_mask(data_points)
+        for idx, data_point in enumerate(data_points):
+            # 批量预检测已确认为正常的数据点，无需逐点检测
+            if candidate_mask is not None and not candidate_mask[idx]:
+                continue
             try:
                 check_result = self.detect(data_point)
             except Exception:
@@ -228,6 +259,8 @@ class BasicAlgorithmsCollection(Algorithms):
     desc_tpl = ""
     # op is Or or And
     expr_op = "and"
+    # 是否支持批量检测，仅适用于表达式只依赖 value/unit/algorithm_unit 的算法
+    batch_detectable = False
 
     def __init__(self, config, unit=""):
         self.config = config or dict()
@@ -282,6 +315,29 @@ class BasicAlgorithmsCollection(Algorithms):
 
         return anomaly
 
+    def batch_detect_mask(self, data_points, batch=None):
+        if not self.batch_detectable:
+            return None
+
+        batch = batch or BatchDataPoints(data_points)
+        context = {"unit": batch.unit, "algorithm_unit": self.unit}
+        masks = []
+        for detector in self.detectors:
+            if isinstance(detector, BasicAlgorithmsCollection):
+                mask = detector.batch_detect_mask(data_points, batch)
+            else:
+                batch_expr = compile_batch_expr(detector.expr)
+                mask = batch_expr.evaluate(batch, context) if batch_expr else None
+
+            # 任一子表达式无法批量检测，则整体退化为逐点检测
+            if mask is None:
+                return None
+            masks.append(mask)
+
+        if self.expr_op == "and":
+            return np.logical_and.reduce(masks)
+        return np.logical_or.reduce(masks)
+
     def get_context(self, data_point):
         context = super(BasicAlgorithmsCollection, self).get_context(data_point)
         context.update(
@@ -290,15 +346,85 @@ class BasicAlgorithmsCollection(Algorithms):
         return context
 
 
+class HistoryDataCache(object):
+    """
+    历史数据进程内缓存(LRU)，同一个 worker 的多个检测周期间共享
+    容量按缓存的维度数量计算，每个条目的有效期不超过 DETECT_HISTORY_CACHE_TTL
+    其他进程对同一历史时刻的补充写入不会同步到本缓存，因此缓存数据最多滞后 DETECT_HISTORY_CACHE_TTL 秒
+    """
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            if cache_key not in self._data:
+                return None
+            expire_at, mapping, _ = self._data[cache_key]
+            if expire_at < time.time():
+                self._pop(cache_key)
+                return None
+            self._data.move_to_end(cache_key)
+            return mapping
+
+    def set(self, cache_key, mapping):
+        with self._lock:
+            now = time.time()
+            self._pop(cache_key)
+            # 空数据也占用一个容量，避免无数据的历史时刻不断累积
+            weight = max(1, len(mapping))
+            self._data[cache_key] = (now + settings.DETECT_HISTORY_CACHE_TTL, mapping, weight)
+            self._size += weight
+
+            # 缓存key包含历史时刻，过期条目通常不会再被读取，写入时从头部清理
+            # 被读取过的条目会移动到尾部，未能从头部清理的过期条目由容量上限兜底淘汰
+            while self._data:
+                head_key = next(iter(self._data))
+                if self._data[head_key][0] >= now:
+                    break
+                self._pop(head_key)
+
+            while self._size > settings.DETECT_HISTORY_CACHE_MAX_SIZE and len(self._data) > 1:
+                self._pop(next(iter(self._data)))
+
+    def update(self, cache_key, mapping):
+        """
+        合并新发布的历史数据，未缓存的key不做处理
+        """
+        with self._lock:
+            if cache_key not in self._data:
+                return
+            expire_at, cached, weight = self._data[cache_key]
+            cached.update(mapping)
+            self._data[cache_key] = (expire_at, cached, max(1, len(cached)))
+            self._size += max(1, len(cached)) - weight
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def _pop(self, cache_key):
+        if cache_key in self._data:
+            self._size -= self._data.pop(cache_key)[2]
+
+
+history_data_cache = HistoryDataCache()
+
+
 class HistoryPointFetcher(object):
     def set_default(self, value: int):
         self._default = value
 
     def query_history_points(self, data_points):
         item = data_points[0].item
+        interval = item.query_configs[0]["agg_interval"]
         # 按时间从小到大排序
         sorted_data_points = sorted(data_points, key=lambda x: x.timestamp)
         offsets = self.get_history_offsets(item)
+        time_ranges = []
         for offset in offsets:
             # offsets 支持区间（相邻offset之间差值等于interval的整数倍）批量查询
             if isinstance(offset, tuple):
@@ -310,14 +436,19 @@ class HistoryPointFetcher(object):
                 self._publish_history_points(item, data_points)
                 continue
 
-            records = []
-            from_timestamp, until_timestamp = (
-                sorted_data_points[0].timestamp - end,
-                sorted_data_points[-1].timestamp - start + item.query_configs[0]["agg_interval"],
+            time_ranges.append(
+                (sorted_data_points[0].timestamp - end, sorted_data_points[-1].timestamp - start + interval)
             )
 
+        # 一次性拉取所有历史时刻的数据，避免逐个时刻访问redis
+        history_timestamps = set()
+        for from_timestamp, until_timestamp in time_ranges:
+            history_timestamps.update(range(from_timestamp, until_timestamp, interval))
+        self._prefetch_history_points(item, history_timestamps)
+
+        for from_timestamp, until_timestamp in time_ranges:
             accessed = None
-            for history_timestamp in range(from_timestamp, until_timestamp, item.query_configs[0]["agg_interval"]):
+            for history_timestamp in range(from_timestamp, until_timestamp, interval):
                 if accessed is None:
                     accessed = True
                 accessed = accessed and self._check_history_points(item, history_timestamp)
@@ -326,19 +457,78 @@ class HistoryPointFetcher(object):
                 # 历史时刻的数据都已经查过
                 continue
 
+            records = []
             item_records = item.query_record(from_timestamp, until_timestamp)
             for record in item_records:
                 point = DataRecord(item, record)
                 if point.value:
                     records.append(adapter_data_access_2_detect(point, item))
 
-            self._local_history_storage = {}
             self._publish_history_points(item, records)
 
+    @staticmethod
+    def _is_stable_history(history_timestamp):
+        """
+        足够久远的历史时刻不会再有延迟数据写入，可以跨检测周期缓存
+        """
+        return time.time() - history_timestamp > settings.DETECT_HISTORY_CACHE_STABLE_SECONDS
+
+    def _get_local_history_storage(self):
+        if getattr(self, "_local_history_storage", None) is None:
+            self._local_history_storage = {}
+        return self._local_history_storage
+
+    def _get_history_storage(self, item, history_timestamp):
+        """
+        获取已缓存的历史时刻数据，未缓存返回None
+        """
+        history_key = key.HISTORY_DATA_KEY.get_key(
+            strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
+        )
+        local_storage = self._get_local_history_storage()
+        if history_key in local_storage:
+            return local_storage[history_key]
+
+        if self._is_stable_history(history_timestamp):
+            mapping = history_data_cache.get(history_key)
+            if mapping is not None:
+                local_storage[history_key] = mapping
+            return mapping
+
+    def _set_history_storage(self, item, history_timestamp, mapping):
+        history_key = key.HISTORY_DATA_KEY.get_key(
+            strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
+        )
+        self._get_local_history_storage()[history_key] = mapping
+        if self._is_stable_history(history_timestamp):
+            history_data_cache.set(history_key, mapping)
+
+    def _prefetch_history_points(self, item, history_timestamps):
+        """
+        批量拉取未缓存的历史时刻数据(单次pipeline)
+        """
+        missing_timestamps = sorted(
+            timestamp for timestamp in history_timestamps if self._get_history_storage(item, timestamp) is None
+        )
+        if not missing_timestamps:
+            return
+
+        pipeline = key.HISTORY_DATA_KEY.client.pipeline(transaction=False)
+        for history_timestamp in missing_timestamps:
+            pipeline.hgetall(
+                key.HISTORY_DATA_KEY.get_key(strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp)
+            )
+        for history_timestamp, mapping in zip(missing_timestamps, pipeline.execute()):
+            self._set_history_storage(item, history_timestamp, mapping or {})
+
     def _check_history_points(self, item, history_timestamp):
         """
-        检查历史时刻的数据是否已经拉取过，如果存在，则更新过期时间。
+        检查历史时刻的数据是否已经拉取过
         """
+        mapping = self._get_history_storage(item, history_timestamp)
+        if mapping is not None:
+            return bool(mapping)
+
         client = key.HISTORY_DATA_KEY.client
         history_key = key.HISTORY_DATA_KEY.get_key(
             strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
@@ -361,27 +551,31 @@ class HistoryPointFetcher(object):
             points_with_timestamp_map = history_points_map.setdefault(point.timestamp, {})
             points_with_timestamp_map[point.record_id.split(".")[0]] = json.dumps(point.as_dict())
 
+        local_storage = self._get_local_history_storage()
         for timestamp, _points_with_timestamp_map in history_points_map.items():
             history_key = history_key_maker(timestamp=timestamp)
             pipeline.hmset(history_key, _points_with_timestamp_map)
             pipeline.expire(history_key, key.HISTORY_DATA_KEY.ttl)
+
+            # 同步更新已缓存的历史数据
+            if history_key in local_storage:
+                local_storage[history_key].update(_points_with_timestamp_map)
+            history_data_cache.update(history_key, _points_with_timestamp_map)
         pipeline.execute()
 
     def fetch_history_point(self, item, point, history_timestamp):
         """
         获取当前数据点对应的历史数据点
         """
-        client = key.HISTORY_DATA_KEY.client
-        history_key = key.HISTORY_DATA_KEY.get_key(
-            strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
-        )
-        if not getattr(self, "_local_history_storage", None):
-            self._local_history_storage = {}
-
-        if history_key not in self._local_history_storage:
-            self._local_history_storage[history_key] = client.hgetall(history_key)
+        history_storage = self._get_history_storage(item, history_timestamp)
+        if history_storage is None:
+            history_key = key.HISTORY_DATA_KEY.get_key(
+                strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
+            )
+            history_storage = key.HISTORY_DATA_KEY.client.hgetall(history_key)
+            self._set_history_storage(item, history_timestamp, history_storage)
 
-        raw_data = self._local_history_storage[history_key].get(point.record_id.split(".")[0])
+        raw_data = history_storage.get(point.record_id.split(".")[0])
         if not raw_data:
             if getattr(self, "_default", None) is not None:
                 return DataPoint({"value": self._default, "time": history_timestamp}, item)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+批量(向量化)检测
+
+将阈值类表达式编译为基于 numpy 的批量比较，一次计算出整批数据点的"候选异常"掩码。
+掩码为 False 的数据点必定不是异常点，可以直接跳过；掩码为 True 的数据点仍然走原有的
+eval 逐点检测（同时生成异常描述），因此批量检测的结果与逐点检测完全一致。
+
+为了保证一致性，以下情况会被标记为候选点，交给逐点检测处理：
+1. 数据点的值不是数值类型(如 None、字符串)，或整数超出 float64 可精确表示的范围
+2. 数据点的值与阈值非常接近(单位换算及精度取整可能导致结果不同)
+3. 调试模式的数据点
+"""
+
+import ast
+import numbers
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from alarm_backends.templatetags.unit import unit_convert_min
+from core.unit import load_unit
+
+# float64 可精确表示的最大整数
+MAX_EXACT_INTEGER = 2**53
+
+COMPARE_OPERATORS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+
+class UnsupportedExpression(Exception):
+    pass
+
+
+class BatchDataPoints(object):
+    """
+    一批待检测数据点的数组视图
+    """
+
+    def __init__(self, data_points):
+        self.data_points = data_points
+        self.size = len(data_points)
+        self.unit = data_points[0].unit if data_points else ""
+
+        values = np.zeros(self.size, dtype=np.float64)
+        supported = np.ones(self.size, dtype=bool)
+        for idx, data_point in enumerate(data_points):
+            value = getattr(data_point, "value", None)
+            if (
+                not isinstance(value, numbers.Real)
+                or (isinstance(value, int) and abs(value) > MAX_EXACT_INTEGER)
+                or hasattr(data_point, "__debug__")
+            ):
+                supported[idx] = False
+                continue
+            values[idx] = value
+
+        self.values = values
+        self.supported = supported
+        self._converted_values = {}
+
+    def converted_values(self, unit):
+        """
+        unit_convert_min(value, unit) 的向量化版本(不做精度取整，精度差异由候选区间兜底)
+        """
+        if unit not in self._converted_values:
+            factor = load_unit(unit).convert_to_max(1.0, decimal=None)[0]
+            self._converted_values[unit] = self.values * factor
+        return self._converted_values[unit]
+
+
+class BatchExpr(object):
+    """
+    编译后的批量表达式
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.tree = ast.parse(expr, mode="eval").body
+        # 编译时先走一遍语法检查，不支持的表达式直接抛出异常
+        self._check(self.tree)
+
+    def _check(self, node):
+        if isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._check(value)
+            return
+
+        if isinstance(node, ast.Compare):
+            if len(node.ops) != 1 or type(node.ops[0]) not in COMPARE_OPERATORS:
+                raise UnsupportedExpression(self.expr)
+            self._check_value_operand(node.left)
+            self._check_threshold_operand(node.comparators[0])
+            return
+
+        raise UnsupportedExpression(self.expr)
+
+    def _check_value_operand(self, node):
+        """
+        支持: value / unit_convert_min(value, unit)
+        """
+        if isinstance(node, ast.Name) and node.id == "value":
+            return
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id == "unit_convert_min"
+            and not node.keywords
+            and len(node.args) == 2
+            and isinstance(node.args[0], ast.Name)
+            and node.args[0].id == "value"
+            and isinstance(node.args[1], ast.Name)
+            and node.args[1].id == "unit"
+        ):
+            return
+        raise UnsupportedExpression(self.expr)
+
+    def _check_threshold_operand(self, node):
+        """
+        支持: 数值常量 / unit_convert_min(数值常量, unit[, algorithm_unit])
+        """
+        if isinstance(node, ast.Call):
+            if (
+                not isinstance(node.func, ast.Name)
+                or node.func.id != "unit_convert_min"
+                or node.keywords
+                or len(node.args) not in (2, 3)
+            ):
+                raise UnsupportedExpression(self.expr)
+            self._literal(node.args[0])
+            for arg, name in zip(node.args[1:], ["unit", "algorithm_unit"]):
+                if not isinstance(arg, ast.Name) or arg.id != name:
+                    raise UnsupportedExpression(self.expr)
+            return
+        self._literal(node)
+
+    def _literal(self, node):
+        try:
+            value = ast.literal_eval(node)
+        except ValueError:
+            raise UnsupportedExpression(self.expr)
+        if not isinstance(value, numbers.Real) or isinstance(value, bool):
+            raise UnsupportedExpression(self.expr)
+        return value
+
+    def _threshold(self, node, context):
+        if isinstance(node, ast.Call):
+            args = [self._literal(node.args[0])] + [context[arg.id] for arg in node.args[1:]]
+            return unit_convert_min(*args)
+        return self._literal(node)
+
+    def _evaluate(self, node, batch, context):
+        """
+        三值逻辑批量求值
+        :return: (definitely_true, definitely_false) 确定为真/确定为假的数据点掩码，两者都为False表示结果不确定
+        """
+        if isinstance(node, ast.BoolOp):
+            trues, falses = zip(*[self._evaluate(value, batch, context) for value in node.values])
+            if isinstance(node.op, ast.And):
+                return np.logical_and.reduce(trues), np.logical_or.reduce(falses)
+            return np.logical_or.reduce(trues), np.logical_and.reduce(falses)
+
+        left = node.left
+        values = batch.values if isinstance(left, ast.Name) else batch.converted_values(context["unit"])
+        threshold = self._threshold(node.comparators[0], context)
+        if not isinstance(threshold, numbers.Real) or abs(threshold) > MAX_EXACT_INTEGER:
+            raise UnsupportedExpression(self.expr)
+
+        result = COMPARE_OPERATORS[type(node.ops[0])](values, threshold)
+        # 与阈值接近的数据点，单位换算及精度取整可能导致结果不同，标记为不确定
+        certain = ~np.isclose(values, threshold, rtol=1e-9, atol=10**-settings.POINT_PRECISION) & batch.supported
+        return result & certain, ~result & certain
+
+    def evaluate(self, batch, context):
+        """
+        :param batch: BatchDataPoints
+        :param context: 表达式上下文，需要包含 unit 和 algorithm_unit
+        :return: 候选异常掩码 -> np.ndarray(bool)
+        """
+        _, definitely_false = self._evaluate(self.tree, batch, context)
+        return ~definitely_false
+
+
+@lru_cache(maxsize=1024)
+def compile_batch_expr(expr):
+    """
+    编译批量表达式，不支持的表达式返回None
+    """
+    try:
+        return BatchExpr(expr)
+    except (UnsupportedExpression, SyntaxError):
+        return None
@@ -37,6 +37,7 @@ class AlgorithmsAST(ast.NodeTransformer):
 class AndThreshold(BasicAlgorithmsCollection):
     config_serializer = ThresholdSerializer.AndSerializer
     expr_op = "and"
+    batch_detectable = True
 
     desc_tpl = "{{% load unit %}} {method_desc} {threshold}{{{{unit|unit_suffix:algorithm_unit}}}}"
 
@@ -12,8 +12,10 @@ specific language governing permissions and limitations under the License.
 import logging
 
 from celery.task import task
+from django.conf import settings
 
 from alarm_backends.core.cache import key
+from alarm_backends.service.detect.backlog import record_backlog
 from alarm_backends.service.detect.process import DetectProcess
 from core.errors.alarm_backends import LockError
 from core.prometheus import metrics
@@ -21,28 +23,68 @@ from core.prometheus import metrics
 logger = logging.getLogger("detect")
 
 
-@task(ignore_result=True, queue="celery_service")
-def run_detect(strategy_id):
+def detect_strategy(strategy_id, max_passes=1, strategy=None, reschedule=True):
+    """
+    处理单个策略，待检测数据积压时在同一任务内最多处理 max_passes 轮
+    :param strategy: 预先加载的策略对象
+    :param reschedule: 处理后仍有积压时是否重新投递检测任务
+    :return: 处理后是否仍有积压
+    """
     client = key.DATA_SIGNAL_KEY.client
     data_signal_key = key.DATA_SIGNAL_KEY.get_key()
-    exc = None
-    try:
-        processor = DetectProcess(strategy_id)
-        processor.process()
-    except LockError:
-        logger.info("Failed to acquire lock. on strategy({})".format(strategy_id))
-        client.delay("lpush", data_signal_key, strategy_id, delay=20)
-    except Exception as e:
-        exc = e
-        logger.exception("Process strategy({strategy_id}) exception, " "{msg}".format(strategy_id=strategy_id, msg=e))
-    else:
-        # 当前策略待检测数据过多
-        if processor.is_busy:
-            run_detect.apply_async(args=(strategy_id,))
-            logger.info(f"detect processor is busy with strategy({strategy_id})")
-
-    metrics.DETECT_PROCESS_COUNT.labels(
-        strategy_id=metrics.TOTAL_TAG, status=metrics.StatusEnum.from_exc(exc), exception=exc
-    ).inc()
+    backlog = None
+    is_busy = False
+    for _ in range(max_passes):
+        exc = None
+        is_busy = False
+        try:
+            processor = DetectProcess(strategy_id, strategy=strategy)
+            processor.process()
+        except LockError:
+            logger.info("Failed to acquire lock. on strategy({})".format(strategy_id))
+            client.delay("lpush", data_signal_key, strategy_id, delay=20)
+        except Exception as e:
+            exc = e
+            logger.exception(
+                "Process strategy({strategy_id}) exception, " "{msg}".format(strategy_id=strategy_id, msg=e)
+            )
+        else:
+            is_busy = processor.is_busy
+            backlog = processor.backlog
+
+        metrics.DETECT_PROCESS_COUNT.labels(
+            strategy_id=metrics.TOTAL_TAG, status=metrics.StatusEnum.from_exc(exc), exception=exc
+        ).inc()
+
+        if not is_busy:
+            break
+
+    # 当前策略待检测数据过多
+    if is_busy and reschedule:
+        run_detect.apply_async(args=(strategy_id,))
+        logger.info(f"detect processor is busy with strategy({strategy_id})")
+
+    # 只有处理成功时才能确定积压量
+    if backlog is not None and settings.DETECT_ADAPTIVE_SCHEDULE_ENABLED:
+        try:
+            record_backlog(strategy_id, backlog)
+        except Exception as e:
+            logger.exception(f"record backlog of strategy({strategy_id}) error: {e}")
+
+    return is_busy
 
+
+@task(ignore_result=True, queue="celery_service")
+def run_detect(strategy_id, max_passes=1):
+    detect_strategy(strategy_id, max_passes=max_passes)
+    metrics.report_all()
+
+
+@task(ignore_result=True, queue="celery_service")
+def run_detect_batch(strategy_ids):
+    """
+    合并处理多个无积压的策略，减少任务调度开销
+    """
+    for strategy_id in strategy_ids:
+        detect_strategy(strategy_id)
     metrics.report_all()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+detect 常驻进程
+
+1. 各进程定期上报心跳，按存活进程构建一致性哈希环，每个策略固定由其中一个进程处理
+2. 从公共信号队列拉取的策略如果不属于当前进程，转发到所属进程的专属信号队列
+3. 进程内缓存策略对象(包括监控项等配置)，按策略缓存摘要失效，避免每次检测都重新反序列化策略配置
+"""
+
+import logging
+import os
+import time
+from typing import Dict, List
+
+from django.conf import settings
+
+from alarm_backends.constants import CONST_ONE_HOUR
+from alarm_backends.core.cache import key
+from alarm_backends.core.cache.strategy import StrategyCacheManager
+from alarm_backends.core.control.strategy import Strategy
+from alarm_backends.management.hashring import HashRing
+from alarm_backends.service.detect.tasks import detect_strategy
+from bkmonitor.utils.common_utils import get_local_ip
+from core.prometheus import metrics
+
+logger = logging.getLogger("detect")
+
+
+class StrategyWarmCache(object):
+    """
+    进程内常驻的策略缓存
+    """
+
+    # 无法获取策略摘要时的缓存有效期(秒)
+    TTL = 60
+    # 策略快照的刷新间隔(秒)，需小于快照的过期时间
+    SNAPSHOT_REFRESH_INTERVAL = CONST_ONE_HOUR // 2
+
+    def __init__(self):
+        # {strategy_id: (摘要, 策略对象, 加载时间, 快照生成时间)}
+        self.strategies = {}
+
+    def get_strategies(self, strategy_ids: List[str]) -> Dict[str, Strategy]:
+        """
+        批量获取策略对象，策略摘要发生变化时重新加载
+        """
+        if not strategy_ids:
+            return {}
+
+        digests = StrategyCacheManager.cache.hmget(StrategyCacheManager.DIGEST_CACHE_KEY, strategy_ids)
+        now = time.time()
+        result = {}
+        for strategy_id, digest in zip(strategy_ids, digests):
+            cached = self.strategies.get(strategy_id)
+            if cached and (digest == cached[0] if digest else now - cached[2] < self.TTL):
+                _, strategy, _, snapshot_time = cached
+            else:
+                strategy, snapshot_time = Strategy(strategy_id), 0
+                self.strategies[strategy_id] = (digest, strategy, now, snapshot_time)
+
+            if now - snapshot_time > self.SNAPSHOT_REFRESH_INTERVAL:
+                # 快照即将过期时删除快照标记，由检测流程重新生成
+                strategy.__dict__.pop("snapshot_key", None)
+                self.strategies[strategy_id] = self.strategies[strategy_id][:3] + (now,)
+            result[strategy_id] = strategy
+        return result
+
+    def retain(self, strategy_ids):
+        """
+        仅保留指定策略的缓存，释放不再由当前进程处理的策略
+        """
+        for strategy_id in set(self.strategies) - set(strategy_ids):
+            self.strategies.pop(strategy_id, None)
+
+
+class DetectWorker(object):
+    """
+    常驻检测进程
+    """
+
+    # 心跳上报间隔及超时时间(秒)
+    HEARTBEAT_INTERVAL = 10
+    HEARTBEAT_TIMEOUT = 60
+
+    def __init__(self, worker_id=None):
+        self.pid = os.getpid()
+        self.worker_id = worker_id or "{}/{}".format(get_local_ip(), self.pid)
+        self.client = key.DATA_SIGNAL_KEY.client
+        self.data_signal_key = key.DATA_SIGNAL_KEY.get_key()
+        self.worker_signal_key = key.DETECT_WORKER_SIGNAL_KEY.get_key(worker_id=self.worker_id)
+        self.heartbeat_key = key.DETECT_WORKER_HEARTBEAT_KEY.get_key()
+
+        self.strategy_cache = StrategyWarmCache()
+        self.workers = []
+        self.hash_ring = None
+        self.last_heartbeat = 0
+        # 已离开哈希环的进程 {进程标识: 离开时间}
+        self.departed_workers = {}
+
+    def heartbeat(self):
+        """
+        上报心跳，并在存活进程变化时重建哈希环
+        """
+        now = time.time()
+        if now - self.last_heartbeat < self.HEARTBEAT_INTERVAL:
+            return
+        self.last_heartbeat = now
+
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.hset(self.heartbeat_key, self.worker_id, int(now))
+        pipeline.expire(self.heartbeat_key, key.DETECT_WORKER_HEARTBEAT_KEY.ttl)
+        pipeline.hgetall(self.heartbeat_key)
+        heartbeats = pipeline.execute()[-1] or {}
+
+        workers = []
+        expired_workers = []
+        for worker_id, heartbeat_time in heartbeats.items():
+            if now - int(heartbeat_time) > self.HEARTBEAT_TIMEOUT:
+                expired_workers.append(worker_id)
+            else:
+                workers.append(worker_id)
+        if expired_workers:
+            self.client.hdel(self.heartbeat_key, *expired_workers)
+
+        workers.sort()
+        for worker_id in set(self.workers) - set(workers) | set(expired_workers):
+            self.departed_workers.setdefault(worker_id, now)
+        # 其他进程可能仍按旧的哈希环转发信号，在心跳超时时间内持续回收离开进程的专属队列
+        self.departed_workers = {
+            worker_id: departed_time
+            for worker_id, departed_time in self.departed_workers.items()
+            if worker_id not in workers and now - departed_time < self.HEARTBEAT_TIMEOUT
+        }
+        if self.departed_workers:
+            self.drain_signals(list(self.departed_workers))
+
+        if workers != self.workers:
+            logger.info("[detect worker] %s rebuild hash ring with workers: %s", self.worker_id, workers)
+            self.workers = workers
+            self.hash_ring = HashRing({worker_id: 1 for worker_id in workers})
+            # 哈希环变化后，释放不再由当前进程处理的策略缓存
+            owned_strategy_ids = [
+                strategy_id
+                for strategy_id in self.strategy_cache.strategies
+                if self.get_owner(strategy_id) == self.worker_id
+            ]
+            self.strategy_cache.retain(owned_strategy_ids)
+
+    def drain_signals(self, worker_ids: List[str]):
+        """
+        将已离开哈希环的进程专属队列中的信号移回公共队列，由存活进程重新分配
+        """
+        signal_keys = [key.DETECT_WORKER_SIGNAL_KEY.get_key(worker_id=worker_id) for worker_id in worker_ids]
+        pipeline = self.client.pipeline(transaction=False)
+        for signal_key in signal_keys:
+            pipeline.llen(signal_key)
+        lengths = pipeline.execute()
+        if not any(lengths):
+            return
+
+        # 逐个原子移动，多个存活进程同时回收时信号不会重复或丢失
+        for signal_key, length in zip(signal_keys, lengths):
+            for _ in range(length):
+                pipeline.rpoplpush(signal_key, self.data_signal_key)
+        moved_count = len([result for result in pipeline.execute() if result is not None])
+        if moved_count:
+            self.client.expire(self.data_signal_key, key.DATA_SIGNAL_KEY.ttl)
+            logger.info("[detect worker] %s drained %s signals of workers: %s", self.worker_id, moved_count, worker_ids)
+
+    def get_owner(self, strategy_id) -> str:
+        if self.hash_ring is None:
+            return self.worker_id
+        return self.hash_ring.get_node(str(strategy_id))
+
+    def pull_signals(self, timeout=1) -> List[str]:
+        """
+        拉取待处理的策略，优先处理专属信号队列
+        """
+        batch_size = settings.DETECT_WORKER_BATCH_SIZE
+        pipeline = self.client.pipeline(transaction=False)
+        for signal_key in (self.worker_signal_key, self.data_signal_key):
+            pipeline.lrange(signal_key, -batch_size, -1)
+            pipeline.ltrim(signal_key, 0, -batch_size - 1)
+        results = pipeline.execute()
+        # 队列为先进先出，元素从右侧取出
+        strategy_ids = list(reversed(results[0])) + list(reversed(results[2]))
+        if strategy_ids:
+            return strategy_ids
+
+        ret = self.client.brpop([self.worker_signal_key, self.data_signal_key], timeout)
+        return [ret[1]] if ret else []
+
+    def dispatch(self, strategy_ids: List[str]) -> List[str]:
+        """
+        转发不属于当前进程的策略，返回当前进程需要处理的策略(已去重)
+        """
+        owned_strategy_ids = []
+        worker_strategy_ids = {}
+        for strategy_id in strategy_ids:
+            owner = self.get_owner(strategy_id)
+            if owner == self.worker_id:
+                if strategy_id not in owned_strategy_ids:
+                    owned_strategy_ids.append(strategy_id)
+            else:
+                worker_strategy_ids.setdefault(owner, set()).add(strategy_id)
+
+        if worker_strategy_ids:
+            pipeline = self.client.pipeline(transaction=False)
+            for worker_id, forward_strategy_ids in worker_strategy_ids.items():
+                signal_key = key.DETECT_WORKER_SIGNAL_KEY.get_key(worker_id=worker_id)
+                pipeline.lpush(signal_key, *forward_strategy_ids)
+                pipeline.expire(signal_key, key.DETECT_WORKER_SIGNAL_KEY.ttl)
+            pipeline.execute()
+        return owned_strategy_ids
+
+    def run_once(self):
+        self.heartbeat()
+        strategy_ids = self.dispatch(self.pull_signals())
+        if not strategy_ids:
+            return
+
+        busy_strategy_ids = []
+        for strategy_id, strategy in self.strategy_cache.get_strategies(strategy_ids).items():
+            if detect_strategy(strategy_id, strategy=strategy, reschedule=False):
+                busy_strategy_ids.append(strategy_id)
+        metrics.report_all()
+
+        # 仍有积压的策略放回专属队列，下一轮继续处理
+        if busy_strategy_ids:
+            self.client.lpush(self.worker_signal_key, *busy_strategy_ids)
+            self.client.expire(self.worker_signal_key, key.DETECT_WORKER_SIGNAL_KEY.ttl)
+        logger.info("[detect worker] %s processed %s strategy_ids", self.worker_id, len(strategy_ids))
+
+    def run(self, seconds):
+        """
+        持续处理 seconds 秒
+        """
+        end_time = time.time() + seconds
+        while time.time() < end_time:
+            self.run_once()
+
+
+_worker = None
+
+
+def get_detect_worker() -> DetectWorker:
+    """
+    获取当前进程的常驻检测对象，进程内的多轮运行共享策略缓存
+    """
+    global _worker
+    if _worker is None or _worker.pid != os.getpid():
+        _worker = DetectWorker()
+    return _worker
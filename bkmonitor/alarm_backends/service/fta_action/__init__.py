@@ -26,6 +26,7 @@ from django.utils.translation import ugettext as _
 from alarm_backends.core.cache.action_config import ActionConfigCacheManager
 from alarm_backends.core.context import ActionContext
 from alarm_backends.core.i18n import i18n
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from api.itsm.default import (
     CreateFastApprovalTicketResource,
     TicketApproveResultResource,
@@ -308,7 +309,7 @@ class BaseActionProcessor(object):
             create_time=int(time.time()),
             event_id="{}{}".format(int(self.action.create_time.timestamp()), self.action.id),
         )
-        AlertLog.bulk_create([AlertLog(**action_log)])
+        bulk_save([AlertLog(**action_log)])
 
     def set_start_to_execute(self):
         """
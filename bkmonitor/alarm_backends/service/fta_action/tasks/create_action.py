@@ -17,6 +17,7 @@ from alarm_backends.core.cache.key import ACTION_POLL_KEY_LOCK
 from alarm_backends.core.cluster import get_cluster_bk_biz_ids
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.lock.service_lock import service_lock
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from alarm_backends.service.converge.shield.shielder import AlertShieldConfigShielder
 from alarm_backends.service.fta_action.double_check import DoubleCheckHandler
 from alarm_backends.service.fta_action.tasks.alert_assign import AlertAssigneeManager
@@ -447,7 +448,7 @@ class CreateActionProcessor:
                 create_time=current_timestamp,
                 event_id=current_timestamp,
             )
-            AlertLog.bulk_create([AlertLog(**action_log)])
+            bulk_save([AlertLog(**action_log)])
             return False
         return True
 
@@ -519,7 +520,7 @@ class CreateActionProcessor:
             create_time=current_timestamp,
             event_id=current_timestamp,
         )
-        AlertLog.bulk_create([AlertLog(**action_log)])
+        bulk_save([AlertLog(**action_log)])
         return False
 
     def do_create_actions(self):
@@ -669,7 +670,7 @@ class CreateActionProcessor:
             # 有qos处理记录， 这里只有可能是通知处理的
             alert_logs.append(Alert.create_qos_log(qos_alerts, current_qos_count, len(qos_alerts)))
         if alert_logs:
-            AlertLog.bulk_create(alert_logs)
+            bulk_save(alert_logs)
         return new_actions
 
     @staticmethod
@@ -12,6 +12,7 @@ from alarm_backends.core.alert import Alert
 from alarm_backends.core.alert.alert import AlertKey
 from alarm_backends.core.cache import key
 from alarm_backends.core.lock.service_lock import service_lock
+from alarm_backends.core.storage.es_bulk_writer import bulk_save
 from alarm_backends.service.fta_action.utils import PushActionProcessor
 from bkmonitor.documents import AlertDocument, AlertLog
 from bkmonitor.documents.base import BulkActionType
@@ -120,7 +121,7 @@ class NoiseReduceRecordProcessor:
             create_time=current_timestamp,
             event_id=current_timestamp,
         )
-        AlertLog.bulk_create([AlertLog(**action_log)])
+        bulk_save([AlertLog(**action_log)])
 
         logger.info("end to record dimension values of strategy(%s), start alert(%s)", self.strategy_id, self.alert.id)
         return True
@@ -193,7 +194,7 @@ class NoiseReduceExecuteProcessor:
                         create_time=self.end_time,
                         event_id=self.end_time,
                     )
-                    AlertLog.bulk_create([AlertLog(**action_log)])
+                    bulk_save([AlertLog(**action_log)])
 
                     logger.info(
                         "count(%s) of noise reduce task of strategy(%s) dimension_hash(%s) is less than settings(%s), "
@@ -59,11 +59,41 @@ class CheckProcessor(BaseAbnormalPushProcessor):
             self.inputs[item.id].extend(inputs)
             return
         # pull data
-        data_channel = key.NO_DATA_LIST_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
-        client = key.NO_DATA_LIST_KEY.client
+        data_channel = key.NO_DATA_BUCKET_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
+        client = key.NO_DATA_BUCKET_KEY.client
+        unexpected_records = []
+
+        # 兼容旧版列表队列中的数据
+        self.migrate_legacy_records(item, data_channel, unexpected_records)
+
+        # 待检测数据按数据时间排序，一次获取检测时间点之前的数据以及未来最早一条数据
+        pipeline = client.pipeline(transaction=False)
+        pipeline.zrangebyscore(data_channel, "-inf", check_timestamp)
+        pipeline.zrangebyscore(data_channel, f"({check_timestamp}", "+inf", start=0, num=1, withscores=True)
+        records, earliest_future_records = pipeline.execute()
+
+        self.inputs[item.id] = self.load_data_points(item, records, unexpected_records)
+        pulled_records = list(records)
+
+        # 如果当前监测点之前无数据，但是未来有数据，那么取未来一个周期的数据
+        if not self.inputs[item.id] and earliest_future_records:
+            earliest_future_timestamp = int(earliest_future_records[0][1])
+            future_records = client.zrangebyscore(data_channel, earliest_future_timestamp, earliest_future_timestamp)
+            self.inputs[item.id] = self.load_data_points(item, future_records, unexpected_records)
+            pulled_records.extend(future_records)
+            logger.info(
+                "[nodata] strategy({}) item({}) check_timestamp({}) get future_timestamp({}) {} records,"
+                "其中之一: {}".format(
+                    self.strategy_id,
+                    item.id,
+                    check_timestamp,
+                    earliest_future_timestamp,
+                    len(future_records),
+                    future_records[0] if future_records else None,
+                )
+            )
 
-        total_points = client.llen(data_channel)
-        if total_points == 0:
+        if not pulled_records:
             logger.info(
                 "[nodata] strategy({}) item({}) check_timestamp({}) 无待检测数据，可能触发无数据告警".format(
                     self.strategy_id, item.id, check_timestamp
@@ -71,81 +101,71 @@ class CheckProcessor(BaseAbnormalPushProcessor):
             )
             return
 
-        records = client.lrange(data_channel, -total_points, -1)
-        metrics.NODATA_PROCESS_PULL_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG).inc(len(records))
-
-        unexpected_record_count = 0
-        last_unexpected_record = None
-        if records:
-            client.ltrim(data_channel, 0, -total_points - 1)
-            logger.info(
-                "[nodata] strategy({}) item({}) check_timestamp({}) pull records({})".format(
-                    self.strategy_id, item.id, check_timestamp, total_points
-                )
+        # 只删除已拉取的数据，当前检测周期之后的数据保留在原位等待后续检测
+        pipeline = client.pipeline(transaction=False)
+        for offset in range(0, len(pulled_records), 10000):
+            pipeline.zrem(data_channel, *pulled_records[offset : offset + 10000])
+        pipeline.execute()
+        metrics.NODATA_PROCESS_PULL_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG).inc(len(pulled_records))
+        logger.info(
+            "[nodata] strategy({}) item({}) check_timestamp({}) pull records({})".format(
+                self.strategy_id, item.id, check_timestamp, len(pulled_records)
             )
-            future_records = []
-            for record in records:
-                try:
-                    data_point = DataPoint(json.loads(record), item)
-                    if data_point.timestamp <= check_timestamp:
-                        self.inputs[item.id].append(data_point)
-                    else:
-                        future_records.append(record)
-                except ValueError:
-                    unexpected_record_count += 1
-                    last_unexpected_record = record
-
-            # 如果当前监测点之前无数据，但是未来有数据，那么取未来一个周期的数据
-            if not self.inputs[item.id] and future_records:
-                record = future_records[0]
-                data_point = DataPoint(json.loads(record), item)
-                earliest_future_timestamp = data_point.timestamp
-                earliest_future_points = [data_point]
-                earliest_future_records_idx = [0]
-                for index, record in enumerate(future_records[1:]):
-                    data_point = DataPoint(json.loads(record), item)
-                    # 遇到更早时间数据，重置 earliest_future_points 和 earliest_future_records_idx
-                    if data_point.timestamp < earliest_future_timestamp:
-                        earliest_future_timestamp = data_point.timestamp
-                        earliest_future_points = [data_point]
-                        earliest_future_records_idx = [index + 1]
-                    # 遇到和当前最早时间一致的数据，加入 earliest_future_points 和 earliest_future_records_idx
-                    elif data_point.timestamp == earliest_future_timestamp:
-                        earliest_future_points.append(data_point)
-                        earliest_future_records_idx.append(index + 1)
-
-                self.inputs[item.id] = earliest_future_points
-                future_records = [
-                    record for index, record in enumerate(future_records) if index not in earliest_future_records_idx
-                ]
-                logger.info(
-                    "[nodata] strategy({}) item({}) check_timestamp({}) get future_timestamp({}) {} records,"
-                    "其中之一: {}".format(
-                        self.strategy_id,
-                        item.id,
-                        check_timestamp,
-                        earliest_future_timestamp,
-                        len(earliest_future_records_idx),
-                        data_point._raw_input,
-                    )
-                )
+        )
 
-            # 当前检测周期之后的数据或者未来周期非最早时间的数据，重新放入队列等待后续检测
-            if future_records:
-                client.rpush(data_channel, *future_records)
-            if unexpected_record_count > 0:
-                logger.error(
-                    "[nodata] strategy({}) item({}) check_timestamp({}) 发现非期望格式的待检测数据{}条,"
-                    "其中之一: {}".format(
-                        self.strategy_id, item.id, check_timestamp, unexpected_record_count, last_unexpected_record
-                    )
+        if unexpected_records:
+            logger.error(
+                "[nodata] strategy({}) item({}) check_timestamp({}) 发现非期望格式的待检测数据{}条,"
+                "其中之一: {}".format(
+                    self.strategy_id, item.id, check_timestamp, len(unexpected_records), unexpected_records[-1]
                 )
+            )
 
-            logger.info(
-                "[nodata] strategy({}) item({}) check_timestamp({}) 拉取数据({})条".format(
-                    self.strategy_id, item.id, check_timestamp, len(self.inputs[item.id])
-                )
+        logger.info(
+            "[nodata] strategy({}) item({}) check_timestamp({}) 拉取数据({})条".format(
+                self.strategy_id, item.id, check_timestamp, len(self.inputs[item.id])
             )
+        )
+
+    @staticmethod
+    def load_data_points(item, records, unexpected_records):
+        data_points = []
+        for record in records:
+            try:
+                data_points.append(DataPoint(json.loads(record), item))
+            except ValueError:
+                unexpected_records.append(record)
+        return data_points
+
+    def migrate_legacy_records(self, item, data_channel, unexpected_records):
+        """
+        将旧版列表队列中的数据按数据时间写入有序集合
+        """
+        legacy_channel = key.NO_DATA_LIST_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
+        legacy_client = key.NO_DATA_LIST_KEY.client
+        total_points = legacy_client.llen(legacy_channel)
+        if not total_points:
+            return
+
+        records = legacy_client.lrange(legacy_channel, -total_points, -1)
+        legacy_client.ltrim(legacy_channel, 0, -total_points - 1)
+
+        elements = []
+        for record in records:
+            try:
+                elements.append((record, json.loads(record)["time"]))
+            except (ValueError, KeyError, TypeError):
+                unexpected_records.append(record)
+        if not elements:
+            return
+
+        client = key.NO_DATA_BUCKET_KEY.client
+        agg_interval = min(query_config["agg_interval"] for query_config in item.query_configs)
+        pipeline = client.pipeline(transaction=False)
+        for offset in range(0, len(elements), 10000):
+            pipeline.zadd(data_channel, dict(elements[offset : offset + 10000]))
+        pipeline.expire(data_channel, max([key.NO_DATA_BUCKET_KEY.ttl, agg_interval * 5]))
+        pipeline.execute()
 
     def handle_data(self, item, check_timestamp):
         # check no data
@@ -12,14 +12,21 @@ specific language governing permissions and limitations under the License.
 
 import logging
 
+from django.conf import settings
 from django.utils.translation import ugettext as _
 
 from alarm_backends.constants import NO_DATA_TAG_DIMENSION
-from alarm_backends.core.cache.key import CHECK_RESULT_CACHE_KEY
+from alarm_backends.core.cache.key import CHECK_RESULT_CACHE_KEY, CHECK_RESULT_RING_KEY
 from alarm_backends.core.control.record_parser import RecordParser
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.detect_result import ANOMALY_LABEL
+from alarm_backends.core.detect_result.ring import (
+    RING_FIELDS,
+    get_check_results_from_ring,
+    get_ring_key,
+)
 from bkmonitor.models import AnomalyRecord
+from bkmonitor.utils.common_utils import chunks
 
 logger = logging.getLogger("trigger")
 
@@ -54,6 +61,8 @@ class AnomalyChecker(object):
         # shortcut
         self.dimensions_md5 = self.record_parser.dimensions_md5
         self.source_time = self.record_parser.source_time
+        # 批量模式下预拉取的检测结果 {check_cache_key: [(label, score), ...]}
+        self.check_results_cache = None
 
     @staticmethod
     def is_no_data_point(point):
@@ -163,14 +172,12 @@ class AnomalyChecker(object):
                 anomaly_level = level
         return anomaly_level, anomaly_timestamps
 
-    def _check_anomaly_by_level(self, level):
+    def _get_trigger_config(self, level):
         """
-        检测某个级别的异常点是否满足触发条件
-        :param str level: 告警级别
-        :return: 二元组：是否被触发，异常次数
+        获取某个级别的触发配置，不存在时返回None
         """
         try:
-            trigger_config = self.trigger_configs[level]
+            return self.trigger_configs[level]
         except KeyError:
             trigger_configs = self.trigger_configs.values()
             if not trigger_configs:
@@ -180,11 +187,16 @@ class AnomalyChecker(object):
                         self.strategy_id, self.item_id, level
                     )
                 )
-                return False, []
+                return None
 
             # 默认兜底，trigger 配置当前所有告警级别默认一致
-            trigger_config = list(trigger_configs)[0]
+            return list(trigger_configs)[0]
 
+    def _get_check_window(self, level, trigger_config):
+        """
+        获取某个级别的检测窗口
+        :return: 三元组：检测结果缓存key，窗口起始时间，窗口结束时间
+        """
         check_cache_key = CHECK_RESULT_CACHE_KEY.get_key(
             strategy_id=self.strategy_id,
             item_id=self.item_id,
@@ -193,9 +205,91 @@ class AnomalyChecker(object):
         )
         # 在对应的打点队列中取出打点信息。时间范围为source_time前后的一个窗口偏移量
         check_window_offset = trigger_config["check_window_size"] * self.check_window_unit - 1
-        check_results = CHECK_RESULT_CACHE_KEY.client.zrangebyscore(
-            name=check_cache_key, min=self.source_time - check_window_offset, max=self.source_time, withscores=True
+        return check_cache_key, self.source_time - check_window_offset, self.source_time
+
+    def get_check_windows(self):
+        """
+        获取所有级别需要的检测窗口，用于批量预拉取检测结果
+        """
+        check_windows = []
+        for level in self.point["anomaly"]:
+            trigger_config = self._get_trigger_config(str(level))
+            if trigger_config:
+                check_windows.append(self._get_check_window(str(level), trigger_config))
+        return check_windows
+
+    def _get_check_results(self, check_cache_key, min_score, max_score):
+        if self.check_results_cache is not None and check_cache_key in self.check_results_cache:
+            # 预拉取的结果已按分数从小到大排序，过滤后与 zrangebyscore 的结果一致
+            return [
+                (label, score)
+                for label, score in self.check_results_cache[check_cache_key]
+                if min_score <= score <= max_score
+            ]
+        if settings.CHECK_RESULT_RING_ENABLED:
+            ring_data = CHECK_RESULT_RING_KEY.client.hmget(get_ring_key(check_cache_key), *RING_FIELDS)
+            check_results = get_check_results_from_ring(ring_data, self.check_window_unit, min_score, max_score)
+            if check_results is not None:
+                return check_results
+        return CHECK_RESULT_CACHE_KEY.client.zrangebyscore(
+            name=check_cache_key, min=min_score, max=max_score, withscores=True
         )
+
+    @classmethod
+    def prefetch_check_results(cls, checkers, chunk_size=5000):
+        """
+        批量预拉取一组检测器需要的检测结果
+        相同维度和级别的检测窗口会被合并，所有窗口通过 pipeline 一次性拉取，之后在内存中完成触发判断
+        开启检测结果环形位图时优先从位图中还原检测结果，位图无法覆盖的窗口再从有序集合中拉取
+        """
+        windows = {}
+        check_window_units = {}
+        for checker in checkers:
+            for check_cache_key, min_score, max_score in checker.get_check_windows():
+                check_window_units[check_cache_key] = checker.check_window_unit
+                if check_cache_key in windows:
+                    window = windows[check_cache_key]
+                    windows[check_cache_key] = (min(window[0], min_score), max(window[1], max_score))
+                else:
+                    windows[check_cache_key] = (min_score, max_score)
+
+        check_results_cache = {}
+        if settings.CHECK_RESULT_RING_ENABLED:
+            for chunked_windows in chunks(list(windows.items()), chunk_size):
+                pipeline = CHECK_RESULT_RING_KEY.client.pipeline(transaction=False)
+                for check_cache_key, window in chunked_windows:
+                    pipeline.hmget(get_ring_key(check_cache_key), *RING_FIELDS)
+                for (check_cache_key, (min_score, max_score)), ring_data in zip(chunked_windows, pipeline.execute()):
+                    check_results = get_check_results_from_ring(
+                        ring_data, check_window_units[check_cache_key], min_score, max_score
+                    )
+                    if check_results is not None:
+                        check_results_cache[check_cache_key] = check_results
+                        windows.pop(check_cache_key)
+
+        for chunked_windows in chunks(list(windows.items()), chunk_size):
+            pipeline = CHECK_RESULT_CACHE_KEY.client.pipeline(transaction=False)
+            for check_cache_key, (min_score, max_score) in chunked_windows:
+                pipeline.zrangebyscore(name=check_cache_key, min=min_score, max=max_score, withscores=True)
+            for (check_cache_key, _window), check_results in zip(chunked_windows, pipeline.execute()):
+                check_results_cache[check_cache_key] = check_results or []
+
+        for checker in checkers:
+            checker.check_results_cache = check_results_cache
+        return check_results_cache
+
+    def _check_anomaly_by_level(self, level):
+        """
+        检测某个级别的异常点是否满足触发条件
+        :param str level: 告警级别
+        :return: 二元组：是否被触发，异常次数
+        """
+        trigger_config = self._get_trigger_config(level)
+        if trigger_config is None:
+            return False, []
+
+        check_cache_key, min_score, max_score = self._get_check_window(level, trigger_config)
+        check_results = self._get_check_results(check_cache_key, min_score, max_score)
         # 统计包含异常标记的key的数量，并与trigger_count进行比较
         anomaly_timestamps = []
         for label, score in check_results:
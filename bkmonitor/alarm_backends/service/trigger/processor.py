@@ -14,6 +14,7 @@ import logging
 import time
 
 import six.moves.cPickle
+from django.conf import settings
 
 from alarm_backends.core.alert.adapter import MonitorEventAdapter
 from alarm_backends.core.cache.key import (
@@ -23,6 +24,7 @@ from alarm_backends.core.cache.key import (
 )
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.service.trigger.checker import AnomalyChecker
+from bkmonitor.utils.common_utils import chunks
 from core.errors.alarm_backends import StrategyNotFound
 from core.prometheus import metrics
 
@@ -143,22 +145,60 @@ class TriggerProcessor(object):
         in_alarm_time, message = self.strategy.in_alarm_time()
         if not in_alarm_time:
             logger.info("[trigger] strategy(%s) not in alarm time: %s, skipped", self.strategy_id, message)
+        elif settings.TRIGGER_BATCH_MODE_ENABLED:
+            for points in chunks(self.anomaly_points, settings.TRIGGER_BATCH_SIZE):
+                self.process_points(points)
         else:
             for point in self.anomaly_points:
                 try:
                     self.process_point(point)
                 except Exception as e:
-                    error_message = "[process error] strategy({}), item({}) reason: {} \norigin data: {}".format(
-                        self.strategy_id, self.item_id, e, point
-                    )
-                    logger.exception(error_message)
+                    self.log_process_error(point, e)
 
         self.push()
 
-    def process_point(self, point):
+    def log_process_error(self, point, error):
+        error_message = "[process error] strategy({}), item({}) reason: {} \norigin data: {}".format(
+            self.strategy_id, self.item_id, error, point
+        )
+        logger.exception(error_message)
+
+    def get_checker(self, point):
         point = json.loads(point)
         strategy = self.get_strategy_snapshot(point["strategy_snapshot_key"])
-        checker = AnomalyChecker(point, strategy, self.item_id)
+        return AnomalyChecker(point, strategy, self.item_id)
+
+    def process_points(self, points):
+        """
+        批量处理异常点：一次性预拉取所有异常点需要的检测结果，再逐个在内存中判断是否触发
+        """
+        checkers = []
+        for point in points:
+            try:
+                checkers.append((point, self.get_checker(point)))
+            except Exception as e:
+                self.log_process_error(point, e)
+
+        try:
+            AnomalyChecker.prefetch_check_results([checker for _, checker in checkers])
+        except Exception as e:
+            # 预拉取失败时，检测器会退化为逐个查询
+            logger.exception(
+                "[trigger] strategy({}), item({}) prefetch check results error: {}".format(
+                    self.strategy_id, self.item_id, e
+                )
+            )
+
+        for point, checker in checkers:
+            try:
+                self.check(checker)
+            except Exception as e:
+                self.log_process_error(point, e)
+
+    def process_point(self, point):
+        self.check(self.get_checker(point))
+
+    def check(self, checker):
         anomaly_records, event_record = checker.check()
 
         # 暂存结果，最后批量保存
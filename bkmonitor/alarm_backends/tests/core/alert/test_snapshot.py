@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+from alarm_backends.core.alert import Alert
+from alarm_backends.core.alert.alert import AlertKey
+from alarm_backends.core.alert.snapshot import (
+    DELETED_FIELD,
+    SNAPSHOT_PREFIX,
+    get_snapshot_keys,
+    mget_snapshots,
+    save_snapshots,
+)
+
+
+def make_alert(alert_id, strategy_id):
+    return Alert(
+        {
+            "id": alert_id,
+            "dedupe_md5": "68e9f0598d72a4b6de2675d491e5b922",
+            "end_time": None,
+            "create_time": 1617504052,
+            "begin_time": 1617504052,
+            "first_anomaly_time": 1617504052,
+            "latest_time": 1617504052,
+            "status": "ABNORMAL",
+            "severity": 1,
+            "event": {"id": "event-1", "tags": [{"key": "device_name", "value": "eth0"}]},
+            "extra_info": {"strategy": {"id": strategy_id, "name": "测试策略"}},
+            "strategy_id": strategy_id,
+        }
+    )
+
+
+class TestAlertSnapshot(object):
+    def test_save_and_mget(self, settings, redis_cluster_clients):
+        settings.ALERT_SNAPSHOT_COMPACT_ENCODING_ENABLED = True
+        alerts = [make_alert("1001", 1), make_alert("1002", 2)]
+        assert save_snapshots(alerts) == 2
+
+        # 快照按策略路由写入不同节点
+        snapshot_key, _ = get_snapshot_keys(1, "1001")
+        assert redis_cluster_clients[1].get(snapshot_key).startswith(SNAPSHOT_PREFIX)
+
+        snapshots = mget_snapshots([alert.key for alert in alerts] + [AlertKey(alert_id="1003", strategy_id=3)])
+        assert [snapshot[0] for snapshot in snapshots[:2]] == [alert.to_dict() for alert in alerts]
+        assert snapshots[2] is None
+
+    def test_save_delta(self, settings, redis_cluster_clients):
+        settings.ALERT_SNAPSHOT_COMPACT_ENCODING_ENABLED = True
+        save_snapshots([make_alert("1001", 1)])
+
+        alert = Alert.get_from_snapshot(AlertKey(alert_id="1001", strategy_id=1))
+        alert.data["latest_time"] += 600
+        alert.data.pop("end_time")
+        save_snapshots([alert])
+
+        # 无需刷新 DB 时只写入变化的字段
+        _, delta_key = get_snapshot_keys(1, "1001")
+        delta = redis_cluster_clients[1].hgetall(delta_key)
+        assert set(delta) == {"latest_time", "duration", "end_time"}
+        assert delta["end_time"] == DELETED_FIELD
+        assert Alert.get_from_snapshot(alert.key).to_dict() == alert.to_dict()
+
+        # 需要刷新 DB 时全量写入并清理增量
+        alert._refresh_db = True
+        save_snapshots([alert])
+        assert not redis_cluster_clients[1].exists(delta_key)
+        assert Alert.get_from_snapshot(alert.key).to_dict() == alert.to_dict()
+
+    def test_legacy_json(self, settings, redis_cluster_clients):
+        settings.ALERT_SNAPSHOT_COMPACT_ENCODING_ENABLED = False
+        alert = make_alert("1001", 1)
+        save_snapshots([alert])
+
+        snapshot_key, _ = get_snapshot_keys(1, "1001")
+        assert json.loads(redis_cluster_clients[1].get(snapshot_key)) == alert.to_dict()
+        snapshot_alert = Alert.get_from_snapshot(alert.key)
+        assert snapshot_alert.to_dict() == alert.to_dict()
+        assert snapshot_alert.snapshot_fields is None
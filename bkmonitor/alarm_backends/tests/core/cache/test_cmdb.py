@@ -24,6 +24,7 @@ from alarm_backends.core.cache.cmdb import (
     ServiceInstanceManager,
     TopoManager,
 )
+from alarm_backends.core.cache.cmdb.codec import CompactCodec, PickleCodec
 from alarm_backends.tests.utils.cmdb_data import (
     ALL_HOSTS,
     ALL_MODULES,
@@ -166,6 +167,26 @@ class TestHostManager(TestCMDBBaseTestCase):
         new_host_obj = HostManager.deserialize(obj_bin)
         self.assertEqual(host_obj, new_host_obj)
 
+    def test_serialize_codec(self):
+        host_obj = Host(bk_host_innerip="10.0.0.1", bk_cloud_id=0, bk_host_id=1, bk_biz_id=2, bk_module_ids=[5])
+        host_obj.topo_link = {"module|5": [TopoNode("module", 5), TopoNode("set", 3), TopoNode("biz", 2)]}
+
+        with self.settings(CMDB_CACHE_COMPACT_CODEC_ENABLED=True):
+            compact_value = HostManager.serialize(host_obj)
+        self.assertTrue(CompactCodec.is_compact(compact_value))
+        # 兼容旧版 pickle 格式
+        pickle_value = PickleCodec.encode(host_obj)
+        self.assertLess(len(compact_value), len(pickle_value))
+
+        for value in [compact_value, pickle_value]:
+            new_host_obj = HostManager.deserialize(value)
+            self.assertEqual(new_host_obj.get_attrs(), host_obj.get_attrs())
+            self.assertEqual(new_host_obj.topo_link, host_obj.topo_link)
+            self.assertEqual(new_host_obj.topo_link["module|5"][1].bk_obj_id, "set")
+
+        with self.settings(CMDB_CACHE_COMPACT_CODEC_ENABLED=False):
+            self.assertFalse(CompactCodec.is_compact(HostManager.serialize(host_obj)))
+
     def test_key_convert(self):
         self.assertEqual("10.0.0.1|0", HostManager.key_to_internal_value(ip="10.0.0.1", bk_cloud_id=0))
         self.assertEqual("10.0.0.1|0", HostManager.key_to_representation("10.0.0.1|0"))
@@ -431,6 +452,72 @@ class TestModuleManager(TestCMDBBaseTestCase):
         self.assertEqual(len(ModuleManager.cache.hkeys(ModuleManager.CACHE_KEY)), 0)
         self.assertEqual(len(ModuleManager.cache.hkeys(ModuleManager.get_biz_cache_key())), 0)
 
+    def test_local_cache(self):
+        ModuleManager.refresh()
+        local_cache = ModuleManager.get_local_cache()
+        self.assertEqual(len(local_cache), 0)
+
+        with mock.patch.object(ModuleManager.cache, "hmget", wraps=ModuleManager.cache.hmget) as hmget:
+            self.assertEqual(ModuleManager.get(1).bk_module_name, "m1")
+            hmget.assert_called_once_with(ModuleManager.CACHE_KEY, ["1"])
+
+            # 只获取未命中进程内缓存的部分
+            hmget.reset_mock()
+            modules = ModuleManager.multi_get(["1", "2", "100"])
+            self.assertEqual([module and module.bk_module_id for module in modules], [1, 2, None])
+            self.assertEqual(hmget.call_count, 1)
+            self.assertSetEqual(set(hmget.call_args[0][1]), {"2", "100"})
+
+            hmget.reset_mock()
+            self.assertIsNone(ModuleManager.get(100))
+            self.assertEqual(len(ModuleManager.multi_get(["1", "2"])), 2)
+            hmget.assert_not_called()
+
+        # 其他进程发布了新版本，版本检查后缓存失效
+        ModuleManager.cache.set(ModuleManager.get_version_cache_key(), "new_version")
+        local_cache._version_checked_at = 0
+        ModuleManager.multi_get(["1"])
+        self.assertEqual(len(local_cache), 1)
+
+        with self.settings(CMDB_LOCAL_CACHE_MAX_SIZE=2):
+            ModuleManager.multi_get(["1", "2", "3", "4"])
+            self.assertEqual(len(local_cache), 2)
+
+    @mock.patch("alarm_backends.core.cache.cmdb.module.api.cmdb.get_module")
+    def test_incremental_refresh(self, get_module):
+        modules = list(ALL_MODULES)
+        get_module.side_effect = lambda bk_biz_id: [module for module in modules if module.bk_biz_id == bk_biz_id]
+        ModuleManager.refresh()
+        biz_digests = ModuleManager.cache.hgetall(ModuleManager.get_biz_digest_cache_key())
+        self.assertSetEqual({int(biz_id) for biz_id in biz_digests}, set(BIZ_IDS))
+
+        # 写入一个标记值，用于判断对象是否被重新写入
+        stale_module = Module(bk_module_id=3, bk_module_name="stale", bk_biz_id=3)
+        ModuleManager.cache.hset(ModuleManager.CACHE_KEY, "3", ModuleManager.serialize(stale_module))
+
+        # 业务2: 模块1变更，模块2删除；业务3无变更
+        modules = [
+            Module(bk_module_id=1, bk_module_name="m1_new", bk_biz_id=2),
+            Module(bk_module_id=3, bk_module_name="m3", bk_biz_id=3),
+            Module(bk_module_id=4, bk_module_name="m4", bk_biz_id=3),
+        ]
+        ModuleManager.refresh()
+        caches["locmem"].clear()
+
+        self.assertEqual(ModuleManager.get(1).bk_module_name, "m1_new")
+        self.assertIsNone(ModuleManager.get(2))
+        # 未变更的业务不会重新写入
+        self.assertEqual(ModuleManager.get(3).bk_module_name, "stale")
+        self.assertEqual(ModuleManager.get(4).bk_module_name, "m4")
+        self.assertIsNone(ModuleManager.cache.hget(ModuleManager.get_digest_cache_key(), "2"))
+
+        # 关闭增量刷新后全量写入
+        with self.settings(CMDB_INCREMENTAL_REFRESH_ENABLED=False):
+            ModuleManager.refresh()
+        caches["locmem"].clear()
+        self.assertEqual(ModuleManager.get(3).bk_module_name, "m3")
+        self.assertFalse(ModuleManager.cache.exists(ModuleManager.get_digest_cache_key()))
+
 
 class TestServiceInstanceManager(TestCMDBBaseTestCase):
     def setUp(self):
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+from alarm_backends.core.cache.delay_queue import DelayQueueManager
+from alarm_backends.core.storage.redis import Cache
+
+
+class TestDelayQueueManager(object):
+    def setup_method(self):
+        self.client = Cache("service")
+        self.client.flushall()
+
+    def test_refresh_single_db(self, settings):
+        settings.DELAY_QUEUE_POP_BATCH_SIZE = 2
+        for i in range(3):
+            self.client.delay("rpush", "test_queue", "value{}".format(i), delay=0, task_id="task{}".format(i))
+        self.client.delay("lpush", "test_queue", "future", delay=60, task_id="future")
+
+        # 单次最多取出两个任务，仍有积压时返回 True
+        assert DelayQueueManager.refresh_single_db("service") is True
+        assert self.client.lrange("test_queue", 0, -1) == ["value0", "value1"]
+        assert DelayQueueManager.refresh_single_db("service") is False
+        assert self.client.lrange("test_queue", 0, -1) == ["value0", "value1", "value2"]
+
+        # 未到期的任务保留在延时队列中
+        assert self.client.zrange(DelayQueueManager.TASK_DELAY_QUEUE, 0, -1) == ["future"]
+        assert self.client.hkeys(DelayQueueManager.TASK_STORAGE_QUEUE) == ["future"]
+
+    def test_pop_due_tasks(self):
+        for i in range(5):
+            self.client.delay("rpush", "test_queue", "value{}".format(i), task_id="task{}".format(i))
+        # 任务数据缺失时跳过
+        self.client.hdel(DelayQueueManager.TASK_STORAGE_QUEUE, "task0")
+
+        now = time.time() + 1
+        remaining, tasks = DelayQueueManager.pop_due_tasks(self.client, now, 3)
+        assert remaining == 2
+        assert [task[0] for task in tasks] == ["task1", "task2"]
+
+        # 已取出的任务不会被其他进程再次取出
+        remaining, tasks = DelayQueueManager.pop_due_tasks(self.client, now, 3)
+        assert remaining == 0
+        assert [task[0] for task in tasks] == ["task3", "task4"]
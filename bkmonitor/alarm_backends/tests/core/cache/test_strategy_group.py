@@ -10,6 +10,9 @@ specific language governing permissions and limitations under the License.
 """
 
 
+import json
+
+import mock
 import pytest
 
 from alarm_backends.core.cache.strategy import StrategyCacheManager
@@ -79,3 +82,53 @@ class TestStrategyGroup(object):
 
     def test_cache(self):
         pass
+
+    def test_write_changed_strategies(self):
+        def get_cached_strategy(strategy_id):
+            return json.loads(
+                StrategyCacheManager.cache.get(StrategyCacheManager.CACHE_KEY_TEMPLATE.format(strategy_id=strategy_id))
+            )
+
+        StrategyCacheManager.cache.delete(StrategyCacheManager.DIGEST_CACHE_KEY)
+        strategies = [{"id": 1, "bk_biz_id": 2, "items": []}, {"id": 2, "bk_biz_id": 2, "items": []}]
+        StrategyCacheManager.write_changed_strategies(strategies)
+        assert get_cached_strategy(1) == strategies[0]
+        assert get_cached_strategy(2) == strategies[1]
+
+        # 只写入内容变更的策略及缓存已不存在的策略
+        strategies[0]["name"] = "changed"
+        StrategyCacheManager.cache.delete(StrategyCacheManager.CACHE_KEY_TEMPLATE.format(strategy_id=2))
+        strategies.append({"id": 3, "bk_biz_id": 2, "items": []})
+        StrategyCacheManager.cache.set(StrategyCacheManager.CACHE_KEY_TEMPLATE.format(strategy_id=3), "{}")
+        StrategyCacheManager.write_changed_strategies(strategies)
+        assert get_cached_strategy(1) == strategies[0]
+        assert get_cached_strategy(2) == strategies[1]
+        assert get_cached_strategy(3) == strategies[2]
+
+        pipeline = StrategyCacheManager.cache.pipeline()
+        with mock.patch.object(StrategyCacheManager.cache, "pipeline", return_value=pipeline):
+            with mock.patch.object(pipeline, "set", wraps=pipeline.set) as mock_set:
+                StrategyCacheManager.write_changed_strategies(strategies)
+        assert mock_set.call_count == 0
+
+        # 增量刷新时不清理其他策略的摘要
+        StrategyCacheManager.write_changed_strategies(strategies[:1])
+        assert StrategyCacheManager.cache.hexists(StrategyCacheManager.DIGEST_CACHE_KEY, "3")
+
+        # 全量刷新时清理已删除策略的摘要
+        StrategyCacheManager.write_changed_strategies(strategies[:2], is_full=True)
+        assert sorted(StrategyCacheManager.cache.hkeys(StrategyCacheManager.DIGEST_CACHE_KEY)) == ["1", "2"]
+
+        StrategyCacheManager.write_changed_strategies([], is_full=True)
+        assert not StrategyCacheManager.cache.exists(StrategyCacheManager.DIGEST_CACHE_KEY)
+
+    def test_split_biz_shards(self):
+        biz_ids = [2] * 5 + [3] * 3 + [4] * 2 + [5]
+        with mock.patch("alarm_backends.core.cache.strategy.StrategyModel.objects") as objects:
+            objects.filter.return_value.values_list.return_value = biz_ids
+            shards = StrategyCacheManager.split_biz_shards(2)
+        assert sorted(sorted(shard) for shard in shards) == [[2, 5], [3, 4]]
+
+        with mock.patch("alarm_backends.core.cache.strategy.StrategyModel.objects") as objects:
+            objects.filter.return_value.values_list.return_value = [2]
+            assert StrategyCacheManager.split_biz_shards(4) == [[2]]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import fakeredis
+import mock
+import pytest
+
+from alarm_backends.core.storage.redis_cluster import RedisProxy
+
+
+class FakeNode(object):
+    def __init__(self, node_id):
+        self.id = node_id
+
+
+@pytest.fixture
+def redis_cluster_clients():
+    """
+    模拟两个 redis 节点，按策略 id 的奇偶路由，返回 {节点id: 客户端}
+    """
+    nodes = {0: FakeNode(0), 1: FakeNode(1)}
+    clients = {node_id: fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True) for node_id in nodes}
+    with mock.patch(
+        "alarm_backends.core.storage.redis_cluster.get_node_by_strategy_id",
+        side_effect=lambda strategy_id: nodes[int(strategy_id) % 2],
+    ), mock.patch.object(RedisProxy, "get_client", side_effect=lambda node: clients[node.id]):
+        yield clients
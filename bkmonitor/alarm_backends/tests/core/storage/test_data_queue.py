@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import fakeredis
+import pytest
+
+from alarm_backends.core.storage.data_queue import (
+    count_element_records,
+    decode_element,
+    encode_records,
+    get_record_count,
+    incr_record_count,
+    is_batch_element,
+    pull_elements,
+)
+
+QUEUE_KEY = "access.data.1.1"
+COUNT_KEY = "access.data.count.1.1"
+
+
+def make_record(index):
+    return {
+        "record_id": "f7659f5811a0e187c71d119c7d625f23.{}".format(1569246480 + index * 60),
+        "value": 1.38 + index,
+        "values": {"timestamp": 1569246480 + index * 60, "load5": 1.38 + index},
+        "dimensions": {"ip": "127.0.0.1", "中文维度": "值"},
+        "dimension_fields": ["ip", "中文维度"],
+        "time": 1569246480 + index * 60,
+        "access_time": 1569246490.123,
+    }
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+class TestDataQueue(object):
+    def test_encode_decode(self, settings):
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = True
+        records = [make_record(i) for i in range(5)]
+        elements = encode_records(records, batch_size=2)
+        assert len(elements) == 3
+        assert all(is_batch_element(element) for element in elements)
+        assert [count_element_records(element) for element in elements] == [2, 2, 1]
+
+        decoded = []
+        for element in elements:
+            decoded.extend(decode_element(element))
+        assert decoded == records
+
+    def test_legacy_json(self, settings):
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = False
+        records = [make_record(i) for i in range(2)]
+        elements = encode_records(records)
+        assert elements == [json.dumps(record) for record in records]
+        assert count_element_records(elements[0]) == 1
+        assert decode_element(elements[0]) == [records[0]]
+
+    def test_invalid_element(self, settings):
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = True
+        element = encode_records([make_record(0)])[0]
+        with pytest.raises(ValueError):
+            decode_element(element[:-3])
+        with pytest.raises(ValueError):
+            decode_element("not json")
+
+    def test_pull_mixed_format(self, client, settings):
+        # 滚动升级期间，队列中同时存在旧格式和批量格式
+        records = [make_record(i) for i in range(10)]
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = False
+        client.lpush(QUEUE_KEY, *encode_records(records[:3]))
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = True
+        client.lpush(QUEUE_KEY, *encode_records(records[3:], batch_size=3))
+
+        elements, record_count = pull_elements(client, QUEUE_KEY, 100)
+        assert record_count == 10
+        assert client.llen(QUEUE_KEY) == 0
+
+        pulled = []
+        for element in elements:
+            pulled.extend(decode_element(element))
+        assert pulled == records
+
+    def test_pull_with_limit(self, client, settings):
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = True
+        records = [make_record(i) for i in range(10)]
+        client.lpush(QUEUE_KEY, *encode_records(records, batch_size=4))
+
+        elements, record_count = pull_elements(client, QUEUE_KEY, 5)
+        assert record_count == 4
+        assert decode_element(elements[0]) == records[:4]
+        assert client.llen(QUEUE_KEY) == 2
+
+        # 至少拉取一个元素，避免大批量元素阻塞队列
+        elements, record_count = pull_elements(client, QUEUE_KEY, 1)
+        assert record_count == 4
+        assert decode_element(elements[0]) == records[4:8]
+        assert client.llen(QUEUE_KEY) == 1
+
+    def test_record_count(self, client, settings):
+        settings.DATA_QUEUE_BATCH_ENCODING_ENABLED = True
+
+        def push(records):
+            pipeline = client.pipeline(transaction=False)
+            pipeline.lpush(QUEUE_KEY, *encode_records(records, batch_size=1000))
+            incr_record_count(pipeline, COUNT_KEY, len(records), 60)
+            pipeline.execute()
+
+        # 多次推送的小批量元素按实际记录数计算，而不是元素数乘以本次推送的记录数
+        for index in range(3):
+            push([make_record(index)])
+        push([make_record(index) for index in range(3, 10)])
+        assert client.llen(QUEUE_KEY) == 4
+        assert get_record_count(client, QUEUE_KEY, COUNT_KEY) == 10
+        assert client.ttl(COUNT_KEY) > 0
+
+        # 出队后扣减计数
+        elements, record_count = pull_elements(client, QUEUE_KEY, 2, count_key=COUNT_KEY)
+        assert record_count == 2
+        assert get_record_count(client, QUEUE_KEY, COUNT_KEY) == 8
+
+        # 队列清空后删除计数
+        pull_elements(client, QUEUE_KEY, 100, count_key=COUNT_KEY)
+        assert not client.exists(COUNT_KEY)
+
+        # 滚动升级期间旧版写入的元素没有计数，按元素数计算
+        client.lpush(QUEUE_KEY, *encode_records([make_record(index) for index in range(3)], batch_size=1))
+        assert get_record_count(client, QUEUE_KEY, COUNT_KEY) == 3
+        pull_elements(client, QUEUE_KEY, 100, count_key=COUNT_KEY)
+        assert not client.exists(COUNT_KEY)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import mock
+import pytest
+from celery.signals import task_postrun, worker_process_shutdown
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch.serializer import JSONSerializer
+
+from alarm_backends.core.storage.es_bulk_writer import ESBulkWriter, bulk_save
+from bkmonitor.documents import AlertLog
+
+
+class FakeES(object):
+    """
+    本地 ES 替身，按 _id 保存文档，可指定部分文档写入失败的状态码
+    """
+
+    def __init__(self):
+        self.transport = mock.MagicMock(serializer=JSONSerializer())
+        self.documents = {}
+        self.bulk_calls = 0
+        # {_id: [状态码, ...]}，按顺序依次返回
+        self.failures = {}
+
+    def bulk(self, body, **kwargs):
+        self.bulk_calls += 1
+        lines = [json.loads(line) for line in body.strip().split("\n")]
+        items = []
+        for meta, source in zip(lines[::2], lines[1::2]):
+            op_type, meta = list(meta.items())[0]
+            doc_id = meta["_id"]
+            failures = self.failures.get(doc_id)
+            if failures:
+                status = failures.pop(0)
+            elif op_type == "create" and doc_id in self.documents:
+                status = 409
+            else:
+                self.documents[doc_id] = source
+                status = 201
+            result = {"_index": meta["_index"], "_id": doc_id, "status": status}
+            if status >= 300:
+                result["error"] = {"type": "error", "reason": str(status)}
+            items.append({op_type: result})
+        return {"errors": any(list(item.values())[0]["status"] >= 300 for item in items), "items": items}
+
+
+def make_logs(count):
+    return [
+        AlertLog(
+            id="log{}".format(i),
+            alert_id=[str(i)],
+            op_type=AlertLog.OpType.ACTION,
+            event_id=str(i),
+            create_time=1617504052,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def es():
+    client = FakeES()
+    with mock.patch.object(AlertLog, "_get_connection", return_value=client):
+        yield client
+
+
+class TestESBulkWriter(object):
+    def test_collect_by_size(self, es):
+        writer = ESBulkWriter(batch_size=3, flush_interval=10, max_retries=0)
+        for log in make_logs(5):
+            writer.queue.put((AlertLog, log.prepare_action(), 0))
+
+        # 达到单批最大文档数时立即返回
+        items, flush_event = writer.collect()
+        assert len(items) == 3
+        assert flush_event is None
+        writer.write(items)
+        writer.flush()
+        assert len(es.documents) == 5
+        assert es.bulk_calls == 2
+
+    def test_retry(self, es):
+        writer = ESBulkWriter(batch_size=10, flush_interval=0.01, max_retries=2, retry_backoff=0.01)
+        logs = make_logs(3)
+        es.failures = {logs[0].id: [429, 503], logs[1].id: [400]}
+        writer.write([(AlertLog, log.prepare_action(), 0) for log in logs])
+
+        # 400 无需重试，429 进入重试队列
+        assert set(es.documents) == {logs[2].id}
+        assert len(writer.retry_items) == 1
+        assert writer.retry_items[0][-1] == 1
+
+        for _ in range(2):
+            writer.retry_items = [(0,) + item[1:] for item in writer.retry_items]
+            writer.write(writer.collect()[0])
+        assert set(es.documents) == {logs[0].id, logs[2].id}
+        assert not writer.retry_items
+
+    def test_create_conflict(self, es):
+        writer = ESBulkWriter(max_retries=0)
+        logs = make_logs(2)
+        writer.write([(AlertLog, log.prepare_action(), 0) for log in logs])
+        writer.write([(AlertLog, log.prepare_action(), 0) for log in logs])
+        assert len(es.documents) == 2
+        assert not writer.retry_items
+
+    def test_bulk_save(self, es, settings):
+        settings.ES_BULK_WRITER_ENABLED = True
+        writer = ESBulkWriter(batch_size=100, flush_interval=10)
+        with mock.patch("alarm_backends.core.storage.es_bulk_writer.bulk_writer", writer), mock.patch.object(
+            writer, "ensure_started"
+        ):
+            # 多次单条写入在进程内汇总为一次批量请求
+            for log in make_logs(10):
+                bulk_save([log])
+            assert es.bulk_calls == 0
+            writer.flush()
+        assert len(es.documents) == 10
+        assert es.bulk_calls == 1
+
+    def test_flush_with_thread(self, es):
+        writer = ESBulkWriter(batch_size=100, flush_interval=10)
+        writer.add(make_logs(10))
+        assert writer.thread.is_alive()
+
+        # 后台线程等待凑批时，刷新请求使其立即写入
+        writer.flush()
+        assert len(es.documents) == 10
+        assert writer.queue.empty()
+
+    def test_flush_on_worker_process_shutdown(self, es):
+        writer = ESBulkWriter(batch_size=100, flush_interval=10)
+        with mock.patch("alarm_backends.core.storage.es_bulk_writer.bulk_writer", writer), mock.patch.object(
+            writer, "ensure_started"
+        ):
+            writer.add(make_logs(5))
+            # 任务结束时不刷新，跨任务汇总写入
+            task_postrun.send(sender=None)
+            assert len(es.documents) == 0
+            # prefork 子进程不会执行 atexit，子进程退出时刷新
+            worker_process_shutdown.send(sender=None)
+        assert len(es.documents) == 5
+
+    def test_bulk_save_sync_error(self, settings):
+        settings.ES_BULK_WRITER_ENABLED = False
+        error = BulkIndexError("1 document(s) failed to index.", [{"create": {"status": 400}}])
+        with mock.patch.object(AlertLog, "bulk_create", side_effect=error) as bulk_create:
+            # 同步写入失败时只记录日志，与异步写入保持一致
+            bulk_save(make_logs(1))
+        assert bulk_create.called
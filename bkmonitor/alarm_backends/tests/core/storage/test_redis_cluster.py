@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import mock
+
+from alarm_backends.core.cache.key import ALERT_DEDUPE_CONTENT_KEY
+from alarm_backends.core.storage.redis_cluster import RedisProxy
+
+
+def test_mget_by_node(redis_cluster_clients):
+    clients = redis_cluster_clients
+    proxy = RedisProxy("service")
+
+    keys = []
+    for strategy_id in [1, 2, 3, 4]:
+        for dedupe_md5 in ["a", "b", "c"]:
+            keys.append(ALERT_DEDUPE_CONTENT_KEY.get_key(strategy_id=strategy_id, dedupe_md5=dedupe_md5))
+
+    # 按策略路由写入不同节点，未写入的 key 模拟缓存缺失
+    for index, key in enumerate(keys):
+        if index % 3:
+            clients[int(key.strategy_id) % 2].set(key, str(index))
+
+    with mock.patch.object(clients[0], "mget", wraps=clients[0].mget) as mget:
+        result = proxy.mget_by_node(keys, chunk_size=4)
+        # 节点 0 有 6 个 key，按 4 个一批分两次获取
+        assert mget.call_count == 2
+
+    assert result == [str(index) if index % 3 else None for index in range(len(keys))]
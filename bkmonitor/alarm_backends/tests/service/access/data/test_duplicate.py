@@ -15,7 +15,11 @@ import copy
 import fakeredis
 import pytest
 
-from alarm_backends.service.access.data.duplicate import Duplicate
+from alarm_backends.service.access.data.duplicate import (
+    Duplicate,
+    FingerprintDuplicate,
+    get_duplicate,
+)
 
 from .config import STANDARD_DATA
 
@@ -65,3 +69,27 @@ class TestDuplicate(object):
         assert dup.is_duplicate(record_1) is True
         assert dup.is_duplicate(record_2) is True
         assert dup.is_duplicate(record) is False
+
+    def test_fingerprint_duplicate(self, settings):
+        settings.ACCESS_DUPLICATE_BACKEND = "fingerprint"
+        strategy_group_key = "123456789"
+        dup = get_duplicate(strategy_group_key)
+        assert isinstance(dup, FingerprintDuplicate)
+
+        record = MockRecord(STANDARD_DATA)
+        raw_data_1 = copy.deepcopy(STANDARD_DATA)
+        record_1 = MockRecord(raw_data_1)
+        record_1.time += 60
+        assert dup.is_duplicate(record_1) is False
+        dup.add_record(record_1)
+        assert dup.is_duplicate(record_1) is True
+        dup.refresh_cache()
+
+        dup = get_duplicate(strategy_group_key)
+        assert dup.is_duplicate(record_1) is True
+        assert dup.is_duplicate(record) is False
+
+    def test_fingerprint_width(self):
+        assert FingerprintDuplicate.get_width(capacity=1000000, error_rate=1e-9) == 13
+        assert FingerprintDuplicate.get_width(capacity=100, error_rate=0.01) == FingerprintDuplicate.MIN_WIDTH
+        assert FingerprintDuplicate.get_width(capacity=10**9, error_rate=1e-12) == FingerprintDuplicate.MAX_WIDTH
@@ -18,6 +18,7 @@ import mock
 import pytest
 
 from alarm_backends.core.cache import key
+from alarm_backends.core.storage.data_queue import decode_element
 from alarm_backends.service.access.data import AccessDataProcess
 from bkmonitor.models import CacheNode
 from bkmonitor.utils.common_utils import count_md5
@@ -111,7 +112,7 @@ class TestAccessDataProcess(object):
         client = key.DATA_LIST_KEY.client
         output_key = key.DATA_LIST_KEY.get_key(strategy_id=strategy_id, item_id=item_id)
         expected_data = copy.deepcopy(STANDARD_DATA)
-        assert client.rpop(output_key) == json.dumps(expected_data)
+        assert decode_element(client.rpop(output_key)) == [expected_data]
 
         client = key.NOISE_REDUCE_TOTAL_KEY.client
         noise_dimension_hash = count_md5(["bk_target_ip", "bk_target_cloud_id"])
@@ -152,3 +153,44 @@ class TestAccessDataProcess(object):
             strategy_id=strategy_id, noise_dimension_hash=noise_dimension_hash
         )
         assert client.zrangebyscore(record_key, start_timestamp, int(time.time() + 1)) == []
+
+    nodata_strategy_dict = copy.deepcopy(STRATEGY_CONFIG_V3)
+    nodata_strategy_dict["items"][0]["no_data_config"]["is_enabled"] = True
+
+    @pytest.mark.parametrize("bucket_enabled", [True, False])
+    @mock.patch(
+        "alarm_backends.core.cache.strategy.StrategyCacheManager.get_strategy_by_id", return_value=nodata_strategy_dict
+    )
+    @mock.patch(
+        "alarm_backends.core.cache.strategy.StrategyCacheManager.get_strategy_group_detail", return_value={"1": [1]}
+    )
+    def test_push_nodata(self, mock_strategy, mock_strategy_group, bucket_enabled, settings):
+        settings.NO_DATA_BUCKET_QUEUE_ENABLED = bucket_enabled
+        strategy_id = 1
+        item_id = 1
+        acc_data = AccessDataProcess("123456789")
+        record = MockRecord(STANDARD_DATA)
+        record.items = [acc_data.items[0]]
+        record.is_retains = {item_id: True}
+        acc_data.record_list = [record]
+        acc_data.push()
+
+        bucket_key = key.NO_DATA_BUCKET_KEY.get_key(strategy_id=strategy_id, item_id=item_id)
+        list_key = key.NO_DATA_LIST_KEY.get_key(strategy_id=strategy_id, item_id=item_id)
+        bucket_client = key.NO_DATA_BUCKET_KEY.client
+        list_client = key.NO_DATA_LIST_KEY.client
+        try:
+            if bucket_enabled:
+                # 有序集合以数据时间作为分值
+                records = bucket_client.zrange(bucket_key, 0, -1, withscores=True)
+                assert [(json.loads(member), score) for member, score in records] == [
+                    (STANDARD_DATA, STANDARD_DATA["time"])
+                ]
+                assert list_client.llen(list_key) == 0
+            else:
+                # 未开启时写入旧版列表队列，未升级的 nodata 仍可读取
+                assert [json.loads(member) for member in list_client.lrange(list_key, 0, -1)] == [STANDARD_DATA]
+                assert bucket_client.zcard(bucket_key) == 0
+        finally:
+            bucket_client.delete(bucket_key)
+            list_client.delete(list_key)
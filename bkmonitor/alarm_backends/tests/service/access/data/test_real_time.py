@@ -39,6 +39,8 @@ class FakeKafkaConsumer(mock.MagicMock):
         self.topics = set()
         self.subscribe_call_count = 0
         self.subscription_call_count = 0
+        self.assigned_partitions = set()
+        self.paused_partitions = set()
 
     def subscription(self):
         self.subscription_call_count += 1
@@ -48,6 +50,18 @@ class FakeKafkaConsumer(mock.MagicMock):
         self.subscribe_call_count += 1
         self.topics = set(topics)
 
+    def assignment(self):
+        return set(self.assigned_partitions)
+
+    def paused(self):
+        return set(self.paused_partitions)
+
+    def pause(self, *partitions):
+        self.paused_partitions.update(partitions)
+
+    def resume(self, *partitions):
+        self.paused_partitions.difference_update(partitions)
+
 
 class TestAccessDataProcess(object):
     def test_leader(self, mock_time):
@@ -195,3 +209,62 @@ class TestAccessDataProcess(object):
             )
         )
         p.run_handler(once=True)
+
+    def test_poller_backpressure(self, mock_kafka_consumer, settings):
+        settings.REAL_TIME_ACCESS_MAX_IN_FLIGHT_RECORDS = 2
+        service = mock.MagicMock()
+        p = AccessRealTimeDataProcess(service)
+        p.ip = "127.0.0.1"
+
+        p.cache.hset(p.topic_cache_key, p.ip, json.dumps({"kafka1.service.consul:9092|topic1": ""}))
+        p.run_consumer_manager(once=True)
+        consumer = p.consumers["kafka1.service.consul:9092"]
+        consumer.assigned_partitions = {"topic1-0", "topic1-1"}
+
+        def poll(*args, **kwargs):
+            if consumer.paused_partitions:
+                return {}
+            return {"record1": [b"{}"], "record2": [b"{}"]}
+
+        consumer.poll = mock.MagicMock(side_effect=poll)
+
+        p.run_poller(once=True)
+        assert p.queue.qsize() == 2
+        assert p.in_flight_records == 2
+        assert not consumer.paused_partitions
+
+        # 未处理的记录数达到上限，暂停已分配分区的拉取，但仍然调用 poll 保持消费组成员身份
+        p.run_poller(once=True)
+        assert p.queue.qsize() == 2
+        assert consumer.paused_partitions == {"topic1-0", "topic1-1"}
+        assert consumer.poll.call_count == 2
+
+        # 处理完成后恢复拉取
+        p.change_in_flight_records(-2)
+        p.run_poller(once=True)
+        assert not consumer.paused_partitions
+        assert p.queue.qsize() == 4
+
+    def test_handler_batch(self, settings):
+        settings.REAL_TIME_ACCESS_BATCH_SIZE = 3
+        ConsumerRecord = namedtuple("ConsumerRecord", ["topic", "value"])
+        service = mock.MagicMock()
+        p = AccessRealTimeDataProcess(service)
+        for index in range(3):
+            p.queue.put(("kafka1.service.consul:9092", [ConsumerRecord("topic1", b"{}")] * 2))
+        p.change_in_flight_records(6)
+
+        with mock.patch.object(p, "handle_batch") as handle_batch:
+            p.run_handler(once=True)
+        # 合并多次拉取的数据，记录数达到批量大小后停止合并
+        batch = handle_batch.call_args[0][0]
+        assert len(batch["kafka1.service.consul:9092"]) == 4
+        assert p.queue.qsize() == 1
+        assert p.in_flight_records == 2
+
+    def test_decode_values(self):
+        values = [b'{"time": 1}\x00', '{"time": 2}\n', b'{"time": 3}']
+        assert AccessRealTimeDataProcess.decode_values("topic1", values) == [{"time": 1}, {"time": 2}, {"time": 3}]
+
+        values.insert(1, b"{invalid")
+        assert AccessRealTimeDataProcess.decode_values("topic1", values) == [{"time": 1}, {"time": 2}, {"time": 3}]
@@ -15,6 +15,8 @@ import copy
 from alarm_backends.core.cache.strategy import StrategyCacheManager
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.service.access.data.records import DataRecord
+from bkmonitor.utils.common_utils import count_md5
+from bkmonitor.utils.fingerprint import FingerprintMode, dimension_fingerprint
 
 from .config import FORMAT_RAW_DATA, STANDARD_DATA, STRATEGY_CONFIG_V3
 
@@ -32,3 +34,23 @@ class TestRecords(object):
         record.data.pop("access_time", None)
         record.data.pop("dimension_fields", None)
         assert record.data == STANDARD_DATA
+
+    def test_dimension_fingerprint(self, settings):
+        settings.DIMENSION_FINGERPRINT_MODE = FingerprintMode.MD5
+        cases = [
+            {},
+            STANDARD_DATA["dimensions"],
+            {"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0, "is_enabled": True, "value": None, "rate": 1.5},
+            {"bk_target_ip": "127.0.0.1", "tags": ["a", "b"]},
+            {"中文维度": "中文值"},
+        ]
+        for dimensions in cases:
+            # 重复计算时命中缓存，结果保持一致
+            assert dimension_fingerprint(dimensions) == count_md5(dimensions)
+            assert dimension_fingerprint(dimensions) == count_md5(dimensions)
+
+        settings.DIMENSION_FINGERPRINT_MODE = FingerprintMode.XXHASH
+        fingerprint = dimension_fingerprint({"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0})
+        assert len(fingerprint) == 32
+        assert fingerprint == dimension_fingerprint({"bk_target_cloud_id": "0", "bk_target_ip": "127.0.0.1"})
+        assert fingerprint != dimension_fingerprint({"bk_target_ip": "127.0.0.2", "bk_target_cloud_id": 0})
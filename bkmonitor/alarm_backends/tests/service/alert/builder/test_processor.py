@@ -18,6 +18,7 @@ from elasticsearch.helpers import BulkIndexError
 
 from alarm_backends.core.alert import Alert, Event
 from alarm_backends.core.alert.alert import AlertUIDManager
+from alarm_backends.core.alert.snapshot import decode_snapshot
 from alarm_backends.core.cache.key import ALERT_DEDUPE_CONTENT_KEY, ALERT_SNAPSHOT_KEY
 from alarm_backends.service.alert.builder.processor import AlertBuilder
 from api.cmdb.define import Host
@@ -694,7 +695,7 @@ class TestProcessor(TestCase):
         )
         self.assertIsNotNone(result)
 
-        new_alert = json.loads(result)
+        new_alert, _ = decode_snapshot(result)
         self.assertEqual(alert.id, new_alert["id"])
 
     def test_update_alert_cache_with_snapshot(self):
@@ -720,7 +721,7 @@ class TestProcessor(TestCase):
         )
         self.assertIsNotNone(result)
 
-        new_alert = json.loads(result)
+        new_alert, _ = decode_snapshot(result)
         self.assertEqual(alert.id, new_alert["id"])
 
     def test_empty_data(self):
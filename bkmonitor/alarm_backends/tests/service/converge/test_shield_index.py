@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from datetime import datetime, timedelta
+
+import mock
+import pytz
+
+from alarm_backends.service.converge.shield.shield_index import AlertShieldIndex
+from alarm_backends.service.converge.shield.shield_obj import AlertShieldObj
+
+
+def make_config(shield_id, category, dimension_config, scope_type="", begin_delta=-1):
+    now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+    return {
+        "id": shield_id,
+        "bk_biz_id": 2,
+        "category": category,
+        "scope_type": scope_type,
+        "dimension_config": dimension_config,
+        "cycle_config": {"type": 1, "begin_time": "", "end_time": "", "day_list": [], "week_list": []},
+        "begin_time": now + timedelta(hours=begin_delta),
+        "end_time": now + timedelta(hours=1),
+        "notice_config": {},
+        "description": "",
+    }
+
+
+SHIELD_CONFIGS = [
+    make_config(1, "strategy", {"strategy_id": [1, 2], "level": [1, 2, 3], "dimension_conditions": []}),
+    make_config(
+        2,
+        "strategy",
+        {
+            "strategy_id": [1],
+            "level": [1],
+            "dimension_conditions": [{"key": "device_name", "method": "eq", "value": ["eth0"], "condition": "and"}],
+        },
+    ),
+    make_config(3, "scope", {"bk_target_ip": [{"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0}]}, "ip"),
+    make_config(4, "scope", {"bk_topo_node": [{"bk_obj_id": "set", "bk_inst_id": 5}]}, "node"),
+    make_config(
+        5,
+        "dimension",
+        {"dimension_conditions": [{"key": "device_name", "method": "neq", "value": ["lo"], "condition": "and"}]},
+    ),
+    make_config(6, "scope", {"ip": ["127.0.0.2"], "category": "all", "_ignored": 1}, "ip"),
+    # 未开始的屏蔽
+    make_config(7, "strategy", {"strategy_id": [1], "level": [1, 2, 3]}, begin_delta=1),
+    make_config(8, "scope", {"service_instance_id": [10, 11]}, "instance"),
+]
+
+DIMENSIONS = [
+    {"strategy_id": 1, "level": 1, "device_name": "eth0", "bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0},
+    {"strategy_id": 2, "level": 3, "device_name": "lo", "ip": "127.0.0.2", "bk_cloud_id": 0},
+    {"strategy_id": 3, "level": 2, "bk_topo_node": ["set|5", "module|6"], "service_instance_id": 11},
+    {"strategy_id": 4, "level": 2, "bk_obj_id": "set", "bk_inst_id": 5},
+    {"strategy_id": 5, "level": 1},
+]
+
+
+class TestAlertShieldIndex(object):
+    def test_match(self):
+        shield_index = AlertShieldIndex(SHIELD_CONFIGS)
+        assert shield_index.unindexed_positions == [4]
+
+        shield_objs = [AlertShieldObj(config) for config in SHIELD_CONFIGS]
+        for dimension in DIMENSIONS:
+            with mock.patch.object(AlertShieldObj, "get_dimension", return_value=dimension):
+                expected = [shield_obj.id for shield_obj in shield_objs if shield_obj.is_match(None)]
+                assert [shield_obj.id for shield_obj in shield_index.match(None)] == expected
+
+    def test_get_by_biz_id(self):
+        with mock.patch(
+            "alarm_backends.service.converge.shield.shield_index.ShieldCacheManager.get_raw_shields_by_biz_id",
+            return_value="",
+        ):
+            shield_index = AlertShieldIndex.get_by_biz_id(2)
+            assert shield_index.configs == []
+            # 缓存内容不变时复用索引
+            assert AlertShieldIndex.get_by_biz_id(2) is shield_index
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+import mock
+import pytest
+
+from alarm_backends.core.cache import key
+from alarm_backends.service.detect.backlog import (
+    get_backlogs,
+    get_drain_passes,
+    record_backlog,
+    report_backlogs,
+)
+from alarm_backends.service.detect.handler import DetectCeleryHandler
+from core.prometheus import metrics
+
+pytestmark = pytest.mark.django_db
+
+
+class TestBacklog(object):
+    def setup_method(self):
+        key.DETECT_BACKLOG_KEY.client.delete(key.DETECT_BACKLOG_KEY.get_key())
+
+    def test_record_backlog(self):
+        record_backlog("1", 1000)
+        record_backlog("2", 500)
+        assert get_backlogs() == {"1": 1000, "2": 500}
+
+        record_backlog("1", 0)
+        assert get_backlogs() == {"2": 500}
+
+        # 长时间未更新的记录失效
+        expired_value = "500|{}".format(int(time.time()) - 600)
+        key.DETECT_BACKLOG_KEY.client.hset(key.DETECT_BACKLOG_KEY.get_key(), "2", expired_value)
+        assert get_backlogs() == {}
+        assert not key.DETECT_BACKLOG_KEY.client.hexists(key.DETECT_BACKLOG_KEY.get_key(), "2")
+
+    def test_report_backlogs(self, settings):
+        settings.DETECT_BACKLOG_METRIC_TOP_N = 2
+
+        def reported():
+            samples = metrics.DETECT_QUEUE_BACKLOG.collect()[0].samples
+            return {sample.labels["strategy_id"]: sample.value for sample in samples}
+
+        report_backlogs({"1": 1000, "2": 500, "3": 100})
+        assert reported() == {metrics.TOTAL_TAG: 1600, "1": 1000, "2": 500}
+
+        # 不在排名中的策略不再保留上次的积压量
+        report_backlogs({"2": 300, "3": 200})
+        assert reported() == {metrics.TOTAL_TAG: 500, "2": 300, "3": 200}
+
+    def test_get_drain_passes(self, settings):
+        settings.SQL_MAX_LIMIT = 1000
+        settings.DETECT_MAX_DRAIN_PASSES = 5
+        assert get_drain_passes(0) == 1
+        assert get_drain_passes(1) == 2
+        assert get_drain_passes(2500) == 4
+        assert get_drain_passes(100000) == 5
+
+    def test_dispatch(self, settings):
+        settings.SQL_MAX_LIMIT = 1000
+        settings.DETECT_COLD_STRATEGY_BATCH_SIZE = 2
+        record_backlog("1", 1000)
+        record_backlog("2", 3000)
+
+        with mock.patch("alarm_backends.service.detect.handler.run_detect") as run_detect, mock.patch(
+            "alarm_backends.service.detect.handler.run_detect_batch"
+        ) as run_detect_batch:
+            DetectCeleryHandler.dispatch(["1", "2", "3", "4", "5"])
+
+        # 积压多的策略优先投递，并增加处理轮数
+        assert run_detect.apply_async.call_args_list == [
+            mock.call(args=("2",), kwargs={"max_passes": 4}),
+            mock.call(args=("1",), kwargs={"max_passes": 2}),
+            mock.call(args=("5",)),
+        ]
+        # 无积压的策略合并投递
+        assert run_detect_batch.apply_async.call_args_list == [mock.call(args=(["3", "4"],))]
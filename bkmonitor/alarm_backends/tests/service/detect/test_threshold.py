@@ -259,3 +259,75 @@ class TestThreshold(object):
 
         anomaly_records = detect_engine.detect_records([datapoint], 1)
         assert anomaly_records[0].anomaly_message == "avg(测试指标) >= 1.0KiB, 当前值1.000977KiB"
+
+    def test_batch_detect_mask(self):
+        algorithms_config = [
+            [{"threshold": 6, "method": "gt"}, {"threshold": 99, "method": "lte"}, {"threshold": 50, "method": "neq"}],
+            [{"threshold": 6, "method": "eq"}],
+        ]
+        detect_engine = Threshold(config=algorithms_config)
+        data_points = [datapoint99, datapoint50, datapoint6, datapoint_example]
+        mask = detect_engine.batch_detect_mask(data_points)
+        # datapoint50 与阈值 50 相等，结果不确定，需要交给逐点检测
+        assert list(mask) == [True, True, True, False]
+        assert len(detect_engine.detect_records(data_points, 1)) == 2
+
+    def test_batch_detect_consistent_with_eval(self):
+        algorithms_config = [
+            [{"threshold": 1, "method": "gte"}, {"threshold": 1000, "method": "lt"}],
+            [{"threshold": 0, "method": "neq"}, {"threshold": -10, "method": "lte"}],
+        ]
+        detect_engine = Threshold(config=algorithms_config, unit="Ki")
+        item = Item(
+            1,
+            Strategy(1, "os"),
+            "bytes",
+            [mocked_data_source],
+            ["system.cpu_summary"],
+            item_config["query_configs"],
+            mock_unify_query,
+        )
+        values = [
+            None,
+            "abc",
+            0,
+            1023,
+            1024,
+            1024.0000001,
+            1025,
+            2**60,
+            -10240,
+            -10241,
+            float("nan"),
+            1023999,
+            1024000,
+        ]
+        data_points = [
+            DataPoint(
+                {
+                    "record_id": "{}.1569246480".format(index),
+                    "value": value,
+                    "values": {"timestamp": 1569246480, "load5": value},
+                    "dimensions": {"ip": "127.0.0.1"},
+                    "time": 1569246480,
+                },
+                item,
+            )
+            for index, value in enumerate(values)
+        ]
+
+        with mock.patch("django.conf.settings.DETECT_BATCH_MODE_ENABLED", False):
+            expected = [ap.data_point.record_id for ap in detect_engine.detect_records(data_points, 1)]
+
+        mask = detect_engine.batch_detect_mask(data_points)
+        assert all(mask[index] for index, data_point in enumerate(data_points) if data_point.record_id in expected)
+        assert not mask[values.index(1023)]
+
+        anomaly_records = detect_engine.detect_records(data_points, 1)
+        assert [ap.data_point.record_id for ap in anomaly_records] == expected
+
+    def test_batch_detect_unsupported_expr(self):
+        algorithms_config = [[{"threshold": 50.0, "method": "gte"}]]
+        detect_engine = Threshold(config=algorithms_config)
+        detect_engine.detectors[0].detectors[0].expr = "value and value >= 50"
+        assert detect_engine.batch_detect_mask([datapoint99, datapoint6]) is None
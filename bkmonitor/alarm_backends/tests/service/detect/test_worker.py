@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+import mock
+import pytest
+
+from alarm_backends.core.cache import key
+from alarm_backends.core.cache.strategy import StrategyCacheManager
+from alarm_backends.core.control.strategy import Strategy
+from alarm_backends.service.detect.process import DetectProcess
+from alarm_backends.service.detect.worker import DetectWorker, StrategyWarmCache
+
+pytestmark = pytest.mark.django_db
+
+
+class TestDetectWorker(object):
+    def setup_method(self):
+        key.DATA_SIGNAL_KEY.client.flushall()
+
+    def test_dispatch(self, settings):
+        settings.DETECT_WORKER_BATCH_SIZE = 100
+        workers = [DetectWorker("worker1"), DetectWorker("worker2")]
+        for worker in workers:
+            worker.heartbeat()
+        for worker in workers:
+            worker.last_heartbeat = 0
+            worker.heartbeat()
+            assert worker.workers == ["worker1", "worker2"]
+
+        strategy_ids = [str(strategy_id) for strategy_id in range(1, 21)]
+        key.DATA_SIGNAL_KEY.client.lpush(key.DATA_SIGNAL_KEY.get_key(), *(strategy_ids + strategy_ids))
+
+        # 第一个进程拉取全部信号，不属于自己的策略转发到另一个进程的专属队列
+        owned_strategy_ids = workers[0].dispatch(workers[0].pull_signals())
+        assert len(owned_strategy_ids) == len(set(owned_strategy_ids))
+        forwarded_strategy_ids = set(workers[1].pull_signals())
+        assert set(owned_strategy_ids) | forwarded_strategy_ids == set(strategy_ids)
+        assert not set(owned_strategy_ids) & forwarded_strategy_ids
+        assert workers[1].dispatch(list(forwarded_strategy_ids)) == list(forwarded_strategy_ids)
+
+    def test_drain_departed_worker_signals(self):
+        client = key.DATA_SIGNAL_KEY.client
+        workers = [DetectWorker("worker1"), DetectWorker("worker2")]
+        for worker in workers:
+            worker.heartbeat()
+        worker = workers[0]
+        worker.last_heartbeat = 0
+        worker.heartbeat()
+        assert worker.workers == ["worker1", "worker2"]
+
+        # 进程心跳超时后，其专属队列中的信号移回公共队列
+        client.lpush(workers[1].worker_signal_key, "1", "2")
+        client.hset(worker.heartbeat_key, "worker2", int(time.time()) - worker.HEARTBEAT_TIMEOUT - 1)
+        worker.last_heartbeat = 0
+        worker.heartbeat()
+        assert worker.workers == ["worker1"]
+        assert client.llen(workers[1].worker_signal_key) == 0
+        assert sorted(worker.pull_signals()) == ["1", "2"]
+
+        # 心跳超时时间内继续回收其他进程按旧哈希环转发的信号
+        client.lpush(workers[1].worker_signal_key, "3")
+        worker.last_heartbeat = 0
+        worker.heartbeat()
+        assert worker.pull_signals() == ["3"]
+
+    def test_strategy_warm_cache(self):
+        cache = StrategyWarmCache()
+        StrategyCacheManager.cache.hset(StrategyCacheManager.DIGEST_CACHE_KEY, "1", "digest1")
+
+        with mock.patch("alarm_backends.service.detect.worker.Strategy") as strategy_cls:
+            strategy = cache.get_strategies(["1"])["1"]
+            # 摘要未变化时复用进程内缓存
+            assert cache.get_strategies(["1"])["1"] is strategy
+            assert strategy_cls.call_count == 1
+
+            # 摘要变化后重新加载
+            StrategyCacheManager.cache.hset(StrategyCacheManager.DIGEST_CACHE_KEY, "1", "digest2")
+            cache.get_strategies(["1"])
+            assert strategy_cls.call_count == 2
+
+    def test_strategy_snapshot(self):
+        strategy = Strategy("1", default_config={"id": 1, "bk_biz_id": 2, "update_time": 1, "items": []})
+        gen_strategy_snapshot = mock.patch.object(
+            Strategy, "gen_strategy_snapshot", autospec=True, side_effect=Strategy.gen_strategy_snapshot
+        )
+        with gen_strategy_snapshot as gen, mock.patch.object(DetectProcess, "push_data"):
+            # 复用的策略对象只生成一次快照
+            DetectProcess("1", strategy=strategy).process()
+            DetectProcess("1", strategy=strategy).process()
+            assert gen.call_count == 1
+
+            # 快照标记被清理后重新生成
+            strategy.__dict__.pop("snapshot_key")
+            DetectProcess("1", strategy=strategy).process()
+            assert gen.call_count == 2
@@ -10,10 +10,17 @@ specific language governing permissions and limitations under the License.
 """
 
 
+import time
+
 import mock
 import pytest
 
-from alarm_backends.service.detect.strategy.year_round_amplitude import YearRoundAmplitude
+from alarm_backends.core.cache import key
+from alarm_backends.service.detect import DataPoint as DetectDataPoint
+from alarm_backends.service.detect.strategy import history_data_cache
+from alarm_backends.service.detect.strategy.year_round_amplitude import (
+    YearRoundAmplitude,
+)
 from alarm_backends.tests.service.detect import DataPoint
 from core.errors.alarm_backends.detect import InvalidAlgorithmsConfig, InvalidDataPoint
 
@@ -61,3 +68,78 @@ class TestYearRoundAmplitude(object):
         with pytest.raises(InvalidAlgorithmsConfig):
             detect_engine = YearRoundAmplitude(config=algorithms_config, unit="percent")
             detect_engine.detect((99, 100000000))
+
+
+class TestHistoryPointFetcher(object):
+    def make_history_point(self, item, value, timestamp):
+        return DetectDataPoint(
+            {
+                "record_id": "389518839de471c0baec4b6fb26c2538.{}".format(timestamp),
+                "value": value,
+                "values": {"timestamp": timestamp, "mocked_metric": value},
+                "dimensions": {"mocked": "mocked"},
+                "time": timestamp,
+            },
+            item,
+        )
+
+    def test_prefetch_history_points(self, settings):
+        from .test_threshold import mock_datapoint_with_value
+
+        history_data_cache.clear()
+        settings.DETECT_HISTORY_CACHE_MAX_SIZE = 100
+        algorithms_config = {"method": "gte", "days": 2, "ratio": 1, "shock": 1}
+        data_point = mock_datapoint_with_value(99)
+        item = data_point.item
+        timestamps = [data_point.timestamp - offset for offset in [60, 86400, 86460, 172800, 172860]]
+
+        publisher = YearRoundAmplitude(config=algorithms_config, unit="percent")
+        publisher._publish_history_points(
+            item, [self.make_history_point(item, index, timestamp) for index, timestamp in enumerate(timestamps)]
+        )
+
+        client = key.HISTORY_DATA_KEY.client
+        detect_engine = YearRoundAmplitude(config=algorithms_config, unit="percent")
+        with mock.patch.object(client, "pipeline", wraps=client.pipeline) as pipeline, mock.patch.object(
+            client, "hgetall"
+        ) as hgetall, mock.patch.object(client, "exists") as exists:
+            detect_engine._prefetch_history_points(item, set(timestamps))
+            # 所有历史时刻只需要一次 pipeline
+            assert pipeline.call_count == 1
+            for index, timestamp in enumerate(timestamps):
+                assert detect_engine._check_history_points(item, timestamp)
+                assert detect_engine.fetch_history_point(item, data_point, timestamp).value == index
+            hgetall.assert_not_called()
+            exists.assert_not_called()
+
+        # 新的检测周期直接命中进程内缓存，无需访问redis
+        detect_engine = YearRoundAmplitude(config=algorithms_config, unit="percent")
+        with mock.patch.object(client, "pipeline") as pipeline:
+            detect_engine._prefetch_history_points(item, set(timestamps))
+            pipeline.assert_not_called()
+            assert detect_engine.fetch_history_point(item, data_point, timestamps[-1]).value == len(timestamps) - 1
+
+        # 超过容量后淘汰最久未使用的数据
+        settings.DETECT_HISTORY_CACHE_MAX_SIZE = 2
+        history_data_cache.set("mocked_key", {"a": "1", "b": "2"})
+        assert history_data_cache.get("mocked_key") == {"a": "1", "b": "2"}
+        assert history_data_cache._size == 2
+        history_data_cache.clear()
+
+    def test_history_data_cache(self, settings):
+        history_data_cache.clear()
+        settings.DETECT_HISTORY_CACHE_MAX_SIZE = 3
+        settings.DETECT_HISTORY_CACHE_TTL = 60
+
+        # 空数据也占用容量，超过上限后被淘汰
+        for index in range(5):
+            history_data_cache.set(f"empty_key_{index}", {})
+        assert list(history_data_cache._data) == ["empty_key_2", "empty_key_3", "empty_key_4"]
+        assert history_data_cache._size == 3
+
+        # 写入时清理头部已过期的条目
+        with mock.patch("alarm_backends.service.detect.strategy.time.time", return_value=time.time() + 61):
+            history_data_cache.set("mocked_key", {"a": "1"})
+        assert list(history_data_cache._data) == ["mocked_key"]
+        assert history_data_cache._size == 1
+        history_data_cache.clear()
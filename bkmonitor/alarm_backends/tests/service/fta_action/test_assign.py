@@ -18,6 +18,7 @@ from django.conf import settings
 from alarm_backends.core.alert import Alert
 from alarm_backends.core.cache.action_config import ActionConfigCacheManager
 from alarm_backends.core.cache.key import ALERT_SNAPSHOT_KEY
+from alarm_backends.core.storage.es_bulk_writer import bulk_writer
 from alarm_backends.service.alert.builder.processor import AlertBuilder
 from alarm_backends.service.alert.manager.checker.upgrade import UpgradeChecker
 from alarm_backends.service.fta_action.tasks import create_actions
@@ -1200,6 +1201,7 @@ class TestUpgradeChecker:
         new_alert = AlertDocument.get(id=alert.id)
         assert new_alert.extra_info.rule_snaps[str(setup.id)]["last_group_index"] == 1
         assert len(new_actions) == 0
+        bulk_writer.flush()
         log_search_object = (
             AlertLog.search(all_indices=True).filter("term", alert_id=alert.id).filter("term", op_type="ACTION")
         )
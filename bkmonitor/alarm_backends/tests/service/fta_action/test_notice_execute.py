@@ -735,10 +735,14 @@ class TestActionProcessor(TransactionTestCase):
         self.get_recommended_metrics.start()
 
         self.create_alert_log = patch("bkmonitor.documents.AlertLog.bulk_create", MagicMock(return_value=True))
+        self.bulk_writer_patch = patch(
+            "alarm_backends.core.storage.es_bulk_writer.bulk_writer.add", MagicMock(return_value=None)
+        )
 
         self.create_alert_patch = patch("bkmonitor.documents.AlertDocument.bulk_create", MagicMock(return_value=True))
         self.create_alert_patch.start()
         self.create_alert_log.start()
+        self.bulk_writer_patch.start()
 
         self.send_weixin_patcher.start()
         self.send_mail_patcher.start()
@@ -985,6 +989,7 @@ class TestActionProcessor(TransactionTestCase):
         UserGroup.objects.all().delete()
         DutyArrange.objects.all().delete()
         self.create_alert_log.stop()
+        self.bulk_writer_patch.stop()
         self.get_biz_patcher.stop()
         self.get_all_biz_patcher.stop()
         self.get_host_patcher.stop()
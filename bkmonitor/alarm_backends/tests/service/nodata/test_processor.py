@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import mock
+import pytest
+
+from alarm_backends.core.cache import key
+from alarm_backends.service.nodata.processor import CheckProcessor
+from alarm_backends.tests.service.nodata.mock import MockItem
+
+STRATEGY_ID = 1
+ITEM_ID = 1
+CHECK_TIMESTAMP = 1569246600
+
+
+def make_record(timestamp, ip="127.0.0.1"):
+    return json.dumps(
+        {
+            "record_id": "{}.{}".format(ip, timestamp),
+            "value": 1.38,
+            "values": {"time": timestamp, "load5": 1.38},
+            "dimensions": {"bk_target_ip": ip},
+            "time": timestamp,
+        }
+    )
+
+
+@pytest.fixture
+def item():
+    return MockItem({"id": ITEM_ID, "query_configs": [{"agg_interval": 60}]})
+
+
+@pytest.fixture
+def processor():
+    with mock.patch("alarm_backends.service.nodata.processor.Strategy"), mock.patch(
+        "alarm_backends.service.nodata.processor.i18n"
+    ):
+        yield CheckProcessor(STRATEGY_ID)
+
+
+@pytest.fixture
+def channels():
+    bucket_key = key.NO_DATA_BUCKET_KEY.get_key(strategy_id=STRATEGY_ID, item_id=ITEM_ID)
+    list_key = key.NO_DATA_LIST_KEY.get_key(strategy_id=STRATEGY_ID, item_id=ITEM_ID)
+    yield bucket_key, list_key
+    key.NO_DATA_BUCKET_KEY.client.delete(bucket_key)
+    key.NO_DATA_LIST_KEY.client.delete(list_key)
+
+
+def push_bucket(bucket_key, records):
+    key.NO_DATA_BUCKET_KEY.client.zadd(bucket_key, {record: json.loads(record)["time"] for record in records})
+
+
+class TestCheckProcessor(object):
+    def test_load_data_points(self, item):
+        unexpected_records = []
+        data_points = CheckProcessor.load_data_points(
+            item, [make_record(CHECK_TIMESTAMP), "not json"], unexpected_records
+        )
+        assert [data_point.timestamp for data_point in data_points] == [CHECK_TIMESTAMP]
+        assert data_points[0].item is item
+        assert unexpected_records == ["not json"]
+
+    def test_migrate_legacy_records(self, processor, item, channels):
+        bucket_key, list_key = channels
+        records = [make_record(CHECK_TIMESTAMP - 60), make_record(CHECK_TIMESTAMP), "not json"]
+        key.NO_DATA_LIST_KEY.client.lpush(list_key, *records)
+
+        unexpected_records = []
+        processor.migrate_legacy_records(item, bucket_key, unexpected_records)
+
+        # 旧版列表中的数据按数据时间迁移到有序集合，非法数据不迁移
+        assert key.NO_DATA_LIST_KEY.client.llen(list_key) == 0
+        assert key.NO_DATA_BUCKET_KEY.client.zrange(bucket_key, 0, -1, withscores=True) == [
+            (records[0], CHECK_TIMESTAMP - 60),
+            (records[1], CHECK_TIMESTAMP),
+        ]
+        assert key.NO_DATA_BUCKET_KEY.client.ttl(bucket_key) > 0
+        assert unexpected_records == ["not json"]
+
+    def test_pull_data(self, processor, item, channels):
+        bucket_key, list_key = channels
+        past_records = [make_record(CHECK_TIMESTAMP - 60), make_record(CHECK_TIMESTAMP, ip="127.0.0.2")]
+        future_records = [make_record(CHECK_TIMESTAMP + 60)]
+        push_bucket(bucket_key, past_records + future_records)
+        # 滚动升级期间旧版 access 写入的列表数据
+        legacy_record = make_record(CHECK_TIMESTAMP - 120)
+        key.NO_DATA_LIST_KEY.client.lpush(list_key, legacy_record)
+
+        processor.pull_data(item, CHECK_TIMESTAMP)
+
+        # 获取检测时间点之前的数据，之后的数据保留等待后续检测
+        assert sorted(data_point.timestamp for data_point in processor.inputs[ITEM_ID]) == [
+            CHECK_TIMESTAMP - 120,
+            CHECK_TIMESTAMP - 60,
+            CHECK_TIMESTAMP,
+        ]
+        assert key.NO_DATA_BUCKET_KEY.client.zrange(bucket_key, 0, -1) == future_records
+        assert key.NO_DATA_LIST_KEY.client.llen(list_key) == 0
+
+    def test_pull_future_data(self, processor, item, channels):
+        bucket_key, _ = channels
+        earliest_records = [make_record(CHECK_TIMESTAMP + 60), make_record(CHECK_TIMESTAMP + 60, ip="127.0.0.2")]
+        later_records = [make_record(CHECK_TIMESTAMP + 120)]
+        push_bucket(bucket_key, earliest_records + later_records)
+
+        processor.pull_data(item, CHECK_TIMESTAMP)
+
+        # 检测时间点之前无数据时，只取未来最早一个周期的数据
+        assert [data_point.timestamp for data_point in processor.inputs[ITEM_ID]] == [CHECK_TIMESTAMP + 60] * 2
+        assert key.NO_DATA_BUCKET_KEY.client.zrange(bucket_key, 0, -1) == later_records
+
+    def test_pull_no_data(self, processor, item, channels):
+        processor.pull_data(item, CHECK_TIMESTAMP)
+        assert processor.inputs[ITEM_ID] == []
@@ -11,11 +11,14 @@ specific language governing permissions and limitations under the License.
 import copy
 
 import arrow
+import mock
 import pytest
 from django.test import TestCase
 
 from alarm_backends.constants import NO_DATA_TAG_DIMENSION
 from alarm_backends.core.cache.key import CHECK_RESULT_CACHE_KEY
+from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
+from alarm_backends.core.detect_result.ring import add_check_result_cache_with_ring
 from alarm_backends.core.storage.redis_cluster import get_node_by_strategy_id
 from alarm_backends.service.trigger.checker import AnomalyChecker
 from bkmonitor.models import CacheNode
@@ -239,6 +242,15 @@ class TestChecker(TestCase):
             for check_result in check_results:
                 CHECK_RESULT_CACHE_KEY.client.zadd(self.gen_check_result_key(level), {check_result[0]: check_result[1]})
 
+    def insert_check_result_ring(self, anomaly_count):
+        # 检测结果有序集合与环形位图在同一个脚本中写入
+        with self.settings(CHECK_RESULT_RING_ENABLED=True):
+            for level in [1, 2, 3]:
+                check_result = CheckResult(check_result_cache_key=self.gen_check_result_key(level))
+                for label, timestamp in CHECK_RESULT_SETS.get(anomaly_count, []):
+                    add_check_result_cache_with_ring(check_result, label, timestamp, 60, label.endswith(ANOMALY_LABEL))
+            CheckResult.pipeline().execute()
+
     def test_check_anomaly_by_level_anomaly_count_1(self):
         self.insert_check_result(1)
         checker = AnomalyChecker(POINT, STRATEGY, 1)
@@ -473,3 +485,41 @@ class TestChecker(TestCase):
         anomaly_records, event_record = checker.check()
         self.assertEqual(len(anomaly_records), 3)
         self.assertEqual(event_record["trigger"]["level"], "2")
+
+    def test_check_with_prefetch(self):
+        for anomaly_count in [0, 1, 2, 3, 4]:
+            self.clear_check_result()
+            self.insert_check_result(anomaly_count)
+            expected = AnomalyChecker(POINT, STRATEGY, 1).check_anomaly()
+
+            checker = AnomalyChecker(POINT, STRATEGY, 1)
+            check_results_cache = AnomalyChecker.prefetch_check_results([checker])
+            self.assertEqual(len(check_results_cache), 3)
+            # 预拉取后不再单独查询 redis
+            with mock.patch.object(CHECK_RESULT_CACHE_KEY.client, "zrangebyscore") as zrangebyscore:
+                self.assertEqual(checker.check_anomaly(), expected)
+                zrangebyscore.assert_not_called()
+
+    def test_check_with_ring(self):
+        for anomaly_count in [0, 1, 2, 3, 4, 5]:
+            self.clear_check_result()
+            self.insert_check_result(anomaly_count)
+            expected = AnomalyChecker(POINT, STRATEGY, 1).check_anomaly()
+            expected_check_results = CHECK_RESULT_CACHE_KEY.client.zrange(
+                self.gen_check_result_key(1), 0, -1, withscores=True
+            )
+            self.clear_check_result()
+            self.insert_check_result_ring(anomaly_count)
+            self.assertEqual(
+                CHECK_RESULT_CACHE_KEY.client.zrange(self.gen_check_result_key(1), 0, -1, withscores=True),
+                expected_check_results,
+            )
+
+            with self.settings(CHECK_RESULT_RING_ENABLED=True):
+                # 环形位图覆盖检测窗口时，不再查询检测结果有序集合
+                with mock.patch.object(CHECK_RESULT_CACHE_KEY.client, "zrangebyscore") as zrangebyscore:
+                    self.assertEqual(AnomalyChecker(POINT, STRATEGY, 1).check_anomaly(), expected)
+                    checker = AnomalyChecker(POINT, STRATEGY, 1)
+                    AnomalyChecker.prefetch_check_results([checker])
+                    self.assertEqual(checker.check_anomaly(), expected)
+                    zrangebyscore.assert_not_called()
@@ -24,6 +24,7 @@ from django.utils.encoding import force_bytes
 from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.local import local
 from bkmonitor.utils.request import get_request
+from core.prometheus import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +39,8 @@ class UsingCache(object):
     min_length = 15
     preset = 6
     key_prefix = "web_cache"
+    # 等待其他进程写入缓存的轮询间隔(秒)
+    single_flight_interval = 0.1
 
     def __init__(
         self,
@@ -105,6 +108,63 @@ class UsingCache(object):
             )
         return None
 
+    def _report(self, status):
+        cache_type = self.using_cache_type.key if self.using_cache_type else ""
+        metrics.USING_CACHE_REQUEST_COUNT.labels(cache_type=cache_type, status=status).inc()
+
+    @property
+    def stale_timeout(self):
+        if not self.using_cache_type:
+            return 0
+        return self.using_cache_type.stale_timeout
+
+    def _decode(self, value, default=None):
+        if self.compress:
+            try:
+                value = zlib.decompress(value)
+            except Exception:
+                pass
+            try:
+                value = json.loads(force_bytes(value))
+            except Exception:
+                value = default
+        return value
+
+    def _get_cached_value(self, cache_key, waiting=False):
+        """
+        获取缓存数据
+        :param waiting: 是否为等待其他进程写入缓存时的轮询，轮询不使用一级缓存也不上报指标
+        :return: (缓存数据, 是否已过期)，过期数据仅在过期窗口内可用
+        """
+        if not waiting and self.local_cache_enable:
+            # 一级缓存直接保存解码后的对象，避免重复反序列化
+            value = getattr(local, cache_key, None)
+            if value is not None:
+                self._report("local_hit")
+                return value, False
+
+        is_stale = False
+        value = mem_cache.get(cache_key, default=None) if mem_cache is not cache else None
+        if value is None:
+            if self.stale_timeout:
+                # 数据的实际过期时间延长了过期窗口，通过新鲜度标记判断数据是否已过期
+                values = cache.get_many([cache_key, self._fresh_key(cache_key)])
+                value = values.get(cache_key)
+                is_stale = value is not None and values.get(self._fresh_key(cache_key)) is None
+            else:
+                value = cache.get(cache_key, default=None)
+        if value is None:
+            if not waiting:
+                self._report("miss")
+            return None, False
+
+        value = self._decode(value)
+        if value is not None and self.local_cache_enable:
+            setattr(local, cache_key, value)
+        if not waiting:
+            self._report("stale" if is_stale else "hit")
+        return value, is_stale
+
     def get_value(self, cache_key, default=None):
         """
         新增一级内存缓存（local）。在同一个请求(线程)中，优先使用内存缓存。
@@ -114,28 +174,75 @@ class UsingCache(object):
         local (miss), cache(miss): cache <- result
         local (miss), cache(hit): local <- result
         """
-        if self.local_cache_enable:
-            value = getattr(local, cache_key, None)
-            if value:
-                return json.loads(value)
-
-        value = mem_cache.get(cache_key, default=None) or cache.get(cache_key, default=None)
+        value, _ = self._get_cached_value(cache_key)
         if value is None:
             return default
-        if self.compress:
-            try:
-                value = zlib.decompress(value)
-            except Exception:
-                pass
-            try:
-                value = json.loads(force_bytes(value))
-            except Exception:
-                value = default
-        if value and self.local_cache_enable:
-            setattr(local, cache_key, json.dumps(value))
         return value
 
+    @staticmethod
+    def _fresh_key(cache_key):
+        return "{}:fresh".format(cache_key)
+
+    @staticmethod
+    def _lock_key(cache_key):
+        return "{}:lock".format(cache_key)
+
+    def _acquire_lock(self, cache_key):
+        try:
+            return cache.add(self._lock_key(cache_key), 1, settings.CACHE_SINGLE_FLIGHT_TIMEOUT)
+        except Exception as e:
+            # 缓存不可用时不阻塞主流程
+            logger.warning("[Cache]获取刷新锁[key:%s]失败: %s", cache_key, e)
+            return True
+
+    def _release_lock(self, cache_key):
+        try:
+            cache.delete(self._lock_key(cache_key))
+        except Exception as e:
+            logger.warning("[Cache]释放刷新锁[key:%s]失败: %s", cache_key, e)
+
+    def _refresh_once(self, task_definition, args, kwargs, cache_key):
+        """
+        缓存缺失时，同一个缓存key仅由获取到锁的进程执行函数，其他进程等待其写入缓存
+        """
+        if not settings.CACHE_SINGLE_FLIGHT_ENABLED:
+            return self._refresh(task_definition, args, kwargs)
+
+        if self._acquire_lock(cache_key):
+            try:
+                return self._refresh(task_definition, args, kwargs)
+            finally:
+                self._release_lock(cache_key)
+
+        deadline = time.time() + settings.CACHE_SINGLE_FLIGHT_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(self.single_flight_interval)
+            value, _ = self._get_cached_value(cache_key, waiting=True)
+            if value is not None:
+                self._report("wait_hit")
+                return value
+            # 锁已释放但未写入缓存(如返回结果无需缓存)，不再等待
+            if cache.get(self._lock_key(cache_key)) is None:
+                break
+        return self._refresh(task_definition, args, kwargs)
+
+    def _revalidate(self, task_definition, args, kwargs, cache_key, stale_value):
+        """
+        数据处于过期窗口内时，仅由获取到锁的进程刷新，其他进程继续使用旧数据
+        """
+        if not self._acquire_lock(cache_key):
+            return stale_value
+
+        try:
+            return self._refresh(task_definition, args, kwargs)
+        except Exception as e:
+            logger.exception("[Cache]刷新缓存[key:%s]失败，使用过期数据: %s", cache_key, e)
+            return stale_value
+        finally:
+            self._release_lock(cache_key)
+
     def set_value(self, key, value, timeout=60):
+        stale_timeout = self.stale_timeout
         if self.compress:
             try:
                 value = json.dumps(value)
@@ -149,7 +256,12 @@ class UsingCache(object):
         try:
             if mem_cache is not cache:
                 mem_cache.set(key, value, 60)
-            cache.set(key, value, timeout)
+            if stale_timeout and timeout:
+                # 数据保留至过期窗口结束，新鲜度标记按原有效期过期
+                cache.set(key, value, timeout + stale_timeout)
+                cache.set(self._fresh_key(key), 1, timeout)
+            else:
+                cache.set(key, value, timeout)
         except Exception as e:
             try:
                 request_path = get_request().path
@@ -170,10 +282,12 @@ class UsingCache(object):
         else:
             cache_key = self._cache_key(task_definition, args, kwargs)
         if cache_key:
-            return_value = self.get_value(cache_key, default=None)
+            return_value, is_stale = self._get_cached_value(cache_key)
 
             if return_value is None:
-                return_value = self._refresh(task_definition, args, kwargs)
+                return_value = self._refresh_once(task_definition, args, kwargs, cache_key)
+            elif is_stale:
+                return_value = self._revalidate(task_definition, args, kwargs, cache_key, return_value)
         else:
             return_value = self._cacheless(task_definition, args, kwargs)
         return return_value
@@ -192,6 +306,7 @@ class UsingCache(object):
         # 需要进行缓存
         if self.is_cache_func(return_value):
             self.set_value(cache_key, return_value, self.using_cache_type.timeout)
+            self._report("refresh")
 
         return return_value
 
@@ -236,20 +351,22 @@ class CacheTypeItem(object):
     缓存类型定义
     """
 
-    def __init__(self, key, timeout, user_related=None, label=""):
+    def __init__(self, key, timeout, user_related=None, label="", stale_timeout=0):
         """
         :param key: 缓存名称
         :param timeout: 缓存超时，单位：s
         :param user_related: 是否用户相关
         :param label: 详细说明
+        :param stale_timeout: 过期窗口，单位：s，缓存过期后的窗口内由一个进程刷新，其他进程继续使用旧数据
         """
         self.key = key
         self.timeout = timeout
         self.label = label
         self.user_related = user_related
+        self.stale_timeout = stale_timeout
 
     def __call__(self, timeout):
-        return CacheTypeItem(self.key, timeout, self.user_related, self.label)
+        return CacheTypeItem(self.key, timeout, self.user_related, self.label, self.stale_timeout)
 
 
 class CacheType(object):
@@ -259,11 +376,29 @@ class CacheType(object):
     >>>@using_cache(CacheType.BIZ)
     """
 
-    BIZ = CacheTypeItem(key="biz", timeout=settings.CACHE_BIZ_TIMEOUT, label="业务及人员相关", user_related=True)
+    BIZ = CacheTypeItem(
+        key="biz",
+        timeout=settings.CACHE_BIZ_TIMEOUT,
+        label="业务及人员相关",
+        user_related=True,
+        stale_timeout=settings.CACHE_STALE_TIMEOUT,
+    )
 
-    HOST = CacheTypeItem(key="host", timeout=settings.CACHE_HOST_TIMEOUT, label="主机信息相关", user_related=False)
+    HOST = CacheTypeItem(
+        key="host",
+        timeout=settings.CACHE_HOST_TIMEOUT,
+        label="主机信息相关",
+        user_related=False,
+        stale_timeout=settings.CACHE_STALE_TIMEOUT,
+    )
 
-    CC = CacheTypeItem(key="cc", timeout=settings.CACHE_CC_TIMEOUT, label="CC模块和Set相关", user_related=True)
+    CC = CacheTypeItem(
+        key="cc",
+        timeout=settings.CACHE_CC_TIMEOUT,
+        label="CC模块和Set相关",
+        user_related=True,
+        stale_timeout=settings.CACHE_STALE_TIMEOUT,
+    )
 
     DATA = CacheTypeItem(key="data", timeout=settings.CACHE_DATA_TIMEOUT, label="计算平台接口相关", user_related=False)
     OVERVIEW = CacheTypeItem(
@@ -276,13 +411,17 @@ class CacheType(object):
     APM = CacheTypeItem(key="apm", timeout=60 * 10, user_related=False)
     APM_EBPF = CacheTypeItem(key="apm_ebpf", timeout=60 * 10, user_related=False)
     APM_ENDPOINTS = CacheTypeItem(key="apm_endpoints", timeout=60 * 10, user_related=False)
-    CC_BACKEND = CacheTypeItem(key="cc_backend", timeout=60 * 10, user_related=False)
+    CC_BACKEND = CacheTypeItem(
+        key="cc_backend", timeout=60 * 10, user_related=False, stale_timeout=settings.CACHE_STALE_TIMEOUT
+    )
     LOG_SEARCH = CacheTypeItem(key="log_search", timeout=60 * 5, label="日志平台相关", user_related=False)
     NODE_MAN = CacheTypeItem(key="node_man", timeout=60 * 10, label="节点管理相关", user_related=False)
     # 重要： 此类型表示所有resource调用均大概率命中缓存，因为缓存失效时间较长。缓存刷新由后台周期任务进行
     # 详细参看： from alarm_backends.core.api_cache.library import cmdb_api_list
     # 当出现cmdb数据变更长时间未生效，考虑后台进程缓存任务失败的可能：bk-monitor-alarm-api-cron-worker
-    CC_CACHE_ALWAYS = CacheTypeItem(key="cc_cache_always", timeout=60 * 60, user_related=False)
+    CC_CACHE_ALWAYS = CacheTypeItem(
+        key="cc_cache_always", timeout=60 * 60, user_related=False, stale_timeout=settings.CACHE_STALE_TIMEOUT
+    )
     HOME = CacheTypeItem(key="home", timeout=settings.CACHE_HOME_TIMEOUT, label="自愈统计数据相关", user_related=False)
     DEVOPS = CacheTypeItem(key="devops", timeout=60 * 5, label="蓝盾接口相关", user_related=False)
     GRAFANA = CacheTypeItem(key="grafana", timeout=60 * 5, label="仪表盘相关", user_related=False)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+维度指纹
+
+count_md5 会对字典的每个键、值分别计算 md5，再逐层排序合并计算，维度较多时开销很大。
+dimension_fingerprint 针对扁平的维度字典(值为标量)计算指纹，支持两种模式：
+1. md5: 结果与 count_md5 完全一致，用于兼容 record_id、dimensions_md5 等已有的缓存 key
+2. xxhash: 将排序后的维度一次性序列化后计算 xxh3_128，开销远低于 md5 模式，但结果与 count_md5 不兼容
+
+同一维度组合在不同时间点会重复出现，两种模式都会在进程内缓存维度组合对应的指纹。
+"""
+
+import hashlib
+from typing import Dict
+
+import xxhash
+from django.conf import settings
+
+from bkmonitor.utils.common_utils import count_md5
+
+
+class FingerprintMode:
+    MD5 = "md5"
+    XXHASH = "xxhash"
+
+
+# 可以直接计算指纹的标量类型，其余类型(如列表、字典)的维度值使用 count_md5 计算
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+# 进程内缓存的最大维度组合数，超过后清空重新缓存
+MAX_CACHE_SIZE = 100000
+
+# md5 模式下单个维度(键, 值)的指纹缓存
+_md5_item_cache = {}
+# 维度组合的指纹缓存
+_fingerprint_caches = {FingerprintMode.MD5: {}, FingerprintMode.XXHASH: {}}
+
+
+def _md5(content: str) -> str:
+    return hashlib.md5(content.encode("utf8")).hexdigest()
+
+
+def _md5_item(item) -> str:
+    """
+    计算单个维度的指纹，与 count_md5((str(key), count_md5(value))) 一致
+    """
+    try:
+        return _md5_item_cache[item]
+    except KeyError:
+        pass
+
+    key, value = item
+    fingerprints = sorted([_md5(key), _md5(_md5(value))])
+    result = _md5("['{}', '{}']".format(*fingerprints))
+    if len(_md5_item_cache) >= MAX_CACHE_SIZE:
+        _md5_item_cache.clear()
+    _md5_item_cache[item] = result
+    return result
+
+
+def _md5_fingerprint(items) -> str:
+    fingerprints = sorted(_md5_item(item) for item in items)
+    return _md5("[{}]".format(", ".join("'{}'".format(fingerprint) for fingerprint in fingerprints)))
+
+
+def _xxhash_fingerprint(items) -> str:
+    return xxhash.xxh3_128_hexdigest("\x1e".join("{}\x1f{}".format(key, value) for key, value in items))
+
+
+FINGERPRINT_FUNCTIONS = {
+    FingerprintMode.MD5: _md5_fingerprint,
+    FingerprintMode.XXHASH: _xxhash_fingerprint,
+}
+
+
+def dimension_fingerprint(dimensions: Dict, mode: str = None) -> str:
+    """
+    计算维度指纹
+    :param dimensions: 维度字典
+    :param mode: 指纹模式，默认使用 DIMENSION_FINGERPRINT_MODE 配置
+    """
+    mode = mode or settings.DIMENSION_FINGERPRINT_MODE
+    items = []
+    for key, value in dimensions.items():
+        if not isinstance(key, str):
+            return count_md5(dimensions)
+        if isinstance(value, SCALAR_TYPES):
+            # 与 count_md5 一致，维度值按字符串计算
+            items.append((key, str(value)))
+        elif mode == FingerprintMode.MD5:
+            return count_md5(dimensions)
+        else:
+            items.append((key, count_md5(value)))
+    items = tuple(sorted(items))
+
+    cache = _fingerprint_caches[mode]
+    try:
+        return cache[items]
+    except KeyError:
+        pass
+
+    result = FINGERPRINT_FUNCTIONS[mode](items)
+    if len(cache) >= MAX_CACHE_SIZE:
+        cache.clear()
+    cache[items] = result
+    return result
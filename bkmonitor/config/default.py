@@ -689,6 +689,92 @@ WECOM_ROBOT_CONTENT_LENGTH = 0
 # 二次确认
 DOUBLE_CHECK_SUM_STRATEGY_IDS = os.environ.get("DOUBLE_CHECK_SUM_STRATEGY_IDS", [])
 
+# 维度指纹模式(record_id 等维度 md5 的计算方式)
+# md5: 与旧版 count_md5 结果一致；xxhash: 性能更好，但切换后已有的检测结果、告警缓存 key 会失效，需要所有模块同时切换
+DIMENSION_FINGERPRINT_MODE = "md5"
+
+# 是否开启批量(向量化)异常检测
+DETECT_BATCH_MODE_ENABLED = True
+
+# 检测历史数据进程内缓存: 最大缓存维度数、缓存有效期(秒)、可跨周期缓存的最近历史时刻(秒)
+# 缓存按 worker 进程独立维护，每个维度约占数百字节，容量需结合单机 worker 进程数评估内存占用
+# 缓存数据最多比 redis 中的历史数据滞后 DETECT_HISTORY_CACHE_TTL 秒，只有超过 STABLE_SECONDS 的历史时刻会跨周期缓存
+DETECT_HISTORY_CACHE_MAX_SIZE = 100000
+DETECT_HISTORY_CACHE_TTL = 5 * 60
+DETECT_HISTORY_CACHE_STABLE_SECONDS = 60 * 60
+
+# detect 是否按待检测数据积压量自适应调度，积压策略单个任务内的最大处理轮数，无积压策略合并为单个任务的数量
+DETECT_ADAPTIVE_SCHEDULE_ENABLED = True
+DETECT_MAX_DRAIN_PASSES = 5
+DETECT_COLD_STRATEGY_BATCH_SIZE = 10
+# 积压量指标按策略上报的最大策略数
+DETECT_BACKLOG_METRIC_TOP_N = 20
+
+# detect 常驻进程模式: 各进程按一致性哈希分片处理策略，并在进程内缓存策略及监控项配置，不再为每个策略投递 celery 任务
+DETECT_WORKER_MODE_ENABLED = False
+# 常驻进程单轮最多拉取的策略信号数，以及单次运行的最长时间(秒)，超时后交由进程框架判断是否继续运行
+DETECT_WORKER_BATCH_SIZE = 100
+DETECT_WORKER_RUN_SECONDS = 60
+
+# trigger 是否开启批量模式(批量预拉取检测结果)，以及单批处理的异常点数量
+TRIGGER_BATCH_MODE_ENABLED = True
+TRIGGER_BATCH_SIZE = 1000
+
+# CMDB 缓存是否开启增量刷新(按对象内容摘要比对，只写入有变更的对象)
+CMDB_INCREMENTAL_REFRESH_ENABLED = True
+# CMDB 主机/模块/集群缓存是否使用紧凑编码(读取时同时兼容旧版 pickle 格式)
+# 旧版进程无法读取紧凑编码，需在所有读取方升级完成后再开启
+CMDB_CACHE_COMPACT_CODEC_ENABLED = False
+# CMDB 进程内缓存: 每类缓存的最大条目数、有效期(秒，为0时关闭)、缓存版本检查间隔(秒)
+CMDB_LOCAL_CACHE_MAX_SIZE = 100000
+CMDB_LOCAL_CACHE_TTL = 5 * 60
+CMDB_LOCAL_CACHE_VERSION_CHECK_INTERVAL = 5
+
+# 策略缓存是否按业务分片并行刷新(同时按策略内容摘要差量写入)，以及并行的分片数
+STRATEGY_CACHE_SHARDED_REFRESH_ENABLED = True
+STRATEGY_CACHE_REFRESH_WORKERS = 4
+
+# 实时监控单批处理的最大记录数，以及已拉取未处理的最大记录数(超过后暂停拉取)
+REAL_TIME_ACCESS_BATCH_SIZE = 20000
+REAL_TIME_ACCESS_MAX_IN_FLIGHT_RECORDS = 100000
+
+# access -> detect 数据队列是否使用批量二进制格式(detect 同时兼容旧版 json 格式)
+# 旧版 detect 无法读取批量格式，需在所有 detect 进程升级完成后再开启
+DATA_QUEUE_BATCH_ENCODING_ENABLED = False
+# 批量格式下，每个队列元素包含的最大记录数
+DATA_QUEUE_BATCH_SIZE = 1000
+
+# access -> nodata 是否按数据时间写入有序集合(nodata 同时兼容旧版列表队列)
+# 旧版 nodata 只读取列表队列，需在所有 nodata 进程升级完成后再开启，否则会产生误告警
+NO_DATA_BUCKET_QUEUE_ENABLED = False
+
+# 检测结果环形位图开关，开启后 detect 和 nodata 同步维护最近N个周期的检测状态，trigger 优先从位图中计算异常次数
+CHECK_RESULT_RING_ENABLED = False
+# 检测结果环形位图保留的周期数
+CHECK_RESULT_RING_SIZE = 60
+
+# access 数据去重方式，set: 以集合保存完整 record_id；fingerprint: 以定长指纹追加保存，内存及传输量更小
+ACCESS_DUPLICATE_BACKEND = "set"
+# fingerprint 方式下单个时间点的预估最大记录数及可接受的误判率(误判会导致数据被当作重复丢弃)，用于计算指纹长度
+ACCESS_DUPLICATE_FINGERPRINT_CAPACITY = 1000000
+ACCESS_DUPLICATE_FINGERPRINT_ERROR_RATE = 1e-9
+
+# 告警快照是否使用紧凑编码(msgpack + zlib)，开启后无需刷新 DB 的告警只写入变化的字段(读取时同时兼容旧版 json 格式)
+# 旧版进程无法读取紧凑编码及增量字段，需在所有读取快照的进程升级完成后再开启
+ALERT_SNAPSHOT_COMPACT_ENCODING_ENABLED = False
+
+# ES 异步批量写入(告警流水等): 开关、单批最大文档数、最长刷新间隔(秒)、待写入文档数上限(超出后同步写入)
+ES_BULK_WRITER_ENABLED = False
+ES_BULK_WRITER_BATCH_SIZE = 500
+ES_BULK_WRITER_FLUSH_INTERVAL = 1
+ES_BULK_WRITER_MAX_QUEUE_SIZE = 100000
+# ES 异步批量写入失败文档的最大重试次数及退避基数(秒)
+ES_BULK_WRITER_MAX_RETRIES = 3
+ES_BULK_WRITER_RETRY_BACKOFF = 1
+
+# 延时队列单次原子取出的最大任务数(受 Lua unpack 参数数量限制，不宜超过 5000)
+DELAY_QUEUE_POP_BATCH_SIZE = 1000
+
 # BCS 集群配置来源标签
 BCS_CLUSTER_BK_ENV_LABEL = os.environ.get("BCS_CLUSTER_BK_ENV_LABEL", "")
 
@@ -900,6 +986,19 @@ CACHE_DATA_TIMEOUT = 60 * 2
 CACHE_OVERVIEW_TIMEOUT = 60 * 2
 CACHE_HOME_TIMEOUT = 60 * 10
 CACHE_USER_TIMEOUT = 60 * 10
+# 缓存过期窗口(秒)，缓存过期后的窗口内由一个进程刷新，其他进程继续使用旧数据
+CACHE_STALE_TIMEOUT = 60 * 5
+# 缓存缺失时同一缓存key仅由一个进程执行函数，其他进程最多等待 CACHE_SINGLE_FLIGHT_TIMEOUT 秒
+CACHE_SINGLE_FLIGHT_ENABLED = True
+CACHE_SINGLE_FLIGHT_TIMEOUT = 10
+
+# Resource 批量请求共享线程池: 开关、最大线程数、单个模块(如 API 模块)的最大并发请求数
+DRF_RESOURCE_SHARED_EXECUTOR_ENABLED = True
+DRF_RESOURCE_EXECUTOR_MAX_WORKERS = 64
+DRF_RESOURCE_MODULE_MAX_CONCURRENCY = 16
+# API 请求是否按 base_url 共享 HTTP 会话(复用 keep-alive 连接)，以及单个 host 的最大连接数
+DRF_RESOURCE_SHARED_SESSION_ENABLED = False
+DRF_RESOURCE_HTTP_POOL_MAXSIZE = 20
 
 # SaaS访问读写权限
 ROLE_WRITE_PERMISSION = "w"
@@ -1289,8 +1388,15 @@ FETCH_TIME_SERIES_METRIC_INTERVAL_SECONDS = 7200
 # 是否启用 metadata 新功能
 IS_ENABLE_METADATA_FUNCTION_CONTROLLER = True
 
+# 是否启用空间路由增量刷新，仅重新计算有变更的空间及结果表，并且只写入内容有变化的数据
+SPACE_ROUTER_INCREMENTAL_ENABLED = True
+# 空间路由增量刷新模式下，全量校准的间隔时间，单位秒
+SPACE_ROUTER_FULL_REFRESH_INTERVAL = 3600
+
 # 自定义指标过期时间
 TIME_SERIES_METRIC_EXPIRED_SECONDS = 30 * 24 * 3600
+# 自定义指标及维度指纹的缓存时间，指纹未变化时跳过 DB 更新，需要小于 1 天；为 0 时不启用
+TIME_SERIES_METRIC_FINGERPRINT_TIMEOUT = 12 * 3600
 
 # 是否启用 influxdb 写入，默认 True
 ENABLE_INFLUXDB_STORAGE = True
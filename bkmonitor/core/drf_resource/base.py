@@ -12,15 +12,20 @@ specific language governing permissions and limitations under the License.
 
 import abc
 import logging
+from functools import partial
 
 import six
+from django.conf import settings
 from django.db import models
+from django.utils import translation
 from django.utils.translation import ugettext as _
 from opentelemetry import trace
 
+from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.request import get_request_username
 from bkmonitor.utils.thread_backend import ThreadPool
 from core.drf_resource.exceptions import CustomException
+from core.drf_resource.executor import get_executor, is_executor_thread
 from core.drf_resource.tasks import run_perform_request
 from core.drf_resource.tools import (
     format_serializer_errors,
@@ -223,6 +228,31 @@ class Resource(six.with_metaclass(abc.ABCMeta, object)):
             validated_response_data = self.validate_response_data(response_data)
             return validated_response_data
 
+    def get_concurrency_key(self):
+        """
+        批量请求并发限制的分组，默认按 Resource 所在模块分组
+        """
+        return self.__class__.__module__
+
+    def can_coalesce_request(self):
+        """
+        相同参数的并发请求是否可以合并执行，仅适用于无副作用的请求
+        """
+        return False
+
+    def get_coalesce_key(self, request_data):
+        try:
+            request_md5 = count_md5(request_data, list_sort=False)
+        except Exception:
+            return None
+        return "{}.{}:{}:{}:{}".format(
+            self.__class__.__module__,
+            self.__class__.__name__,
+            get_request_username(),
+            translation.get_language(),
+            request_md5,
+        )
+
     def bulk_request(self, request_data_iterable=None, ignore_exceptions=False):
         """
         基于多线程的批量并发请求
@@ -230,19 +260,30 @@ class Resource(six.with_metaclass(abc.ABCMeta, object)):
         if not isinstance(request_data_iterable, (list, tuple)):
             raise TypeError("'request_data_iterable' object is not iterable")
 
-        pool = ThreadPool()
-        futures = []
-        for request_data in request_data_iterable:
-            futures.append(pool.apply_async(self.request, args=(request_data,)))
+        # 共享线程池中的嵌套批量请求使用独立线程池，避免占满共享线程池后互相等待
+        if settings.DRF_RESOURCE_SHARED_EXECUTOR_ENABLED and not is_executor_thread():
+            executor = get_executor()
+            concurrency_key = self.get_concurrency_key()
+            can_coalesce = self.can_coalesce_request()
+            futures = []
+            for request_data in request_data_iterable:
+                coalesce_key = self.get_coalesce_key(request_data) if can_coalesce else None
+                future = executor.submit(partial(self.request, request_data), concurrency_key, coalesce_key)
+                futures.append(future.result)
+        else:
+            pool = ThreadPool()
+            futures = []
+            for request_data in request_data_iterable:
+                futures.append(pool.apply_async(self.request, args=(request_data,)).get)
 
-        pool.close()
-        pool.join()
+            pool.close()
+            pool.join()
 
         results = []
         exceptions = []
-        for future in futures:
+        for get_result in futures:
             try:
-                results.append(future.get())
+                results.append(get_result())
             except Exception as e:
                 # 判断是否忽略错误
                 if not ignore_exceptions:
@@ -12,6 +12,10 @@ specific language governing permissions and limitations under the License.
 
 import abc
 import logging
+import os
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
 
 import requests
 import six
@@ -20,6 +24,7 @@ from blueapps.account.utils import load_backend
 from django.conf import settings
 from django.utils.module_loading import import_string
 from django.utils.translation import ugettext as _
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError, ReadTimeout
 
 from bkmonitor.utils.request import get_common_headers, get_request
@@ -27,6 +32,7 @@ from bkmonitor.utils.user import make_userinfo
 from core.drf_resource.contrib.cache import CacheResource
 from core.errors.api import BKAPIError
 from core.errors.iam import APIPermissionDeniedError
+from core.prometheus import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +53,32 @@ INTERFACE_COMMON_PARAMS = {
 BK_USERNAME_FIELD = "bk_username"
 APIPermissionDeniedCodeList = ["9900403", 9900403]
 
+# {(进程ID, base_url): 共享的 HTTP 会话}
+_shared_sessions = {}
+_shared_sessions_lock = threading.Lock()
+
+
+def get_shared_session(base_url):
+    """
+    获取按 base_url 共享的 HTTP 会话，复用 keep-alive 连接
+    """
+    session_key = (os.getpid(), base_url)
+    session = _shared_sessions.get(session_key)
+    if session is not None:
+        return session
+
+    with _shared_sessions_lock:
+        session = _shared_sessions.get(session_key)
+        if session is None:
+            session = requests.session()
+            adapter = HTTPAdapter(pool_maxsize=settings.DRF_RESOURCE_HTTP_POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            # 共享会话不保存 cookie，避免不同用户的请求互相影响
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _shared_sessions[session_key] = session
+    return session
+
 
 def get_bk_login_ticket(request):
     """
@@ -128,7 +160,19 @@ class APIResource(six.with_metaclass(abc.ABCMeta, CacheResource)):
         super(APIResource, self).__init__(**kwargs)
         assert self.method.upper() in ["GET", "POST", "PUT", "DELETE", "PATCH"], _("method仅支持GET或POST或PUT或DELETE或PATCH")
         self.method = self.method.upper()
-        self.session = requests.session()
+        self._session = requests.session()
+
+    @property
+    def session(self):
+        if settings.DRF_RESOURCE_SHARED_SESSION_ENABLED:
+            return get_shared_session(self.base_url)
+        return self._session
+
+    def get_concurrency_key(self):
+        return self.module_name
+
+    def can_coalesce_request(self):
+        return self.method == "GET" or super(APIResource, self).can_coalesce_request()
 
     def request(self, request_data=None, **kwargs):
         request_data = request_data or kwargs
@@ -169,6 +213,7 @@ class APIResource(six.with_metaclass(abc.ABCMeta, CacheResource)):
         request_url = self.get_request_url(validated_request_data)
         logger.debug("request: {}".format(request_url))
 
+        start_time = time.time()
         try:
             headers = self.get_headers()
             kwargs = {
@@ -205,7 +250,12 @@ class APIResource(six.with_metaclass(abc.ABCMeta, CacheResource)):
                 kwargs = self.before_request(kwargs)
                 result = self.session.request(**kwargs)
         except ReadTimeout:
+            self.report_request_time(start_time, "timeout")
             raise BKAPIError(system_name=self.module_name, url=self.action, result=_("接口返回结果超时"))
+        except Exception:
+            self.report_request_time(start_time, "exception")
+            raise
+        self.report_request_time(start_time, result.status_code)
 
         try:
             result.raise_for_status()
@@ -248,6 +298,9 @@ class APIResource(six.with_metaclass(abc.ABCMeta, CacheResource)):
 
         return response_data
 
+    def report_request_time(self, start_time, status):
+        metrics.API_REQUEST_TIME.labels(module_name=self.module_name, status=status).observe(time.time() - start_time)
+
     @property
     def label(self):
         return ""
@@ -68,6 +68,10 @@ class CacheResource(six.with_metaclass(abc.ABCMeta, Resource)):
             func_key_generator=func_key_generator,
         )(self.request)
 
+    def can_coalesce_request(self):
+        # 可缓存的请求视为无副作用
+        return self._need_cache_wrap()
+
     def cache_write_trigger(self, res):
         """
         缓存写入触发条件
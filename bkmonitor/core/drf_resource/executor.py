@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+Resource 批量请求使用的进程级线程池
+
+1. 进程内共享一个有界线程池，避免每次批量请求都创建线程池
+2. 按模块限制同时执行的请求数，避免单个下游被大量并发请求压垮
+3. 相同的请求正在执行时直接复用其结果
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+
+from bkmonitor.utils.local import local
+from bkmonitor.utils.thread_backend import ThreadPool
+
+
+def is_executor_thread():
+    """
+    当前线程是否由共享线程池中的任务发起(包括任务中再创建的线程)
+    """
+    return getattr(local, "in_resource_executor", False)
+
+
+def run_in_executor(func):
+    # 标记记录在 local 中，任务内创建的线程会继承该标记
+    local.in_resource_executor = True
+    return func()
+
+
+class ResourceExecutor(object):
+    def __init__(self, max_workers, module_concurrency):
+        self.pid = os.getpid()
+        self.module_concurrency = module_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drf_resource")
+        self.lock = threading.Lock()
+        # {模块: 信号量}
+        self.semaphores = {}
+        # {请求标识: 执行中的 Future}
+        self.inflight = {}
+
+    def get_semaphore(self, module):
+        with self.lock:
+            semaphore = self.semaphores.get(module)
+            if semaphore is None:
+                semaphore = self.semaphores[module] = threading.BoundedSemaphore(self.module_concurrency)
+        return semaphore
+
+    def submit(self, func, module, coalesce_key=None) -> Future:
+        """
+        提交任务，模块并发数已满时阻塞等待
+        :param func: 无参函数
+        :param module: 并发限制的分组
+        :param coalesce_key: 请求标识，相同标识的请求正在执行时直接复用其结果
+        """
+        future = Future()
+        if coalesce_key is not None:
+            with self.lock:
+                inflight_future = self.inflight.get(coalesce_key)
+                if inflight_future is not None:
+                    return inflight_future
+                self.inflight[coalesce_key] = future
+
+        semaphore = self.get_semaphore(module)
+        semaphore.acquire()
+        try:
+            func = ThreadPool.get_func_with_local(partial(run_in_executor, func))
+            self.executor.submit(self.run, func, future, semaphore, coalesce_key)
+        except Exception:
+            self.done(semaphore, coalesce_key, future)
+            raise
+        return future
+
+    def done(self, semaphore, coalesce_key, future):
+        semaphore.release()
+        if coalesce_key is not None:
+            with self.lock:
+                if self.inflight.get(coalesce_key) is future:
+                    del self.inflight[coalesce_key]
+
+    def run(self, func, future, semaphore, coalesce_key):
+        try:
+            result = func()
+        except BaseException as e:
+            self.done(semaphore, coalesce_key, future)
+            future.set_exception(e)
+        else:
+            self.done(semaphore, coalesce_key, future)
+            future.set_result(result)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ResourceExecutor:
+    """
+    获取当前进程的共享线程池
+    """
+    global _executor
+    if _executor is None or _executor.pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor.pid != os.getpid():
+                _executor = ResourceExecutor(
+                    settings.DRF_RESOURCE_EXECUTOR_MAX_WORKERS, settings.DRF_RESOURCE_MODULE_MAX_CONCURRENCY
+                )
+    return _executor
@@ -16,7 +16,7 @@ from django.conf import settings
 from prometheus_client.exposition import push_to_gateway
 from prometheus_client.utils import INF
 
-from core.prometheus.base import REGISTRY, BkCollectorRegistry, Counter, Histogram
+from core.prometheus.base import REGISTRY, BkCollectorRegistry, Counter, Gauge, Histogram
 from core.prometheus.tools import get_metric_agg_gateway_url, udp_handler
 
 logger = logging.getLogger(__name__)
@@ -150,6 +150,28 @@ ACCESS_TOKEN_FORBIDDEN_COUNT = Counter(
     documentation="access 流控限制次数",
 )
 
+ACCESS_REAL_TIME_PULL_DATA_COUNT = Counter(
+    name="bkmonitor_access_real_time_pull_data_count",
+    documentation="access(real_time) 模块各分区数据拉取条数",
+    labelnames=("topic", "partition"),
+)
+
+ACCESS_REAL_TIME_CONSUMER_LAG = Gauge(
+    name="bkmonitor_access_real_time_consumer_lag",
+    documentation="access(real_time) 模块各分区消费延迟条数",
+    labelnames=("topic", "partition"),
+)
+
+ACCESS_REAL_TIME_PROCESS_TIME = Histogram(
+    name="bkmonitor_access_real_time_process_time",
+    documentation="access(real_time) 模块单批数据处理耗时",
+)
+
+ACCESS_REAL_TIME_PROCESS_DATA_COUNT = Counter(
+    name="bkmonitor_access_real_time_process_data_count",
+    documentation="access(real_time) 模块数据处理条数",
+)
+
 # detect
 DETECT_PROCESS_TIME = Histogram(
     name="bkmonitor_detect_process_time",
@@ -169,6 +191,12 @@ DETECT_PROCESS_DATA_COUNT = Counter(
     labelnames=("strategy_id", "type"),
 )
 
+DETECT_QUEUE_BACKLOG = Gauge(
+    name="bkmonitor_detect_queue_backlog",
+    documentation="detect 模块待检测数据积压条数",
+    labelnames=("strategy_id",),
+)
+
 # trigger
 TRIGGER_PROCESS_TIME = Histogram(
     name="bkmonitor_trigger_process_time",
@@ -308,6 +336,57 @@ ALERT_MANAGE_PUSH_DATA_COUNT = Counter(
     labelnames=("strategy_id", "signal"),
 )
 
+ALERT_UPDATE_LOCK_HOLD_TIME = Histogram(
+    name="bkmonitor_alert_update_lock_hold_time",
+    documentation="alert 模块单批次告警更新锁持有耗时",
+    labelnames=("module",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, INF),
+)
+
+ES_BULK_WRITER_QUEUE_SIZE = Gauge(
+    name="bkmonitor_es_bulk_writer_queue_size",
+    documentation="ES 异步批量写入待写入文档数",
+    labelnames=("type",),
+)
+
+ES_BULK_WRITER_FLUSH_TIME = Histogram(
+    name="bkmonitor_es_bulk_writer_flush_time",
+    documentation="ES 异步批量写入单批写入耗时",
+    labelnames=("document",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, INF),
+)
+
+ES_BULK_WRITER_DOCUMENT_COUNT = Counter(
+    name="bkmonitor_es_bulk_writer_document_count",
+    documentation="ES 异步批量写入文档数",
+    labelnames=("document", "status"),
+)
+
+DELAY_QUEUE_LAG = Gauge(
+    name="bkmonitor_delay_queue_lag",
+    documentation="延时队列任务实际推送时间与预期推送时间的最大延迟",
+    labelnames=("backend",),
+)
+
+DELAY_QUEUE_POP_COUNT = Counter(
+    name="bkmonitor_delay_queue_pop_count",
+    documentation="延时队列到期推送任务数",
+    labelnames=("backend",),
+)
+
+USING_CACHE_REQUEST_COUNT = Counter(
+    name="bkmonitor_using_cache_request_count",
+    documentation="函数缓存请求次数",
+    labelnames=("cache_type", "status"),
+)
+
+API_REQUEST_TIME = Histogram(
+    name="bkmonitor_api_request_time",
+    documentation="API 模块请求耗时",
+    labelnames=("module_name", "status"),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, INF),
+)
+
 Alert_QOS_COUNT = Counter(
     name="bkmonitor_alert_qos_count",
     documentation="composite 模块动作推送条数",
@@ -439,6 +518,19 @@ ALARM_CACHE_TASK_TIME = Histogram(
     buckets=(1, 3, 5, 10, 30, 60, 300, INF),
 )
 
+STRATEGY_CACHE_REFRESH_PHASE_TIME = Histogram(
+    name="bkmonitor_strategy_cache_refresh_phase_time",
+    documentation="策略缓存刷新各阶段耗时",
+    labelnames=("phase",),
+    buckets=(0.1, 0.5, 1, 3, 5, 10, 30, 60, 300, INF),
+)
+
+CMDB_LOCAL_CACHE_REQUEST_COUNT = Counter(
+    name="bkmonitor_cmdb_local_cache_request_count",
+    documentation="CMDB 进程内缓存请求次数",
+    labelnames=("type", "status"),
+)
+
 # mail report
 MAIL_REPORT_SEND_LATENCY = Histogram(
     name="bkmonitor_mail_report_send_latency",
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+
+import mock
+import pytest
+
+from core.drf_resource import Resource
+from core.drf_resource.executor import ResourceExecutor
+
+
+class SleepResource(Resource):
+    def __init__(self, *args, **kwargs):
+        super(SleepResource, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+
+    def can_coalesce_request(self):
+        return True
+
+    def perform_request(self, validated_request_data):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.calls.append(validated_request_data["value"])
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if validated_request_data["value"] < 0:
+            raise ValueError(validated_request_data["value"])
+        return validated_request_data["value"]
+
+
+class NestedResource(Resource):
+    def perform_request(self, validated_request_data):
+        return sum(SleepResource().bulk_request([{"value": i} for i in range(validated_request_data["count"])]))
+
+
+@pytest.fixture
+def executor(settings):
+    settings.DRF_RESOURCE_SHARED_EXECUTOR_ENABLED = True
+    executor = ResourceExecutor(max_workers=4, module_concurrency=2)
+    with mock.patch("core.drf_resource.base.get_executor", return_value=executor):
+        yield executor
+
+
+class TestResourceExecutor(object):
+    def test_module_concurrency(self, executor):
+        resource = SleepResource()
+        assert resource.bulk_request([{"value": i} for i in range(6)]) == list(range(6))
+        # 单个模块的并发数不超过限制
+        assert resource.max_running == 2
+
+    def test_coalesce(self, executor):
+        resource = SleepResource()
+        assert resource.bulk_request([{"value": 1}, {"value": 1}, {"value": 2}]) == [1, 1, 2]
+        assert sorted(resource.calls) == [1, 2]
+        assert not executor.inflight
+
+    def test_exceptions(self, executor):
+        resource = SleepResource()
+        with pytest.raises(ValueError):
+            resource.bulk_request([{"value": 1}, {"value": -1}])
+        assert resource.bulk_request([{"value": 1}, {"value": -1}], ignore_exceptions=True) == [1, None]
+
+    def test_nested_bulk_request(self, executor):
+        # 嵌套的批量请求不使用共享线程池，避免线程池占满后互相等待
+        assert NestedResource().bulk_request([{"count": 3}] * 4) == [3, 3, 3, 3]
@@ -114,6 +114,9 @@ class Command(BaseCommand):
         # 构建 client，然后删除指标
         client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
         client.zrem(f"bkmonitor:metrics_{data_id}", *metric_list)
+        # 清理指标指纹缓存，避免下次同步时因指纹未变化而跳过
+        for group in models.TimeSeriesGroup.objects.filter(bk_data_id=data_id):
+            group.clear_metrics_fingerprint()
 
         # NOTE: 因为需要删除 transfer 内存中的指标记录，所以需要更新对应的 consul 数据
         ds = models.DataSource.objects.get(bk_data_id=data_id)
@@ -11,11 +11,11 @@ specific language governing permissions and limitations under the License.
 import datetime
 import json
 import logging
-import math
 import time
-from typing import Dict, List, Optional, Set, Tuple, Union
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.db import utils as django_db_utils
 from django.db.transaction import atomic
@@ -24,6 +24,7 @@ from django.utils.timezone import make_aware
 from django.utils.timezone import now as tz_now
 from django.utils.translation import ugettext as _
 
+from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.db.fields import JsonField
 from metadata import config
 from metadata.models.constants import (
@@ -442,10 +443,13 @@ class TimeSeriesGroup(CustomGroupBase):
     def metric_consul_path(self):
         return "{}/influxdb_metrics/{}/time_series_metric".format(config.CONSUL_PATH, self.bk_data_id)
 
-    def get_metrics_from_redis(self, expired_time: Optional[int] = settings.TIME_SERIES_METRIC_EXPIRED_SECONDS):
-        """从 redis 中获取数据
+    def iter_metrics_from_redis(
+        self, expired_time: Optional[int] = settings.TIME_SERIES_METRIC_EXPIRED_SECONDS
+    ) -> Iterator[List[Dict]]:
+        """从 redis 中分批获取数据
 
-        其中，redis 中数据有 transfer 上报
+        NOTE: 按照分数(更新时间)游标分页，避免偏移量分页在指标较多时重复扫描；
+        当前批次的维度和下一批次的指标在同一个 pipeline 中获取，减少请求次数
         """
         client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
         custom_metrics_key = f"{settings.METRICS_KEY_PREFIX}{self.bk_data_id}"
@@ -453,55 +457,119 @@ class TimeSeriesGroup(CustomGroupBase):
 
         now_time = tz_now()
         fetch_step = settings.MAX_METRICS_FETCH_STEP
-        valid_begin_ts = (now_time - datetime.timedelta(seconds=expired_time)).timestamp()
-        metrics_filter_params = {"name": custom_metrics_key, "min": valid_begin_ts, "max": now_time.timestamp()}
+        min_score = (now_time - datetime.timedelta(seconds=expired_time)).timestamp()
+        max_score = now_time.timestamp()
+        # 分数与游标相同且已经获取过的指标数量
+        offset = 0
 
-        metrics_info = []
-        # 分批拉取 redis 数据，防止大批量数据拖垮
-        for i in range(math.ceil(client.zcount(**metrics_filter_params) / fetch_step)):
-            try:
-                # 0. 首先获取有效期内的所有 metrics
-                metrics_with_scores: List[Tuple[bytes, float]] = client.zrangebyscore(
-                    **metrics_filter_params, start=fetch_step * i, num=fetch_step, withscores=True
+        try:
+            # 0. 首先获取有效期内的第一批 metrics
+            metrics_with_scores: List[Tuple[bytes, float]] = client.zrangebyscore(
+                custom_metrics_key, min_score, max_score, start=offset, num=fetch_step, withscores=True
+            )
+        except Exception:
+            logger.exception("failed to get metrics from storage, key: %s", custom_metrics_key)
+            return
+
+        # 获取过程中指标的分数可能被更新，导致重复获取，需要去重
+        fetched_metrics = set()
+        while metrics_with_scores:
+            # 1. 移动游标，分数相同的指标按照成员排序，记录游标位置已经获取的数量
+            last_score = metrics_with_scores[-1][1]
+            if last_score != min_score:
+                min_score, offset = last_score, 0
+            offset += sum(1 for _, score in metrics_with_scores if score == last_score)
+            has_next = len(metrics_with_scores) >= fetch_step
+
+            # 2. 获取当前这批 metrics 的 dimensions 信息，同时获取下一批 metrics
+            pipeline = client.pipeline(transaction=False)
+            pipeline.hmget(metric_dimensions_key, [x[0] for x in metrics_with_scores])
+            if has_next:
+                pipeline.zrangebyscore(
+                    custom_metrics_key, min_score, max_score, start=offset, num=fetch_step, withscores=True
                 )
+            try:
+                results = pipeline.execute(raise_on_error=False)
             except Exception:
-                logger.exception("failed to get metrics from storage, filter params: %s", metrics_filter_params)
-                # metrics 可能存在大批量内容，可容忍某一步出错
+                logger.exception("failed to get metrics from storage, key: %s", custom_metrics_key)
+                return
+
+            dimensions_list = results[0]
+            next_metrics_with_scores = results[1] if has_next else []
+            if isinstance(dimensions_list, Exception):
+                # metrics 可能存在大批量内容，可容忍某一批出错
+                logger.error("failed to get dimensions from metrics, error: %s", dimensions_list)
+            else:
+                yield self._parse_metrics_dimensions(metrics_with_scores, dimensions_list, fetched_metrics)
+
+            if isinstance(next_metrics_with_scores, Exception):
+                logger.error("failed to get metrics from storage, error: %s", next_metrics_with_scores)
+                return
+            metrics_with_scores = next_metrics_with_scores
+
+    @staticmethod
+    def _parse_metrics_dimensions(
+        metrics_with_scores: List[Tuple[bytes, float]], dimensions_list: List[bytes], fetched_metrics: Set[str]
+    ) -> List[Dict]:
+        """解析一批 metrics 对应的 dimensions"""
+        metrics_info = []
+        # 理论上 metrics 和 dimensions 列表一一对应
+        for (field_name, last_modify_time), dimensions_info in zip(metrics_with_scores, dimensions_list):
+            if not dimensions_info:
+                continue
+
+            # 因为获取到的为bytes类型，避免后续更新`table id`时，组装格式错误，转换为字符串
+            if type(field_name) == bytes:
+                field_name = field_name.decode("utf-8")
+            if field_name in fetched_metrics:
                 continue
 
-            # 1. 获取当前这批 metrics 的 dimensions 信息
             try:
-                dimensions_list: List[bytes] = client.hmget(metric_dimensions_key, [x[0] for x in metrics_with_scores])
+                dimensions = json.loads(dimensions_info)["dimensions"]
             except Exception:
-                logger.exception("failed to get dimensions from metrics")
+                logger.exception("failed to parse dimension from dimensions info: %s", dimensions_info)
                 continue
 
-            # 2. 尝试更新 metrics 和对应 dimensions(tags)
-            for j, metric_with_score in enumerate(metrics_with_scores):
-                # 理论上 metrics 和 dimensions 列表一一对应
-                dimensions_info = dimensions_list[j]
-                if not dimensions_info:
-                    continue
+            fetched_metrics.add(field_name)
+            metrics_info.append(
+                {
+                    "field_name": field_name,
+                    "tag_value_list": dimensions,
+                    "last_modify_time": last_modify_time,
+                }
+            )
+        return metrics_info
 
-                try:
-                    dimensions = json.loads(dimensions_info)["dimensions"]
-                except Exception:
-                    logger.exception("failed to parse dimension from dimensions info: %s", dimensions_info)
-                    continue
+    def get_metrics_from_redis(self, expired_time: Optional[int] = settings.TIME_SERIES_METRIC_EXPIRED_SECONDS):
+        """从 redis 中获取数据
 
-                # 因为获取到的为bytes类型，避免后续更新`table id`时，组装格式错误，转换为字符串
-                field_name = metric_with_score[0]
-                if type(field_name) == bytes:
-                    field_name = field_name.decode("utf-8")
-                metrics_info.append(
-                    {
-                        "field_name": field_name,
-                        "tag_value_list": dimensions,
-                        "last_modify_time": metric_with_score[1],
-                    }
-                )
+        其中，redis 中数据有 transfer 上报
+        """
+        metrics_info = []
+        for metrics in self.iter_metrics_from_redis(expired_time=expired_time):
+            metrics_info.extend(metrics)
         return metrics_info
 
+    @property
+    def metrics_fingerprint_cache_key(self):
+        return f"metadata:time_series_metric_fingerprint:{self.time_series_group_id}:{self.table_id}"
+
+    def clear_metrics_fingerprint(self):
+        """清理指标指纹缓存，指标被删除或自动发现开关变更后，下次同步需要全量刷新"""
+        cache.delete(self.metrics_fingerprint_cache_key)
+
+    @staticmethod
+    def get_metrics_fingerprint(metrics_info: List[Dict]) -> str:
+        """计算指标及维度名称的指纹，不包含维度值及更新时间"""
+        metric_tags = {}
+        for item in metrics_info:
+            if "tag_value_list" in item:
+                tags = item["tag_value_list"].keys()
+            else:
+                tags = [tag.get("field_name") for tag in item.get("tag_list", [])]
+            metric_tags[item["field_name"]] = sorted(tags)
+        return count_md5(metric_tags)
+
     def update_time_series_metrics(self) -> bool:
         """从远端存储中同步TS的指标和维度对应关系
 
@@ -512,9 +580,19 @@ class TimeSeriesGroup(CustomGroupBase):
         if not metrics_info:
             return False
 
+        # 指标及维度没有变化时，跳过 DB 更新
+        # NOTE: 指纹不包含更新时间，依赖缓存过期(小于1天)后全量刷新一次，保证指标的最后更新时间按天更新
+        fingerprint_timeout = settings.TIME_SERIES_METRIC_FINGERPRINT_TIMEOUT
+        fingerprint = self.get_metrics_fingerprint(metrics_info)
+        if fingerprint_timeout and cache.get(self.metrics_fingerprint_cache_key) == fingerprint:
+            logger.debug("TimeSeriesGroup<%s> metrics not changed, skip update", self.pk)
+            return False
+
         # 记录是否有更新，然后推送redis并发布通知
         is_updated = self.update_metrics(metrics_info)
         logger.debug("TimeSeriesGroup<%s> already updated all metrics", self.pk)
+        if fingerprint_timeout:
+            cache.set(self.metrics_fingerprint_cache_key, fingerprint, fingerprint_timeout)
 
         return is_updated
 
@@ -527,6 +605,7 @@ class TimeSeriesGroup(CustomGroupBase):
             )
         )
         metrics_queryset.delete()
+        self.clear_metrics_fingerprint()
         logger.info("all metrics about {}->[{}] is deleted.".format(self.__class__.__name__, self.time_series_group_id))
 
     @classmethod
@@ -606,7 +685,7 @@ class TimeSeriesGroup(CustomGroupBase):
         :param data_label: 数据标签
         :return: True or raise
         """
-        return self.modify_custom_group(
+        result = self.modify_custom_group(
             operator=operator,
             custom_group_name=time_series_group_name,
             label=label,
@@ -616,6 +695,10 @@ class TimeSeriesGroup(CustomGroupBase):
             enable_field_black_list=enable_field_black_list,
             data_label=data_label,
         )
+        # 自动发现开关变更后，指标的启停状态需要重新计算，不能因为指纹未变化而跳过
+        if enable_field_black_list is not None:
+            self.clear_metrics_fingerprint()
+        return result
 
     @atomic(config.DATABASE_CONNECTION_NAME)
     def delete_time_series_group(self, operator):
@@ -887,6 +887,49 @@ class DataSource(models.Model):
             "data_id->[{}] has update config to ->[{}] success".format(self.bk_data_id, self.consul_config_path)
         )
 
+    @classmethod
+    def batch_refresh_consul_config(cls, datasource_list: List["DataSource"]):
+        """
+        批量更新consul配置，按照transfer集群分组，每个集群只读取一次consul并且仅写入有变化的配置
+        :param datasource_list: 数据源列表
+        :return: 写入成功的数据源ID列表
+        """
+        # {transfer集群: {consul路径: 配置}}
+        cluster_kvs = {}
+        path_to_data_id = {}
+        for datasource in datasource_list:
+            if not datasource.is_enable or datasource.bk_data_id in IGNORED_CONSUL_SYNC_DATA_IDS:
+                continue
+            try:
+                value = datasource.to_json(is_consul_config=True)
+            except Exception:  # noqa
+                logger.error(
+                    "data_id->[%s] failed to generate consul config for->[%s]",
+                    datasource.bk_data_id,
+                    traceback.format_exc(),
+                )
+                continue
+            cluster_kvs.setdefault(datasource.transfer_cluster_id, {})[datasource.consul_config_path] = value
+            path_to_data_id[datasource.consul_config_path] = datasource.bk_data_id
+
+        hash_consul = consul_tools.HashConsul()
+        updated_data_ids = []
+        for transfer_cluster_id, kvs in cluster_kvs.items():
+            prefix = config.CONSUL_DATA_ID_PATH_FORMAT.format(transfer_cluster_id=transfer_cluster_id, data_id="")
+            try:
+                updated_keys = hash_consul.batch_put(prefix=prefix, kvs=kvs)
+            except Exception:  # noqa
+                logger.error(
+                    "transfer_cluster_id->[%s] failed to batch refresh consul config for->[%s]",
+                    transfer_cluster_id,
+                    traceback.format_exc(),
+                )
+                continue
+            updated_data_ids.extend(path_to_data_id[key] for key in updated_keys)
+
+        logger.info("data_id->[%s] has update config to consul success", updated_data_ids)
+        return updated_data_ids
+
     def create_mq(self):
         """
         初始化准备消息队列环境，预期中获取消息队列的配置，创建之
@@ -96,6 +96,14 @@ RESULT_TABLE_DETAIL_KEY = os.environ.get("RESULT_TABLE_DETAIL_KEY", f"{SPACE_RED
 RESULT_TABLE_DETAIL_CHANNEL = os.environ.get(
     "RESULT_TABLE_DETAIL_CHANNEL", f"{SPACE_REDIS_PREFIX_KEY}:result_table_detail:channel"
 )
+# 待增量刷新路由的空间及结果表
+SPACE_ROUTER_DIRTY_SPACE_KEY = f"{SPACE_REDIS_PREFIX_KEY}:router:dirty_space"
+SPACE_ROUTER_DIRTY_TABLE_KEY = f"{SPACE_REDIS_PREFIX_KEY}:router:dirty_table"
+# 正在增量刷新路由的空间及结果表
+SPACE_ROUTER_PROCESSING_SPACE_KEY = f"{SPACE_REDIS_PREFIX_KEY}:router:processing_space"
+SPACE_ROUTER_PROCESSING_TABLE_KEY = f"{SPACE_REDIS_PREFIX_KEY}:router:processing_table"
+# 最近一次全量刷新路由的时间
+SPACE_ROUTER_FULL_REFRESH_KEY = f"{SPACE_REDIS_PREFIX_KEY}:router:last_full_refresh"
 
 
 class EtlConfigs(Enum):
@@ -12,7 +12,7 @@ specific language governing permissions and limitations under the License.
 import datetime
 import json
 import logging
-from typing import Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from django.conf import settings
 from django.db.models import Q
@@ -30,6 +30,10 @@ from metadata.models.space.constants import (
     P4_1001_TABLE_ID_PREFIX,
     RESULT_TABLE_DETAIL_CHANNEL,
     RESULT_TABLE_DETAIL_KEY,
+    SPACE_ROUTER_DIRTY_SPACE_KEY,
+    SPACE_ROUTER_DIRTY_TABLE_KEY,
+    SPACE_ROUTER_PROCESSING_SPACE_KEY,
+    SPACE_ROUTER_PROCESSING_TABLE_KEY,
     SPACE_TO_RESULT_TABLE_CHANNEL,
     SPACE_TO_RESULT_TABLE_KEY,
     BCSClusterTypes,
@@ -51,6 +55,19 @@ from metadata.utils.redis_tools import RedisTools
 
 logger = logging.getLogger("metadata")
 
+# 增量刷新时，每次读写 redis 的 field 数量
+ROUTER_FIELD_CHUNK_SIZE = 500
+
+
+def mark_dirty_spaces(spaces: List[Tuple[str, str]]):
+    """标记需要增量刷新路由的空间"""
+    RedisTools.sadd(SPACE_ROUTER_DIRTY_SPACE_KEY, [f"{space_type}__{space_id}" for space_type, space_id in spaces])
+
+
+def mark_dirty_table_ids(table_ids: List[str]):
+    """标记需要增量刷新路由的结果表"""
+    RedisTools.sadd(SPACE_ROUTER_DIRTY_TABLE_KEY, list(table_ids))
+
 
 class SpaceTableIDRedis:
     """空间路由结果表数据推送 redis 相关功能"""
@@ -79,8 +96,12 @@ class SpaceTableIDRedis:
         data_label_list: Optional[List] = None,
         table_id_list: Optional[List] = None,
         is_publish: Optional[bool] = False,
+        only_changed: Optional[bool] = False,
     ):
-        """推送 data_label 及对应的结果表"""
+        """推送 data_label 及对应的结果表
+
+        :param only_changed: 是否仅写入并通知内容有变化的数据
+        """
         logger.info(
             "start to push data_label table_id data, data_label_list: %s, table_id_list: %s",
             json.dumps(data_label_list),
@@ -108,7 +129,11 @@ class SpaceTableIDRedis:
         for data in rt_dl_qs:
             rt_dl_map.setdefault(data["data_label"], []).append(data["table_id"])
 
-        if rt_dl_map:
+        if rt_dl_map and only_changed:
+            self._push_changed_fields(
+                DATA_LABEL_TO_RESULT_TABLE_KEY, DATA_LABEL_TO_RESULT_TABLE_CHANNEL, rt_dl_map, is_publish
+            )
+        elif rt_dl_map:
             redis_values = {data_label: json.dumps(table_ids) for data_label, table_ids in rt_dl_map.items()}
             RedisTools.hmset_to_redis(DATA_LABEL_TO_RESULT_TABLE_KEY, redis_values)
 
@@ -116,8 +141,16 @@ class SpaceTableIDRedis:
                 RedisTools.publish(DATA_LABEL_TO_RESULT_TABLE_CHANNEL, list(rt_dl_map.keys()))
         logger.info("push redis data_label_to_result_table")
 
-    def push_table_id_detail(self, table_id_list: Optional[List] = None, is_publish: Optional[bool] = False):
-        """推送结果表的详细信息"""
+    def push_table_id_detail(
+        self,
+        table_id_list: Optional[List] = None,
+        is_publish: Optional[bool] = False,
+        only_changed: Optional[bool] = False,
+    ):
+        """推送结果表的详细信息
+
+        :param only_changed: 是否仅写入并通知内容有变化的数据
+        """
         logger.info("start to push table_id detail data, table_id_list: %s", json.dumps(table_id_list))
         table_id_detail = get_table_info_for_influxdb_and_vm(table_id_list)
         if not table_id_detail:
@@ -157,15 +190,182 @@ class SpaceTableIDRedis:
             detail["bcs_cluster_id"] = table_id_cluster_id.get(table_id) or ""
             detail["data_label"] = _table_id_dict.get(table_id, {}).get("data_label") or ""
             detail["bk_data_id"] = table_id_data_id.get(table_id, 0)
-            _table_id_detail[table_id] = json.dumps(detail)
+            _table_id_detail[table_id] = detail
 
         # 推送数据
-        if _table_id_detail:
+        if _table_id_detail and only_changed:
+            self._push_changed_fields(
+                RESULT_TABLE_DETAIL_KEY, RESULT_TABLE_DETAIL_CHANNEL, _table_id_detail, is_publish
+            )
+        elif _table_id_detail:
+            _table_id_detail = {table_id: json.dumps(detail) for table_id, detail in _table_id_detail.items()}
             RedisTools.hmset_to_redis(RESULT_TABLE_DETAIL_KEY, _table_id_detail)
             if is_publish:
                 RedisTools.publish(RESULT_TABLE_DETAIL_CHANNEL, list(_table_id_detail.keys()))
         logger.info("push redis result_table_detail")
 
+    def push_multi_space_table_ids(
+        self, spaces: List[Tuple[str, str]], is_publish: Optional[bool] = False, is_parallel: Optional[bool] = False
+    ) -> List[str]:
+        """批量推送空间及对应的结果表，仅写入并通知内容有变化的空间
+
+        :param spaces: [(space_type, space_id)]
+        :param is_parallel: 是否分组并发计算，空间较多时使用
+        :return: 内容有变化的空间 UID
+        """
+        from metadata.task.utils import bulk_handle
+
+        space_values = {}
+
+        def compose(space_chunk: List[Tuple[str, str]]):
+            for space_type, space_id in space_chunk:
+                try:
+                    _values = self._compose_space_table_ids(space_type, space_id)
+                except Exception as e:
+                    logger.error(
+                        "compose space table_id error, space_type: %s, space_id: %s, %s", space_type, space_id, e
+                    )
+                    continue
+                if _values:
+                    space_values[f"{space_type}__{space_id}"] = _values
+
+        if is_parallel and spaces:
+            bulk_handle(compose, spaces)
+        else:
+            compose(spaces)
+
+        return self._push_changed_fields(
+            SPACE_TO_RESULT_TABLE_KEY, SPACE_TO_RESULT_TABLE_CHANNEL, space_values, is_publish
+        )
+
+    def push_space_router_incrementally(self, is_full: Optional[bool] = False, is_publish: Optional[bool] = True):
+        """增量推送空间路由
+
+        仅重新计算被标记变更的空间及结果表，并且只写入和通知内容有变化的数据
+        :param is_full: 是否计算所有的空间及结果表，用于定期校准未被标记的变更
+        :param is_publish: 是否通知使用方
+        """
+        # 先将标记转移到处理中的集合再读取，处理期间新增的标记保留在原集合中等待下次处理
+        # 处理失败时处理中的集合不会被删除，下次处理时合并
+        dirty_spaces = self._decode_members(
+            RedisTools.move_members(SPACE_ROUTER_DIRTY_SPACE_KEY, SPACE_ROUTER_PROCESSING_SPACE_KEY)
+        )
+        dirty_table_ids = self._decode_members(
+            RedisTools.move_members(SPACE_ROUTER_DIRTY_TABLE_KEY, SPACE_ROUTER_PROCESSING_TABLE_KEY)
+        )
+        logger.info(
+            "start to push space router incrementally, is_full: %s, dirty space count: %s, dirty table_id count: %s",
+            is_full,
+            len(dirty_spaces),
+            len(dirty_table_ids),
+        )
+
+        if not (is_full or dirty_spaces or dirty_table_ids):
+            return
+
+        table_id_list = list(dirty_table_ids)
+        spaces = {tuple(space_uid.split("__", 1)) for space_uid in dirty_spaces}
+        table_id_spaces = None if is_full else self._get_spaces_by_table_ids(table_id_list)
+        # 无法确定影响范围时，计算所有的空间
+        is_all_spaces = table_id_spaces is None
+        if is_all_spaces:
+            spaces = set(models.Space.objects.values_list("space_type_id", "space_id"))
+        else:
+            spaces |= table_id_spaces
+
+        # 计算所有空间时分组并发计算，与全量推送保持一致
+        changed_spaces = self.push_multi_space_table_ids(list(spaces), is_publish=is_publish, is_parallel=is_all_spaces)
+        # NOTE: 结果表为空时表示所有的结果表，仅全量时才需要计算
+        if is_full or table_id_list:
+            table_id_list = None if is_full else table_id_list
+            self.push_data_label_table_ids(table_id_list=table_id_list, is_publish=is_publish, only_changed=True)
+            self.push_table_id_detail(table_id_list=table_id_list, is_publish=is_publish, only_changed=True)
+
+        # 处理完成后再删除处理中的标记
+        RedisTools.delete(SPACE_ROUTER_PROCESSING_SPACE_KEY, SPACE_ROUTER_PROCESSING_TABLE_KEY)
+        logger.info(
+            "push space router incrementally successfully, space count: %s, changed space count: %s",
+            len(spaces),
+            len(changed_spaces),
+        )
+
+    def _get_spaces_by_table_ids(self, table_id_list: List[str]) -> Optional[Set[Tuple[str, str]]]:
+        """获取结果表影响的空间，无法确定影响范围时返回 None"""
+        if not table_id_list:
+            return set()
+
+        # 全空间或者跨空间使用的结果表，影响所有的空间
+        global_prefixes = (
+            BKCI_SYSTEM_TABLE_ID_PREFIX,
+            BKCI_1001_TABLE_ID_PREFIX,
+            DBM_1001_TABLE_ID_PREFIX,
+            P4_1001_TABLE_ID_PREFIX,
+        )
+        for table_id in table_id_list:
+            if table_id in ALL_SPACE_TYPE_TABLE_ID_LIST or table_id.startswith(global_prefixes):
+                return None
+
+        data_ids = set(
+            filter_model_by_in_page(
+                model=models.DataSourceResultTable,
+                field_op="table_id__in",
+                filter_data=table_id_list,
+                value_func="values_list",
+                value_field_list=["bk_data_id"],
+            )
+        )
+        if not data_ids:
+            return set()
+
+        # 平台级数据源及集群数据源被多个空间使用，影响所有的空间
+        if data_ids & set(utils.cached_cluster_data_id_list()):
+            return None
+        if models.DataSource.objects.filter(bk_data_id__in=data_ids, is_platform_data_id=True).exists():
+            return None
+
+        space_data_ids = filter_model_by_in_page(
+            model=models.SpaceDataSource,
+            field_op="bk_data_id__in",
+            filter_data=data_ids,
+            value_func="values",
+            value_field_list=["space_type_id", "space_id"],
+        )
+        return {(sd["space_type_id"], sd["space_id"]) for sd in space_data_ids}
+
+    def _push_changed_fields(
+        self, key: str, channel: str, field_values: Dict[str, Any], is_publish: Optional[bool] = False
+    ) -> List[str]:
+        """仅写入并通知内容有变化的 field
+
+        NOTE: 按照反序列化后的内容比对，避免字典顺序不同导致的误判
+        :return: 内容有变化的 field
+        """
+        fields = list(field_values.keys())
+        changed_values = {}
+        for start in range(0, len(fields), ROUTER_FIELD_CHUNK_SIZE):
+            chunk = fields[start : start + ROUTER_FIELD_CHUNK_SIZE]
+            for field, old_value in zip(chunk, RedisTools.hmget(key, chunk)):
+                try:
+                    if old_value is not None and json.loads(old_value) == field_values[field]:
+                        continue
+                except ValueError:
+                    pass
+                changed_values[field] = json.dumps(field_values[field])
+
+        changed_fields = list(changed_values.keys())
+        for start in range(0, len(changed_fields), ROUTER_FIELD_CHUNK_SIZE):
+            chunk = changed_fields[start : start + ROUTER_FIELD_CHUNK_SIZE]
+            RedisTools.hmset_to_redis(key, {field: changed_values[field] for field in chunk})
+
+        if is_publish and changed_fields:
+            RedisTools.publish(channel, changed_fields)
+        logger.info("push redis key: %s, total: %s, changed: %s", key, len(fields), len(changed_fields))
+        return changed_fields
+
+    @staticmethod
+    def _decode_members(members: Optional[Set]) -> Set[str]:
+        return {member.decode("utf-8") if isinstance(member, bytes) else member for member in members or []}
+
     def _push_bkcc_space_table_ids(
         self,
         space_type: str,
@@ -192,14 +392,7 @@ class SpaceTableIDRedis:
     ):
         """推送 bcs 类型空间下的关联业务的数据"""
         logger.info("start to push biz of bcs space table_id, space_type: %s, space_id: %s", space_type, space_id)
-        _values = self._compose_bcs_space_biz_table_ids(space_type, space_id)
-        _values.update(self._compose_bcs_space_cluster_table_ids(space_type, space_id))
-        _values.update(self._compose_bkci_level_table_ids(space_type, space_id))
-        _values.update(self._compose_bkci_other_table_ids(space_type, space_id))
-        # 追加跨空间类型的数据源授权
-        _values.update(self._compose_bkci_cross_table_ids(space_type, space_id))
-        # 追加特殊的允许全空间使用的数据源
-        _values.update(self._compose_all_type_table_ids(space_type, space_id))
+        _values = self._compose_bkci_space_table_ids(space_type, space_id)
         # 推送数据
         if _values:
             redis_values = {f"{space_type}__{space_id}": json.dumps(_values)}
@@ -218,11 +411,7 @@ class SpaceTableIDRedis:
     ):
         """推送 bksaas 类型空间下的数据"""
         logger.info("start to push bksaas space table_id, space_type: %s, space_id: %s", space_type, space_id)
-        _values = self._compose_bksaas_space_cluster_table_ids(space_type, space_id, table_id_list)
-        # 获取蓝鲸应用使用的集群数据
-        _values.update(self._compose_bksaas_other_table_ids(space_type, space_id, table_id_list))
-        # 追加特殊的允许全空间使用的数据源
-        _values.update(self._compose_all_type_table_ids(space_type, space_id))
+        _values = self._compose_bksaas_space_table_ids(space_type, space_id, table_id_list)
         if _values:
             redis_values = {f"{space_type}__{space_id}": json.dumps(_values)}
             RedisTools.hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values)
@@ -232,6 +421,40 @@ class SpaceTableIDRedis:
             space_id,
         )
 
+    def _compose_space_table_ids(self, space_type: str, space_id: str) -> Dict:
+        """组装空间关联的结果表及过滤条件"""
+        space_id = str(space_id)
+        if space_type == SpaceTypes.BKCC.value:
+            return self._compose_data(space_type, space_id)
+        elif space_type == SpaceTypes.BKCI.value:
+            return self._compose_bkci_space_table_ids(space_type, space_id)
+        elif space_type == SpaceTypes.BKSAAS.value:
+            return self._compose_bksaas_space_table_ids(space_type, space_id)
+        return {}
+
+    def _compose_bkci_space_table_ids(self, space_type: str, space_id: str) -> Dict:
+        """组装 bkci 类型空间的数据，包含集群+业务+构建机+其它"""
+        _values = self._compose_bcs_space_biz_table_ids(space_type, space_id)
+        _values.update(self._compose_bcs_space_cluster_table_ids(space_type, space_id))
+        _values.update(self._compose_bkci_level_table_ids(space_type, space_id))
+        _values.update(self._compose_bkci_other_table_ids(space_type, space_id))
+        # 追加跨空间类型的数据源授权
+        _values.update(self._compose_bkci_cross_table_ids(space_type, space_id))
+        # 追加特殊的允许全空间使用的数据源
+        _values.update(self._compose_all_type_table_ids(space_type, space_id))
+        return _values
+
+    def _compose_bksaas_space_table_ids(
+        self, space_type: str, space_id: str, table_id_list: Optional[List] = None
+    ) -> Dict:
+        """组装 bksaas 类型空间的数据"""
+        _values = self._compose_bksaas_space_cluster_table_ids(space_type, space_id, table_id_list)
+        # 获取蓝鲸应用使用的集群数据
+        _values.update(self._compose_bksaas_other_table_ids(space_type, space_id, table_id_list))
+        # 追加特殊的允许全空间使用的数据源
+        _values.update(self._compose_all_type_table_ids(space_type, space_id))
+        return _values
+
     def _compose_bcs_space_biz_table_ids(self, space_type: str, space_id: str) -> Dict:
         """推送 bcs 类型关联业务的数据，现阶段仅包含主机信息"""
         logger.info("start to push cluster of bcs space table_id, space_type: %s, space_id: %s", space_type, space_id)
@@ -1259,6 +1259,25 @@ class InfluxDBStorage(models.Model, StorageResultTable, InfluxDBTool):
         if is_version_refresh:
             consul_tools.refresh_router_version()
 
+    @classmethod
+    def batch_refresh_consul_cluster_config(cls, storages):
+        """
+        批量刷新consul上的集群信息，consul只读取一次并且仅写入有变化的路由
+        :param storages: InfluxDBStorage 列表
+        :return: None
+        """
+        storages = list(storages)
+        hash_consul = consul_tools.HashConsul()
+        hash_consul.batch_put(
+            prefix=cls.CONSUL_CONFIG_CLUSTER_PATH,
+            kvs={storage.consul_cluster_path: storage.consul_cluster_config for storage in storages},
+        )
+        logger.info("[%s] result_tables refresh cluster_info to consul success.", len(storages))
+
+        # TODO: 待推送 redis 数据稳定后，删除推送 consul 功能
+        for index, storage in enumerate(storages, 1):
+            storage.push_redis_data(is_publish=(index == len(storages)))
+
     def get_metric_map(self):
         """
         获取metric及tag信息
@@ -12,11 +12,28 @@ specific language governing permissions and limitations under the License.
 
 import logging
 
-from django.db.models.signals import post_save, pre_delete
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
 from bkmonitor.utils import consul
-from metadata.models import DataSource, InfluxDBHostInfo, InfluxDBStorage
+from metadata.models import (
+    AccessVMRecord,
+    DataSource,
+    DataSourceResultTable,
+    InfluxDBHostInfo,
+    InfluxDBStorage,
+    ResultTable,
+    ResultTableField,
+    Space,
+    SpaceDataSource,
+    SpaceResource,
+)
+from metadata.models.space.space_table_id_redis import (
+    mark_dirty_spaces,
+    mark_dirty_table_ids,
+)
 
 logger = logging.getLogger("metadata")
 
@@ -73,3 +90,73 @@ def refresh_influxdb_host(sender, instance, using, **kwargs):
         return
 
     logger.info("influxdb host -> [%s] refresh consul and redis end", instance.host_name)
+
+
+def _on_commit_mark_dirty(using, func, *args):
+    """事务提交后再标记，避免增量刷新时读取到未提交的数据"""
+
+    def _mark():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("mark space router dirty error")
+
+    transaction.on_commit(_mark, using=using)
+
+
+@receiver(post_save, sender=Space)
+@receiver(post_delete, sender=Space)
+@receiver(post_save, sender=SpaceDataSource)
+@receiver(post_delete, sender=SpaceDataSource)
+@receiver(post_save, sender=SpaceResource)
+@receiver(post_delete, sender=SpaceResource)
+def mark_space_router_dirty_by_space(sender, instance, using, **kwargs):
+    """空间及空间关联的资源变动时，标记空间需要增量刷新路由"""
+    if not settings.SPACE_ROUTER_INCREMENTAL_ENABLED:
+        return
+    _on_commit_mark_dirty(using, mark_dirty_spaces, [(instance.space_type_id, instance.space_id)])
+
+
+@receiver(post_save, sender=ResultTable)
+@receiver(post_delete, sender=ResultTable)
+@receiver(post_save, sender=ResultTableField)
+@receiver(post_delete, sender=ResultTableField)
+@receiver(post_save, sender=InfluxDBStorage)
+@receiver(post_delete, sender=InfluxDBStorage)
+def mark_space_router_dirty_by_table(sender, instance, using, **kwargs):
+    """结果表及其存储变动时，标记结果表需要增量刷新路由"""
+    if not settings.SPACE_ROUTER_INCREMENTAL_ENABLED:
+        return
+    _on_commit_mark_dirty(using, mark_dirty_table_ids, [instance.table_id])
+
+
+@receiver(post_save, sender=AccessVMRecord)
+@receiver(post_delete, sender=AccessVMRecord)
+def mark_space_router_dirty_by_vm_record(sender, instance, using, **kwargs):
+    if not settings.SPACE_ROUTER_INCREMENTAL_ENABLED:
+        return
+    _on_commit_mark_dirty(using, mark_dirty_table_ids, [instance.result_table_id])
+
+
+@receiver(post_save, sender=DataSourceResultTable)
+@receiver(post_delete, sender=DataSourceResultTable)
+def mark_space_router_dirty_by_data_source_result_table(sender, instance, using, **kwargs):
+    """数据源和结果表关系变动时，同时标记数据源所属的空间，避免删除关系后无法找到受影响的空间"""
+    if not settings.SPACE_ROUTER_INCREMENTAL_ENABLED:
+        return
+    spaces = list(
+        SpaceDataSource.objects.filter(bk_data_id=instance.bk_data_id).values_list("space_type_id", "space_id")
+    )
+    _on_commit_mark_dirty(using, mark_dirty_table_ids, [instance.table_id])
+    _on_commit_mark_dirty(using, mark_dirty_spaces, spaces)
+
+
+@receiver(post_save, sender=DataSource)
+def mark_space_router_dirty_by_data_source(sender, instance, using, **kwargs):
+    """数据源变动时(如平台级标记、归属空间)，标记其关联的结果表需要增量刷新路由"""
+    if not settings.SPACE_ROUTER_INCREMENTAL_ENABLED:
+        return
+    table_ids = list(
+        DataSourceResultTable.objects.filter(bk_data_id=instance.bk_data_id).values_list("table_id", flat=True)
+    )
+    _on_commit_mark_dirty(using, mark_dirty_table_ids, table_ids)
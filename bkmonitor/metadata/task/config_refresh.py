@@ -81,11 +81,7 @@ def refresh_influxdb_route():
         models.InfluxDBClusterInfo.refresh_consul_cluster_config()
         logger.debug("influxdb cluster refresh consul config success.")
 
-        index = models.InfluxDBStorage.objects.count()
-        for result_table in models.InfluxDBStorage.objects.all():
-            index -= 1
-            result_table.refresh_consul_cluster_config(is_publish=(index == 0))
-            logger.debug("result_table->[%s] refresh consul config success." % result_table.table_id)
+        models.InfluxDBStorage.batch_refresh_consul_cluster_config(models.InfluxDBStorage.objects.all())
 
         # 更新 vm router
         models.AccessVMRecord.refresh_vm_router()
@@ -159,15 +155,17 @@ def refresh_datasource():
     ).values_list("table_id", flat=True)
     # 过滤到对应的数据源 ID
     ds_with_rt = {data_id for rt, data_id in ds_rt_map.items() if rt in enabled_rts}
+    datasource_list = []
     for datasource in models.DataSource.objects.filter(is_enable=True, bk_data_id__in=ds_with_rt).order_by(
         "-last_modify_time"
     ):
         try:
             # 更新前，需要从DB读取一次最新的数据，避免脏数据读写
             datasource.clean_cache()
-            # 2. 更新ETL及datasource的配置
-            datasource.refresh_outer_config()
-            logger.debug("data_id->[%s] refresh all outer success" % datasource.bk_data_id)
+            # 2. 更新GSE的配置
+            datasource.refresh_gse_config()
+            datasource_list.append(datasource)
+            logger.debug("data_id->[%s] refresh gse config success" % datasource.bk_data_id)
         except Exception:
             logger.error(
                 "data_id->[{}] failed to refresh outer config for->[{}]".format(
@@ -175,6 +173,9 @@ def refresh_datasource():
                 )
             )
 
+    # 3. 批量更新ETL及datasource的consul配置
+    models.DataSource.batch_refresh_consul_config(datasource_list)
+
 
 @share_lock(identify="metadata_refreshKafkaStorage")
 def refresh_kafka_storage():
@@ -24,6 +24,7 @@ from metadata.models.constants import BULK_CREATE_BATCH_SIZE, BULK_UPDATE_BATCH_
 from metadata.models.space import Space, SpaceDataSource, SpaceResource
 from metadata.models.space.constants import (
     SKIP_DATA_ID_LIST_FOR_BKCC,
+    SPACE_ROUTER_FULL_REFRESH_KEY,
     SYSTEM_USERNAME,
     BCSClusterTypes,
     SpaceTypes,
@@ -626,7 +627,18 @@ def push_and_publish_space_router(
 def push_and_publish_space_router_task():
     logger.info("start to push and publish space router")
 
-    push_and_publish_space_router(is_publish=False)
+    if not settings.SPACE_ROUTER_INCREMENTAL_ENABLED:
+        push_and_publish_space_router(is_publish=False)
+        logger.info("push and publish space router successfully")
+        return
+
+    from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
+
+    # 增量刷新仅处理被标记变更的空间及结果表，定期全量计算一次，校准未被标记的变更(如批量更新)
+    is_full = not RedisTools.get(SPACE_ROUTER_FULL_REFRESH_KEY)
+    SpaceTableIDRedis().push_space_router_incrementally(is_full=is_full, is_publish=True)
+    if is_full:
+        RedisTools.set(SPACE_ROUTER_FULL_REFRESH_KEY, int(time.time()), ex=settings.SPACE_ROUTER_FULL_REFRESH_INTERVAL)
 
     logger.info("push and publish space router successfully")
 
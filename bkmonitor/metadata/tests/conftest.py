@@ -213,6 +213,10 @@ class HashConsulMocker(object):
     def put(self, key, value):
         self.result_list.update({key: value})
 
+    def batch_put(self, prefix, kvs, is_force_update=False):
+        self.result_list.update(kvs)
+        return list(kvs)
+
     def delete(self, key, recurse=None):
         # 增加递归处理
         if recurse is True:
@@ -9,8 +9,12 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
+import json
+import time
 
+import fakeredis
 import pytest
+from django.core.cache import cache
 
 from metadata import models
 
@@ -178,3 +182,76 @@ def test_delete_ts_metrics(create_and_delete_records):
 
     objs = models.TimeSeriesMetric.objects.filter(group_id=DEFAULT_GROUP_ID, field_name="disk_usage1")
     assert not objs.exists()
+
+
+def test_iter_metrics_from_redis(mocker, settings):
+    settings.MAX_METRICS_FETCH_STEP = 2
+    client = fakeredis.FakeStrictRedis()
+    mocker.patch("metadata.models.custom_report.time_series.RedisClient.from_envs", return_value=client)
+    now = time.time()
+    # 部分指标的更新时间相同，游标需要跳过已经获取的指标
+    scores = {"metric_a": now - 10, "metric_b": now - 10, "metric_c": now - 10, "metric_d": now - 5, "metric_e": now}
+    client.zadd(f"{settings.METRICS_KEY_PREFIX}1", scores)
+    client.hmset(
+        f"{settings.METRIC_DIMENSIONS_KEY_PREFIX}1",
+        {
+            metric: json.dumps({"dimensions": {"endpoint": {"last_update_time": int(now), "values": []}}})
+            for metric in scores
+            if metric != "metric_d"
+        },
+    )
+
+    group = models.TimeSeriesGroup(bk_data_id=1)
+    batches = list(group.iter_metrics_from_redis(expired_time=60))
+    assert [len(batch) for batch in batches] == [2, 1, 1]
+    # 缺少维度信息的指标被忽略
+    metrics_info = group.get_metrics_from_redis(expired_time=60)
+    assert [m["field_name"] for m in metrics_info] == ["metric_a", "metric_b", "metric_c", "metric_e"]
+    assert metrics_info[0]["tag_value_list"] == {"endpoint": {"last_update_time": int(now), "values": []}}
+
+
+def test_update_time_series_metrics_skip_unchanged(mocker, settings):
+    settings.TIME_SERIES_METRIC_FINGERPRINT_TIMEOUT = 60
+    group = models.TimeSeriesGroup(bk_data_id=1, table_id=DEFAULT_TABLE_ID, time_series_group_id=DEFAULT_GROUP_ID)
+    cache.delete(group.metrics_fingerprint_cache_key)
+    metrics_info = [
+        {
+            "field_name": "disk_usage",
+            "tag_value_list": {"disk_name": {"last_update_time": 1701506528, "values": None}},
+            "last_modify_time": 1701506528,
+        }
+    ]
+    mocker.patch.object(models.TimeSeriesGroup, "get_metrics_from_redis", return_value=metrics_info)
+    update_metrics = mocker.patch.object(models.TimeSeriesGroup, "update_metrics", return_value=True)
+
+    assert group.update_time_series_metrics() is True
+    # 指标及维度没有变化时，不再更新 DB
+    metrics_info[0]["last_modify_time"] = 1701506529
+    assert group.update_time_series_metrics() is False
+    assert update_metrics.call_count == 1
+
+    # 维度变化后重新更新
+    metrics_info[0]["tag_value_list"]["bk_target_ip"] = {"last_update_time": 1701506529, "values": None}
+    assert group.update_time_series_metrics() is True
+    assert update_metrics.call_count == 2
+    cache.delete(group.metrics_fingerprint_cache_key)
+
+
+def test_clear_metrics_fingerprint(mocker, settings):
+    settings.TIME_SERIES_METRIC_FINGERPRINT_TIMEOUT = 60
+    group = models.TimeSeriesGroup(bk_data_id=1, table_id=DEFAULT_TABLE_ID, time_series_group_id=DEFAULT_GROUP_ID)
+    mocker.patch.object(models.TimeSeriesGroup, "modify_custom_group", return_value=True)
+
+    # 非自动发现开关的变更不影响指纹缓存
+    cache.set(group.metrics_fingerprint_cache_key, "fingerprint", 60)
+    group.modify_time_series_group(operator="admin", label="other")
+    assert cache.get(group.metrics_fingerprint_cache_key) == "fingerprint"
+
+    # 自动发现开关变更后清理指纹缓存
+    group.modify_time_series_group(operator="admin", enable_field_black_list=False)
+    assert cache.get(group.metrics_fingerprint_cache_key) is None
+
+    # 删除指标后清理指纹缓存
+    cache.set(group.metrics_fingerprint_cache_key, "fingerprint", 60)
+    group.remove_metrics()
+    assert cache.get(group.metrics_fingerprint_cache_key) is None
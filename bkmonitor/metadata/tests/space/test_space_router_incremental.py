@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import pytest
+from mockredis import mock_redis_client
+
+from metadata.models.space.constants import (
+    SPACE_ROUTER_DIRTY_SPACE_KEY,
+    SPACE_ROUTER_DIRTY_TABLE_KEY,
+    SPACE_ROUTER_PROCESSING_SPACE_KEY,
+    SPACE_ROUTER_PROCESSING_TABLE_KEY,
+    SPACE_TO_RESULT_TABLE_CHANNEL,
+    SPACE_TO_RESULT_TABLE_KEY,
+)
+from metadata.models.space.space_table_id_redis import (
+    SpaceTableIDRedis,
+    mark_dirty_spaces,
+    mark_dirty_table_ids,
+)
+
+
+@pytest.fixture
+def redis_client(mocker):
+    client = mock_redis_client()
+    mocker.patch("metadata.utils.redis_tools.RedisTools.metadata_redis_client", client)
+    published = []
+    mocker.patch(
+        "metadata.utils.redis_tools.RedisTools.publish",
+        side_effect=lambda channel, msg_list: published.extend((channel, msg) for msg in msg_list),
+    )
+    client.published = published
+    return client
+
+
+def test_push_changed_fields(redis_client):
+    client = SpaceTableIDRedis()
+    values = {
+        "bkcc__1": {"demo.test": {"filters": [{"bk_biz_id": "1"}]}, "demo.test1": {"filters": []}},
+        "bkcc__2": {"demo.test": {"filters": [{"bk_biz_id": "2"}]}},
+    }
+    assert client._push_changed_fields(
+        SPACE_TO_RESULT_TABLE_KEY, SPACE_TO_RESULT_TABLE_CHANNEL, values, is_publish=True
+    ) == ["bkcc__1", "bkcc__2"]
+
+    # 字典顺序不同但内容一致时，不重复写入
+    values["bkcc__1"] = {"demo.test1": {"filters": []}, "demo.test": {"filters": [{"bk_biz_id": "1"}]}}
+    values["bkcc__2"] = {"demo.test": {"filters": []}}
+    redis_client.published.clear()
+    assert client._push_changed_fields(
+        SPACE_TO_RESULT_TABLE_KEY, SPACE_TO_RESULT_TABLE_CHANNEL, values, is_publish=True
+    ) == ["bkcc__2"]
+    assert redis_client.published == [(SPACE_TO_RESULT_TABLE_CHANNEL, "bkcc__2")]
+    assert json.loads(redis_client.hget(SPACE_TO_RESULT_TABLE_KEY, "bkcc__2")) == values["bkcc__2"]
+
+
+def test_push_space_router_incrementally(redis_client, mocker):
+    mark_dirty_spaces([("bkcc", "1")])
+    mark_dirty_table_ids(["demo.test"])
+
+    client = SpaceTableIDRedis()
+    compose = mocker.patch.object(
+        client, "_compose_space_table_ids", side_effect=lambda space_type, space_id: {"demo.test": {"filters": []}}
+    )
+    mocker.patch.object(client, "_get_spaces_by_table_ids", return_value={("bkci", "test")})
+    push_data_label = mocker.patch.object(client, "push_data_label_table_ids")
+    push_detail = mocker.patch.object(client, "push_table_id_detail")
+
+    client.push_space_router_incrementally()
+
+    # 仅计算被标记的空间及结果表影响的空间
+    assert sorted(call[0] for call in compose.call_args_list) == [("bkcc", "1"), ("bkci", "test")]
+    push_data_label.assert_called_once_with(table_id_list=["demo.test"], is_publish=True, only_changed=True)
+    push_detail.assert_called_once_with(table_id_list=["demo.test"], is_publish=True, only_changed=True)
+    assert sorted(msg for _, msg in redis_client.published) == ["bkcc__1", "bkci__test"]
+    # 处理完成后移除标记
+    assert not redis_client.smembers(SPACE_ROUTER_DIRTY_SPACE_KEY)
+    assert not redis_client.smembers(SPACE_ROUTER_DIRTY_TABLE_KEY)
+    assert not redis_client.exists(SPACE_ROUTER_PROCESSING_SPACE_KEY)
+    assert not redis_client.exists(SPACE_ROUTER_PROCESSING_TABLE_KEY)
+
+    # 没有标记时不需要计算
+    compose.reset_mock()
+    push_data_label.reset_mock()
+    client.push_space_router_incrementally()
+    assert not compose.called
+    assert not push_data_label.called
+
+
+def test_push_space_router_incrementally_remark(redis_client, mocker):
+    mark_dirty_spaces([("bkcc", "1")])
+
+    client = SpaceTableIDRedis()
+
+    def compose(space_type, space_id):
+        # 处理期间空间再次变更
+        mark_dirty_spaces([("bkcc", "1")])
+        return {"demo.test": {"filters": []}}
+
+    mocker.patch.object(client, "_compose_space_table_ids", side_effect=compose)
+    client.push_space_router_incrementally()
+
+    # 处理期间新增的标记不会被移除
+    assert client._decode_members(redis_client.smembers(SPACE_ROUTER_DIRTY_SPACE_KEY)) == {"bkcc__1"}
+    assert not redis_client.exists(SPACE_ROUTER_PROCESSING_SPACE_KEY)
+
+
+def test_push_space_router_incrementally_failed(redis_client, mocker):
+    mark_dirty_spaces([("bkcc", "1")])
+    mark_dirty_table_ids(["demo.test"])
+
+    client = SpaceTableIDRedis()
+    compose = mocker.patch.object(
+        client, "_compose_space_table_ids", side_effect=lambda space_type, space_id: {"demo.test": {"filters": []}}
+    )
+    mocker.patch.object(client, "_get_spaces_by_table_ids", return_value=set())
+    mocker.patch.object(client, "push_table_id_detail")
+    push_data_label = mocker.patch.object(client, "push_data_label_table_ids", side_effect=Exception("failed"))
+    with pytest.raises(Exception):
+        client.push_space_router_incrementally()
+
+    # 处理失败时保留标记，下次处理时与新增的标记合并
+    mark_dirty_spaces([("bkcc", "2")])
+    push_data_label.reset_mock(side_effect=True)
+    compose.reset_mock()
+    client.push_space_router_incrementally()
+    assert sorted(call[0] for call in compose.call_args_list) == [("bkcc", "1"), ("bkcc", "2")]
+    push_data_label.assert_called_once_with(table_id_list=["demo.test"], is_publish=True, only_changed=True)
+    assert not redis_client.exists(SPACE_ROUTER_PROCESSING_SPACE_KEY)
+    assert not redis_client.exists(SPACE_ROUTER_PROCESSING_TABLE_KEY)
+
+
+def test_push_multi_space_table_ids_parallel(redis_client, mocker):
+    client = SpaceTableIDRedis()
+    mocker.patch.object(
+        client,
+        "_compose_space_table_ids",
+        side_effect=lambda space_type, space_id: {f"{space_id}.test": {"filters": []}},
+    )
+    spaces = [("bkcc", str(i)) for i in range(120)]
+    changed_spaces = client.push_multi_space_table_ids(spaces, is_publish=True, is_parallel=True)
+    assert sorted(changed_spaces) == sorted(f"bkcc__{i}" for i in range(120))
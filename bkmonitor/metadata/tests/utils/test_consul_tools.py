@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import base64
+import json
+
+import pytest
+
+from metadata.utils import consul_tools
+
+PREFIX = "test/metadata/v1/default/data_id/"
+
+
+class FakeKV(object):
+    def __init__(self, consul):
+        self.consul = consul
+
+    def get(self, key, recurse=False):
+        self.consul.get_count += 1
+        if not recurse:
+            item = self.consul.data.get(key)
+            return self.consul.index, dict(item, Key=key) if item else None
+        items = [dict(item, Key=k) for k, item in sorted(self.consul.data.items()) if k.startswith(key)]
+        return self.consul.index, items or None
+
+    def put(self, key, value):
+        self.consul.set(key, value)
+        return True
+
+
+class FakeTxn(object):
+    def __init__(self, consul):
+        self.consul = consul
+
+    def put(self, payload):
+        self.consul.txn_payloads.append(payload)
+        if len(payload) > consul_tools.HashConsul.TXN_MAX_OPS:
+            return {"Results": None, "Errors": [{"OpIndex": 0, "What": "too many operations"}]}
+        if len(json.dumps(payload)) > consul_tools.HashConsul.TXN_MAX_SIZE:
+            return {"Results": None, "Errors": [{"OpIndex": 0, "What": "request body too large"}]}
+        if any(operation["KV"]["Key"] in self.consul.fail_keys for operation in payload):
+            return {"Results": None, "Errors": [{"OpIndex": 0, "What": "failed"}]}
+
+        results = []
+        for operation in payload:
+            key = operation["KV"]["Key"]
+            self.consul.set(key, base64.b64decode(operation["KV"]["Value"]))
+            results.append({"KV": {"Key": key, "ModifyIndex": self.consul.data[key]["ModifyIndex"]}})
+        return {"Results": results, "Errors": None}
+
+
+class FakeConsul(object):
+    def __init__(self):
+        self.data = {}
+        self.index = 0
+        self.get_count = 0
+        self.txn_payloads = []
+        self.fail_keys = set()
+        self.kv = FakeKV(self)
+        self.txn = FakeTxn(self)
+
+    def set(self, key, value):
+        self.index += 1
+        self.data[key] = {"Value": value, "ModifyIndex": self.index}
+
+
+@pytest.fixture
+def fake_consul(mocker):
+    fake = FakeConsul()
+    mocker.patch("bkmonitor.utils.consul.BKConsul", return_value=fake)
+    mocker.patch.object(consul_tools.HashConsul, "_hash_index", {})
+    return fake
+
+
+def test_batch_put(fake_consul):
+    fake_consul.set(PREFIX + "1", json.dumps({"bk_data_id": 1}))
+    fake_consul.set(PREFIX + "2", json.dumps({"bk_data_id": 2}))
+    kvs = {PREFIX + str(i): {"bk_data_id": i} for i in range(1, 101)}
+    kvs[PREFIX + "2"] = {"bk_data_id": 2, "changed": True}
+
+    hash_consul = consul_tools.HashConsul()
+    updated_keys = hash_consul.batch_put(prefix=PREFIX, kvs=kvs)
+
+    # 仅写入有变化的key，并且按照事务的操作数限制分批写入
+    assert sorted(updated_keys) == sorted(set(kvs) - {PREFIX + "1"})
+    assert [len(payload) for payload in fake_consul.txn_payloads] == [64, 35]
+    assert fake_consul.get_count == 1
+    for key, value in kvs.items():
+        assert json.loads(fake_consul.data[key]["Value"]) == value
+
+    # 内容无变化时不再写入
+    assert hash_consul.batch_put(prefix=PREFIX, kvs=kvs) == []
+    assert len(fake_consul.txn_payloads) == 2
+
+    # consul上的内容被其他方修改后，以consul上的内容为准
+    fake_consul.set(PREFIX + "3", json.dumps({"bk_data_id": 0}))
+    assert hash_consul.batch_put(prefix=PREFIX, kvs=kvs) == [PREFIX + "3"]
+    assert json.loads(fake_consul.data[PREFIX + "3"]["Value"]) == {"bk_data_id": 3}
+
+
+def test_batch_put_force_update(fake_consul):
+    fake_consul.set(PREFIX + "1", json.dumps({"bk_data_id": 1}))
+
+    hash_consul = consul_tools.HashConsul()
+    assert hash_consul.batch_put(prefix=PREFIX, kvs={PREFIX + "1": {"bk_data_id": 1}}, is_force_update=True) == [
+        PREFIX + "1"
+    ]
+    # 强制更新时不需要读取consul
+    assert fake_consul.get_count == 0
+
+
+def test_batch_put_txn_failed(fake_consul):
+    kvs = {PREFIX + str(i): {"bk_data_id": i} for i in range(1, 101)}
+    fake_consul.fail_keys = {PREFIX + "1"}
+
+    hash_consul = consul_tools.HashConsul()
+    updated_keys = hash_consul.batch_put(prefix=PREFIX, kvs=kvs)
+
+    # 失败的事务整体回滚，不影响其他批次
+    assert len(updated_keys) == 36
+    assert PREFIX + "1" not in fake_consul.data
+
+    # 下次同步时重新写入失败的key
+    fake_consul.fail_keys = set()
+    assert len(hash_consul.batch_put(prefix=PREFIX, kvs=kvs)) == 64
+    assert len(fake_consul.data) == 100
+
+
+def test_batch_put_txn_max_size(fake_consul, mocker):
+    mocker.patch.object(consul_tools.HashConsul, "TXN_MAX_SIZE", 1024)
+    kvs = {PREFIX + str(i): {"bk_data_id": i, "name": "x" * 100} for i in range(1, 21)}
+    kvs[PREFIX + "big"] = {"bk_data_id": 0, "name": "x" * 1024}
+
+    hash_consul = consul_tools.HashConsul()
+    updated_keys = hash_consul.batch_put(prefix=PREFIX, kvs=kvs)
+
+    # 按照序列化后的请求体大小分批，超过限制的单个key被跳过
+    assert sorted(updated_keys) == sorted(set(kvs) - {PREFIX + "big"})
+    assert len(fake_consul.txn_payloads) > 1
+    assert all(len(json.dumps(payload)) <= 1024 for payload in fake_consul.txn_payloads)
+    assert PREFIX + "big" not in fake_consul.data
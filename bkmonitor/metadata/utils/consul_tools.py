@@ -10,10 +10,12 @@ specific language governing permissions and limitations under the License.
 """
 
 
+import base64
 import json
 import logging
+import threading
 import time
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from bkmonitor.utils import consul
 from metadata import config
@@ -43,6 +45,14 @@ class HashConsul(object):
     从而降低consul的刷新频率
     """
 
+    # consul 单个事务请求的最大操作数及请求体大小限制
+    TXN_MAX_OPS = 64
+    TXN_MAX_SIZE = 512 * 1024
+
+    # 进程内的哈希索引 {key: (ModifyIndex, 内容哈希)}，ModifyIndex 未变化时无需重新计算哈希
+    _hash_index: Dict[str, Tuple[int, Optional[str]]] = {}
+    _hash_index_lock = threading.Lock()
+
     def __init__(self, host="127.0.0.1", port=8500, scheme="http", verify=None, default_force=False):
         """
         初始化
@@ -60,12 +70,22 @@ class HashConsul(object):
 
         # 是否强行写
         self.default_force = default_force
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        consul 客户端，同一个实例内复用
+        """
+        if self._client is None:
+            self._client = consul.BKConsul(host=self.host, port=self.port, scheme=self.scheme, verify=self.verify)
+        return self._client
 
     def delete(self, key, recurse=None):
         """
         删除指定kv
         """
-        consul_client = consul.BKConsul(host=self.host, port=self.port, scheme=self.scheme, verify=self.verify)
+        consul_client = self.client
         consul_client.kv.delete(key, recurse)
         logger.info("key->[%s] has been deleted", key)
 
@@ -73,11 +93,11 @@ class HashConsul(object):
         """
         获取指定kv
         """
-        consul_client = consul.BKConsul(host=self.host, port=self.port, scheme=self.scheme, verify=self.verify)
+        consul_client = self.client
         return consul_client.kv.get(key)
 
     def list(self, key):
-        consul_client = consul.BKConsul(host=self.host, port=self.port, scheme=self.scheme, verify=self.verify)
+        consul_client = self.client
         return consul_client.kv.get(key, recurse=True)
 
     def put(self, key, value, is_force_update=False, bk_data_id: Optional[int] = None, *args, **kwargs):
@@ -89,7 +109,7 @@ class HashConsul(object):
         :param is_force_update: 是否需要强行更新
         :return: True | False
         """
-        consul_client = consul.BKConsul(host=self.host, port=self.port, scheme=self.scheme, verify=self.verify)
+        consul_client = self.client
 
         # 0. 是否有强行刷新的要求
         if self.default_force or is_force_update:
@@ -124,3 +144,119 @@ class HashConsul(object):
                 "new value hash->[%s] is different from the old hash->[%s], will updated it", new_hash, old_hash
             )
         return consul_client.kv.put(key=key, value=json.dumps(value), *args, **kwargs)
+
+    def get_prefix_hashes(self, prefix) -> Dict[str, Optional[str]]:
+        """
+        一次性读取前缀下的所有kv，返回各个key当前内容的哈希值
+        :param prefix: key前缀
+        :return: {key: 哈希值}, 内容无法解析时哈希值为None
+        """
+        items = self.client.kv.get(prefix, recurse=True)[1] or []
+
+        hashes = {}
+        with self._hash_index_lock:
+            for item in items:
+                key, modify_index = item["Key"], item.get("ModifyIndex")
+                cached = self._hash_index.get(key)
+                if modify_index is not None and cached is not None and cached[0] == modify_index:
+                    hashes[key] = cached[1]
+                    continue
+
+                try:
+                    value_hash = hash_util.object_md5(json.loads(item["Value"]))
+                except (TypeError, ValueError):
+                    value_hash = None
+                hashes[key] = value_hash
+                self._hash_index[key] = (modify_index, value_hash)
+
+            # 清理consul上已经不存在的key
+            for key in [key for key in self._hash_index if key.startswith(prefix) and key not in hashes]:
+                del self._hash_index[key]
+
+        return hashes
+
+    def _txn_put(self, operations: List[Dict[str, Any]], hashes: Dict[str, str]) -> List[str]:
+        """
+        通过事务写入一批kv，返回写入成功的key
+        """
+        keys = [operation["KV"]["Key"] for operation in operations]
+        try:
+            result = self.client.txn.put(operations)
+        except Exception as err:  # noqa
+            logger.exception("failed to put keys->[%s] to consul by txn, error: %s", keys, err)
+            result = {"Errors": [str(err)]}
+
+        with self._hash_index_lock:
+            if result.get("Errors"):
+                # 事务失败时整体回滚，清理索引，下次重新计算
+                logger.error("consul txn for keys->[%s] failed, errors: %s", keys, result["Errors"])
+                for key in keys:
+                    self._hash_index.pop(key, None)
+                return []
+
+            for item in result.get("Results") or []:
+                kv = item.get("KV") or {}
+                if kv.get("Key") in hashes:
+                    self._hash_index[kv["Key"]] = (kv.get("ModifyIndex"), hashes[kv["Key"]])
+        return keys
+
+    def batch_put(self, prefix, kvs: Dict[str, Any], is_force_update=False) -> List[str]:
+        """
+        批量更新同一前缀下的KV数据
+        前缀下的数据只读取一次，仅将内容有变化的key分批通过事务写入consul
+        :param prefix: key前缀，kvs中的key都需要以该前缀开头
+        :param kvs: {key: 内容}，内容期待传入的是字典或者数组
+        :param is_force_update: 是否需要强行更新
+        :return: 写入成功的key列表
+        """
+        if not kvs:
+            return []
+
+        is_force_update = self.default_force or is_force_update
+        old_hashes = {} if is_force_update else self.get_prefix_hashes(prefix)
+
+        # 1. 对比哈希值，筛选出需要更新的key
+        new_hashes = {}
+        for key, value in kvs.items():
+            new_hash = hash_util.object_md5(value)
+            if not is_force_update and old_hashes.get(key) == new_hash:
+                continue
+            new_hashes[key] = new_hash
+
+        if not new_hashes:
+            logger.debug("all keys under prefix->[%s] are same as the ones on consul, nothing will updated.", prefix)
+            return []
+
+        # 2. 按照事务的操作数及请求体大小限制分批写入
+        # 请求体为操作列表序列化后的json，"[]" 及操作间的分隔符 ", " 同样计入大小
+        updated_keys = []
+        operations, size = [], 2
+        for key in new_hashes:
+            value = base64.b64encode(json.dumps(kvs[key]).encode("utf-8")).decode("utf-8")
+            operation = {"KV": {"Verb": "set", "Key": key, "Value": value}}
+            operation_size = len(json.dumps(operation)) + 2
+            if operation_size + 2 > self.TXN_MAX_SIZE:
+                # 单个key超过事务请求体大小限制时无法写入，跳过并等待下次同步
+                logger.error(
+                    "key->[%s] size->[%s] exceeds consul txn max size->[%s], skip it",
+                    key,
+                    operation_size,
+                    self.TXN_MAX_SIZE,
+                )
+                continue
+            if operations and (len(operations) >= self.TXN_MAX_OPS or size + operation_size > self.TXN_MAX_SIZE):
+                updated_keys.extend(self._txn_put(operations, new_hashes))
+                operations, size = [], 2
+            operations.append(operation)
+            size += operation_size
+        if operations:
+            updated_keys.extend(self._txn_put(operations, new_hashes))
+
+        logger.info(
+            "prefix->[%s] batch put finished, total->[%s], changed->[%s], updated->[%s]",
+            prefix,
+            len(kvs),
+            len(new_hashes),
+            len(updated_keys),
+        )
+        return updated_keys
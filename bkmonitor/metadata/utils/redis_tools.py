@@ -10,7 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 import os
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 
 from utils.redis_client import RedisClient
 
@@ -52,6 +52,14 @@ class RedisTools(object):
             raise Exception(f"publish msg error, {e}")
         return
 
+    @classmethod
+    def get(cls, key: str) -> str:
+        return cls().client.get(key)
+
+    @classmethod
+    def set(cls, key: str, value: str, ex: Optional[int] = None) -> bool:
+        return cls().client.set(key, value, ex=ex)
+
     @classmethod
     def hset_to_redis(cls, key: str, field: str, value: str):
         """哈希方式推送表数据"""
@@ -107,6 +115,19 @@ class RedisTools(object):
     def smembers(cls, key: str) -> Set:
         return cls().client.smembers(key)
 
+    @classmethod
+    def move_members(cls, src_key: str, dst_key: str) -> Set:
+        """将集合中的数据原子地合并到目标集合，并返回目标集合中的所有数据"""
+        pipeline = cls().client.pipeline(transaction=True)
+        pipeline.sunionstore(dst_key, [dst_key, src_key])
+        pipeline.delete(src_key)
+        pipeline.smembers(dst_key)
+        return pipeline.execute()[-1]
+
+    @classmethod
+    def delete(cls, *keys: str) -> int:
+        return cls().client.delete(*keys)
+
 
 def setup_client():
     RedisTools.metadata_redis_client = RedisClient.from_envs(
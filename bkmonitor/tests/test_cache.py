@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+from types import SimpleNamespace
+
+import mock
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from bkmonitor.utils import cache as cache_module
+from bkmonitor.utils.cache import CacheTypeItem, UsingCache
+
+STALE_CACHE_TYPE = CacheTypeItem(key="test", timeout=60, user_related=False, stale_timeout=60)
+
+
+@pytest.fixture
+def shared_cache(settings):
+    settings.ENVIRONMENT = "testing"
+    settings.CACHE_SINGLE_FLIGHT_ENABLED = True
+    settings.CACHE_SINGLE_FLIGHT_TIMEOUT = 5
+    shared = LocMemCache("shared", {})
+    shared.clear()
+    # 模拟其他进程，不使用进程内缓存
+    with mock.patch.object(cache_module, "cache", shared), mock.patch.object(cache_module, "mem_cache", shared):
+        yield shared
+
+
+def make_func(cache_type=STALE_CACHE_TYPE):
+    calls = []
+
+    @UsingCache(cache_type)
+    def get_biz_list():
+        calls.append(1)
+        return [{"bk_biz_id": len(calls)}]
+
+    return get_biz_list, calls
+
+
+class TestUsingCache(object):
+    def test_single_flight(self, shared_cache):
+        func, calls = make_func()
+        cache_key = UsingCache(STALE_CACHE_TYPE)._cache_key(func.__wrapped__, (), {})
+
+        # 其他进程持有锁并在稍后写入缓存，当前进程等待结果而不重复执行函数
+        shared_cache.add(UsingCache._lock_key(cache_key), 1, 5)
+        other_func, other_calls = make_func()
+        timer = threading.Timer(0.3, other_func.refresh)
+        timer.start()
+        assert func() == [{"bk_biz_id": 1}]
+        timer.join()
+        assert not calls
+        assert len(other_calls) == 1
+
+    def test_single_flight_lock_released(self, shared_cache):
+        func, calls = make_func()
+        cache_key = UsingCache(STALE_CACHE_TYPE)._cache_key(func.__wrapped__, (), {})
+
+        # 锁被释放但未写入缓存时不再等待，直接执行函数
+        shared_cache.add(UsingCache._lock_key(cache_key), 1, 5)
+        threading.Timer(0.2, shared_cache.delete, args=(UsingCache._lock_key(cache_key),)).start()
+        assert func() == [{"bk_biz_id": 1}]
+        assert len(calls) == 1
+
+    def test_stale_while_revalidate(self, shared_cache):
+        func, calls = make_func()
+        cache_key = UsingCache(STALE_CACHE_TYPE)._cache_key(func.__wrapped__, (), {})
+        assert func() == [{"bk_biz_id": 1}]
+        assert func() == [{"bk_biz_id": 1}]
+        assert len(calls) == 1
+
+        # 数据过期后，其他进程正在刷新时继续使用旧数据
+        shared_cache.delete(UsingCache._fresh_key(cache_key))
+        shared_cache.add(UsingCache._lock_key(cache_key), 1, 5)
+        assert func() == [{"bk_biz_id": 1}]
+        assert len(calls) == 1
+
+        # 获取到锁的进程负责刷新
+        shared_cache.delete(UsingCache._lock_key(cache_key))
+        assert func() == [{"bk_biz_id": 2}]
+        assert len(calls) == 2
+        assert func() == [{"bk_biz_id": 2}]
+        assert len(calls) == 2
+
+    def test_local_cache_keep_object(self, shared_cache, settings):
+        settings.ROLE = "web"
+        using_cache = UsingCache(STALE_CACHE_TYPE)
+        with mock.patch.object(cache_module, "local", SimpleNamespace()) as local:
+            using_cache.set_value("test_key", [{"bk_biz_id": 1}])
+            value = using_cache.get_value("test_key")
+            # 一级缓存保存解码后的对象，命中时不再访问缓存
+            assert getattr(local, "test_key") is value
+            shared_cache.clear()
+            assert using_cache.get_value("test_key") is value